@@ -0,0 +1,129 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+from atlasloader import resolve_image
+
+
+def parse_channel_list(value):
+    # parse a list of MIDI channels like "1-15" or "1, 2, 5-8" into a tuple (invalid parts are skipped,
+    # every channel is listed once, in the order of its first mention)
+    channels = []
+    for part in value.split(','):
+        try:
+            if '-' in part:
+                first, last = part.split('-', 1)
+                channels.extend(range(int(first), int(last) + 1))
+            elif part.strip():
+                channels.append(int(part))
+        except ValueError:
+            print 'Warning: Invalid MIDI channel list "%s".' % value
+    unique = []
+    for channel in channels:
+        if 0 <= channel <= 15 and channel not in unique:
+            unique.append(channel)
+    return tuple(unique)
+
+
+'''
+####################################
+##
+##   AppSettings Class
+##   Typed snapshot of the application settings
+##
+####################################
+'''
+class AppSettings(object):
+    '''All the values of the .ini settings file, already parsed into plain python
+    types. The touch handlers and the rounding scheduler run many times per frame,
+    so they read these attributes instead of doing a ConfigParser lookup + parse
+    on every event. The snapshot is rebuilt with :meth:`update` whenever a value
+    changes (see IcarusTouch.on_config_change), never on the hot path.
+    '''
+    
+    def __init__(self, config):
+        self.update(config)
+    
+    def update(self, config):
+        # (the object is updated in place, so everybody holding a reference to it sees the new values)
+        
+        # section "General"
+        self.pitch_lock = config.get('General', 'PitchLock') == 'On'
+        self.y_axis = config.get('General', 'YAxis')
+        self.y_axis_is_aftertouch = self.y_axis == 'Aftertouch'
+        self.mono_mode = config.get('General', 'MonoMode')
+        
+        # section "Graphics"
+        self.keyboard = config.get('Graphics', 'Keyboard')
+        self.background = config.get('Graphics', 'Background')
+        
+        # section "MIDI"
+        self.device = config.get('MIDI', 'Device')
+        self.channel = config.getint('MIDI', 'Channel')
+        self.voice_mode = config.get('MIDI', 'VoiceMode')
+        self.member_channels = parse_channel_list(config.get('MIDI', 'MemberChannels'))
+        self.pitch_bend_range = config.getint('MIDI', 'PitchbendRange')
+        self.transpose = config.getint('MIDI', 'Transpose')
+        self.tuning = config.get('MIDI', 'Tuning')
+        self.keyboard_mapping = config.get('MIDI', 'KeyboardMapping')
+        self.cc_controller = config.getint('MIDI', 'CCController')
+        self.velocity = config.getint('MIDI', 'Velocity')
+        
+        # the channels the voice allocator may use: None = all voices share the MIDI channel
+        if self.voice_mode == 'Monophonic':
+            self.voice_channels = (self.channel,)
+        elif self.voice_mode == 'MPE':
+            # (the master channel is never a member channel)
+            self.voice_channels = tuple(channel for channel in self.member_channels if channel != self.channel)
+        else:
+            self.voice_channels = None
+        
+        # section "Advanced"
+        # (the stock images are taken out of the texture atlas, custom ones are loaded from their file)
+        self.blob_image = resolve_image(config.get('Advanced', 'BlobImage'))
+        self.blob_size = config.getint('Advanced', 'BlobSize')
+        self.circle_image = resolve_image(config.get('Advanced', 'CircleImage'))
+        self.circle_size = config.getint('Advanced', 'CircleSize')
+        self.key_image = resolve_image(config.get('Advanced', 'KeyImage'))
+        
+        self.rounding_scheduler_interval = float(config.get('Advanced', 'RoundingSchedulerInterval'))
+        self.round_speed_to_finger = float(config.get('Advanced', 'RoundSpeedToFinger'))
+        self.round_speed_to_key = float(config.get('Advanced', 'RoundSpeedToKey'))
+        self.movement_decay = float(config.get('Advanced', 'MovementDecay'))
+        
+        self.show_pitch_line = config.get('Advanced', 'ShowPitchLine') == 'On'
+        self.coalesce_touch_moves = config.get('Advanced', 'CoalesceTouchMoves') == 'On'
+        self.record_touch_trace = config.get('Advanced', 'RecordTouchTrace') == 'On'
+        self.record_midi = config.get('Advanced', 'RecordMidi') == 'On'
+        self.latency_tracing = config.get('Advanced', 'LatencyTracing') == 'On'
+        
+        self.rounding_engine = config.get('Advanced', 'RoundingEngine')
+        self.control_rate = config.getint('Advanced', 'ControlRate')
+        
+        self.midi_batch_size = config.getint('Advanced', 'MidiBatchSize')
+        self.midi_thread = config.get('Advanced', 'MidiThread') == 'On'
+        self.midi_queue_size = config.getint('Advanced', 'MidiQueueSize')
+        self.midi_device_polling = float(config.get('Advanced', 'MidiDevicePolling'))
+        
+        self.deferred_startup = config.get('Advanced', 'DeferredStartup') == 'On'
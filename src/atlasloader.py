@@ -0,0 +1,107 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import json
+from os.path import abspath, basename, dirname, exists, splitext
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Atlas
+# ---------------------------------------------------------
+# built by buildatlas.py: images/icarustouch.atlas + images/icarustouch-0.png, ...
+IMAGES_DIRECTORY = 'images'
+ATLAS_NAME = 'images/icarustouch'
+ATLAS_SIZE = 2048
+
+# the images packed into the atlas: everything drawn during play, plus the buttons and borders.
+# (not the full-screen feedback wall: the images drawn for every touch have to fit onto one page)
+ATLAS_IMAGES = [
+    'images/blob_blue.png',
+    'images/circle.png',
+    'images/key_sw.png',
+    'images/key_red.png',
+    'images/key_blue.png',
+    'images/key_universal.png',
+    'images/Shadow+Border_38.png',
+    'images/shadow_145.png',
+    'images/Shadow_145_white.png',
+    'images/Look.png',
+    'images/Settings.png',
+    'images/Pitch_Locked.png',
+    'images/Pitch_Unlocked.png',
+    'images/X-Axis_mod.png',
+    'images/X-Axis_vol.png',
+]
+
+
+'''
+####################################
+##
+##   Image Resolving
+##
+####################################
+'''
+
+# ids of the images in the atlas (None = not loaded yet)
+_atlas_ids = None
+
+
+def load_atlas_ids():
+    # read the image ids out of the .atlas file (once). Without a built atlas, this is an empty set.
+    global _atlas_ids
+    if _atlas_ids is None:
+        _atlas_ids = set()
+        if exists(ATLAS_NAME + '.atlas'):
+            try:
+                with open(ATLAS_NAME + '.atlas') as atlas_file:
+                    for page in json.load(atlas_file).itervalues():
+                        _atlas_ids.update(page.keys())
+            except Exception, e:
+                print 'Atlas: Unable to load <%s.atlas>. Reason: %s' % (ATLAS_NAME, e)
+    return _atlas_ids
+
+
+def resolve_image(filename):
+    '''Returns the atlas:// uri of an image of the images folder, if it is packed into the atlas.
+    Everything else (custom images chosen by the user, or no atlas built) is returned as it is.
+    '''
+    if not filename or filename.startswith('atlas://'):
+        return filename
+    
+    # only the stock images are in the atlas (the file chooser gives absolute paths)
+    if abspath(dirname(filename)) != abspath(IMAGES_DIRECTORY):
+        return filename
+    
+    image_id = splitext(basename(filename))[0]
+    if image_id in load_atlas_ids():
+        return 'atlas://%s/%s' % (ATLAS_NAME, image_id)
+    return filename
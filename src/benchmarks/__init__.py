@@ -0,0 +1,122 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Micro-benchmarks for the hot paths of IcarusTouch.
+
+Run them from the "src" folder, e.g.:
+
+    python -m benchmarks.bench_settings
+
+Unless stated otherwise in the benchmark itself, they don't need a window,
+a touchscreen or a MIDI device.
+'''
+
+
+import sys
+import time
+from ConfigParser import RawConfigParser
+
+
+# the same defaults as in IcarusTouch.build_config (main.py can't be imported without a window)
+DEFAULT_SETTINGS = {
+    'General': {
+        'PitchLock': 'Off',
+        'YAxis': 'Aftertouch',
+        'MonoMode': 'Legato'},
+    'Graphics': {
+        'Keyboard': 'keyboards/keyboard_blue2_shadow.png',
+        'Background': 'backgrounds/cold blue/background_blue_cold3.jpg'},
+    'MIDI': {
+        'Device': 'USB Uno MIDI Interface',
+        'Channel': '0',
+        'VoiceMode': 'Polyphonic',
+        'MemberChannels': '1-15',
+        'PitchbendRange': '24',
+        'Transpose': '36',
+        'Tuning': '',
+        'KeyboardMapping': '',
+        'CCController': '1',
+        'Velocity': '127'},
+    'Advanced': {
+        'BlobImage': 'images/blob_blue.png',
+        'BlobSize': '60',
+        'CircleImage': 'images/circle.png',
+        'CircleSize': '60',
+        'KeyImage': 'images/key_sw.png',
+        'RoundingSchedulerInterval': '0.01',
+        'RoundSpeedToFinger': '0.6',
+        'RoundSpeedToKey': '0.2',
+        'MovementDecay': '0.2',
+        'ShowPitchLine': 'Off',
+        'CoalesceTouchMoves': 'Off',
+        'RecordTouchTrace': 'Off',
+        'RecordMidi': 'Off',
+        'LatencyTracing': 'Off',
+        'MidiBatchSize': '64',
+        'MidiThread': 'On',
+        'MidiQueueSize': '1024',
+        'MidiDevicePolling': '2',
+        'DeferredStartup': 'On',
+        'RoundingEngine': 'Python',
+        'ControlRate': '0'},
+}
+
+
+def make_config(config_class=RawConfigParser):
+    # build a config object filled with the application defaults
+    config = config_class()
+    for section, values in DEFAULT_SETTINGS.items():
+        config.add_section(section)
+        for key, value in values.items():
+            config.set(section, key, value)
+    return config
+
+
+def measure(function, iterations):
+    # returns the mean time of one call in microseconds
+    start = time.time()
+    for i in xrange(iterations):
+        function()
+    return (time.time() - start) * 1000000.0 / iterations
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(title, rows):
+    # print a simple table: rows is a list of (label, value, unit)
+    print '\n%s' % title
+    print '-' * len(title)
+    for label, value, unit in rows:
+        if isinstance(value, (int, long)):
+            print '%-45s %12i %s' % (label, value, unit)
+        else:
+            print '%-45s %12.3f %s' % (label, value, unit)
+    sys.stdout.flush()
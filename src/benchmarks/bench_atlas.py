@@ -0,0 +1,151 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Texture loading time and texture binds per frame, with the single image files and
+with the atlas (if it's built - run "python buildatlas.py" first). The binds are
+counted with 5 fingers on the keyboard, on a keyboard built for each variant.
+
+    python -m benchmarks.bench_atlas
+'''
+
+
+import json
+import time
+from os.path import exists
+
+from benchmarks import report
+from benchmarks.harness import Harness
+
+
+FINGERS = 5
+
+
+def load_files():
+    from kivy.core.image import Image as CoreImage
+    from atlasloader import ATLAS_IMAGES
+    start = time.time()
+    for filename in ATLAS_IMAGES:
+        CoreImage(filename, nocache=True).texture
+    return time.time() - start
+
+
+def load_atlas():
+    from kivy.atlas import Atlas
+    from atlasloader import ATLAS_NAME
+    start = time.time()
+    Atlas(ATLAS_NAME + '.atlas')
+    return time.time() - start
+
+
+def atlas_pages():
+    # id() of every texture of the loaded atlas -> its page. The textures of an atlas are regions of
+    # the page texture, but they have no reference to it (and with a mocked GL, all the texture ids are 0)
+    from kivy.cache import Cache
+    from atlasloader import ATLAS_NAME
+    atlas = Cache.get('kv.atlas', ATLAS_NAME)
+    if atlas is None:
+        return {}
+    pages = {}
+    with open(ATLAS_NAME + '.atlas') as atlas_file:
+        for page, image_ids in json.load(atlas_file).iteritems():
+            for image_id in image_ids:
+                pages[id(atlas[image_id])] = page
+    return pages
+
+
+def count_texture_binds(canvas):
+    # walk the canvas in drawing order and count how often the texture changes
+    state = {'texture': None, 'binds': 0, 'textures': set()}
+    pages = atlas_pages()
+    
+    def walk(instruction):
+        if getattr(instruction, 'has_before', False):
+            walk(instruction.before)
+        for child in getattr(instruction, 'children', ()):
+            walk(child)
+        if getattr(instruction, 'has_after', False):
+            walk(instruction.after)
+        
+        texture = getattr(instruction, 'texture', None)
+        if texture is not None:
+            texture_id = pages.get(id(texture)) or texture.id or id(texture)
+            state['textures'].add(texture_id)
+            if texture_id != state['texture']:
+                state['texture'] = texture_id
+                state['binds'] += 1
+    
+    walk(canvas)
+    return state['binds'], len(state['textures'])
+
+
+def play(harness, name):
+    # play some notes, so blobs and key lights are visible
+    keyboard = harness.keyboard
+    touches = [harness.touch_down(harness.key_x(finger * 3), keyboard.center_y) for finger in range(FINGERS)]
+    harness.frame()
+    binds, textures = count_texture_binds(harness.window.canvas)
+    
+    for touch in touches:
+        harness.touch_up(touch)
+    # (the blobs go back into the pool)
+    harness.settle(2.5)
+    return [
+        ('%s: texture binds per frame' % name, binds, ''),
+        ('%s: different textures per frame' % name, textures, ''),
+        ]
+
+
+def main():
+    import atlasloader
+    from atlasloader import ATLAS_NAME
+    from appsettings import AppSettings
+    from keyboard import Keyboard
+    
+    # first without the atlas: the settings, the kv rules and the keyboard take the image files
+    atlasloader._atlas_ids = set()
+    harness = Harness()
+    rows = [('loading the single image files', load_files() * 1000, 'ms')]
+    rows.extend(play(harness, 'single files'))
+    
+    if exists(ATLAS_NAME + '.atlas'):
+        rows.append(('loading the atlas', load_atlas() * 1000, 'ms'))
+        
+        # then the same with the atlas, on a new keyboard (the images are resolved when it's created)
+        atlasloader._atlas_ids = None
+        host = harness.host
+        host.settings = host.app.settings = AppSettings(host.app.config)
+        # (the keyboards share the key images they have loaded)
+        Keyboard.key_textures.clear()
+        harness.replace_keyboard()
+        rows.extend(play(harness, 'atlas'))
+    else:
+        print 'Warning: No atlas built (python buildatlas.py), only the single files are measured.'
+    
+    report('Texture atlas (%i fingers)' % FINGERS, rows)
+
+
+if __name__ == '__main__':
+    main()
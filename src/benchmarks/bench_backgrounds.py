@@ -0,0 +1,145 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Decode time and texture memory of the shipped background images (backgrounds/),
+at their full resolution and as the downscaled copies for three window sizes
+(see IcarusTouchWidget.load_background). The images are decoded with pygame,
+like in the image cache - it doesn't need a window.
+
+    python -m benchmarks.bench_backgrounds
+'''
+
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+import pygame
+
+from imagecache import ImageCache, ImageCacheWorker, size_bucket
+from benchmarks import report
+
+
+WINDOW_SIZES = ((1024, 768), (1280, 800), (1920, 1200))
+# the same as in main.py (it can't be imported without a window)
+BACKGROUND_BUCKET_STEP = 128
+# a window border dragged from the smallest to the biggest window size, one resize event per step
+RESIZE_DRAG_STEPS = 60
+
+
+def background_files():
+    files = []
+    for directory, subdirectories, filenames in os.walk('backgrounds'):
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in ('.jpg', '.png'):
+                files.append(os.path.join(directory, filename))
+    return files
+
+
+def decode(files):
+    # returns the total decode time and the texture memory (bytes) of the images
+    duration = 0
+    memory = 0
+    for filename in files:
+        start = time.time()
+        surface = pygame.image.load(filename)
+        duration += time.time() - start
+        width, height = surface.get_size()
+        memory += width * height * surface.get_bytesize()
+    return duration, memory
+
+
+def resize_drag(filename, cache):
+    # every resize event requests the copy for its bucket, like without the debounce in main.py.
+    # Returns the number of requests, the copies created and the requests dropped by the worker.
+    worker = ImageCacheWorker(cache)
+    done = threading.Event()
+    (first_width, first_height), (last_width, last_height) = WINDOW_SIZES[0], WINDOW_SIZES[-1]
+    last_bucket = size_bucket(last_width, last_height, BACKGROUND_BUCKET_STEP)
+    
+    def created(filename, width, height, variant):
+        if (width, height) == last_bucket:
+            done.set()
+    
+    misses = cache.misses
+    for step in range(RESIZE_DRAG_STEPS + 1):
+        width = first_width + (last_width - first_width) * step // RESIZE_DRAG_STEPS
+        height = first_height + (last_height - first_height) * step // RESIZE_DRAG_STEPS
+        bucket = size_bucket(width, height, BACKGROUND_BUCKET_STEP)
+        worker.request(filename, bucket[0], bucket[1], created, stretch=True)
+        time.sleep(0.005)
+    
+    done.wait()
+    worker.close()
+    return worker.requests, cache.misses - misses, worker.dropped
+
+
+def main():
+    # (relative to the "src" folder)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    files = background_files()
+    
+    full_time, full_memory = decode(files)
+    rows = [
+        ('full resolution: decode time, mean', full_time / len(files) * 1000, 'ms'),
+        ('full resolution: texture memory, mean', full_memory / len(files) / 1048576.0, 'MB'),
+        ]
+    
+    cache_directory = tempfile.mkdtemp()
+    try:
+        cache = ImageCache(cache_directory)
+        for window_width, window_height in WINDOW_SIZES:
+            bucket = size_bucket(window_width, window_height, BACKGROUND_BUCKET_STEP)
+            
+            start = time.time()
+            variants = [cache.get(filename, bucket[0], bucket[1], stretch=True) for filename in files]
+            create_time = time.time() - start
+            
+            variant_time, variant_memory = decode(variants)
+            label = '%ix%i' % (window_width, window_height)
+            rows.extend([
+                ('%s: creating the copies, mean' % label, create_time / len(files) * 1000, 'ms'),
+                ('%s: decode time, mean' % label, variant_time / len(files) * 1000, 'ms'),
+                ('%s: texture memory, mean' % label, variant_memory / len(files) / 1048576.0, 'MB'),
+                ])
+        
+        # (in a fresh cache, so every copy has to be created)
+        requests, created, dropped = resize_drag(files[0], ImageCache(os.path.join(cache_directory, 'resize')))
+        rows.extend([
+            ('resize drag: requests', requests, ''),
+            ('resize drag: copies created', created, ''),
+            ('resize drag: requests dropped', dropped, ''),
+            ])
+    finally:
+        shutil.rmtree(cache_directory)
+    
+    report('%i background images' % len(files), rows)
+
+
+if __name__ == '__main__':
+    main()
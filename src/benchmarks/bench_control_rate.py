@@ -0,0 +1,239 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+'''
+Glide time of the rounding: the frame clock rounding of Keyboard.roundAllKeys
+(fixed fraction per call) at 100, 60 and 30 calls per second against the
+ControlRateEngine at different tick rates (simulated clock, so the numbers
+are exact). Then the engine runs on its thread while the "UI thread" is busy
+rendering at 30 fps, to see how regular the ticks are. Last, both threads write
+to one MidiWorker with a slow device (its queue overflows): no note may overtake
+a pitch bend sent before it.
+
+    python -m benchmarks.bench_control_rate
+'''
+
+
+import random
+import threading
+import time
+
+from appsettings import AppSettings
+from controlrate import ControlRateEngine
+from midioutput import MidiWorker, NOTE_ON, PITCH_BEND
+from keygeometry import KeyGeometry
+from tuning import Tuning, PitchTable
+from benchmarks import make_config, percentile, report
+
+
+KEY_WIDTH = 50
+KEYS = 60
+# like in keyboard.py (which can't be imported without kivy)
+KEY_MOVEMENT_THRESHOLD = 1
+# the voice snaps to a key 6 keys away (the finger doesn't move)
+START = 25
+TARGET = 325
+FRAME_RATES = (100, 60, 30)
+CONTROL_RATES = (250, 500, 1000)
+# for the threaded run
+UI_FRAME_RATE = 30
+UI_BUSY_FRACTION = 0.8
+THREADED_SECONDS = 2.0
+# for the run with two producers
+WORKER_QUEUE_SIZE = 8
+PRODUCER_BENDS = 16000
+PRODUCER_NOTES = 8000
+SLOW_WRITE = 0.0002 # 200 us per driver call
+
+
+def make_pitch_table(settings):
+    # (like Keyboard.get_pitch_table, START is the center of key 0)
+    return PitchTable(Tuning.equal_temperament(), KeyGeometry.uniform(KEY_WIDTH, KEYS * KEY_WIDTH), 0, settings.pitch_bend_range)
+
+
+class NullPort(object):
+    def __init__(self):
+        self.messages = 0
+    
+    def write_short(self, status, data1=0, data2=0):
+        self.messages += 1
+
+
+class TracingEngine(ControlRateEngine):
+    # remembers the time of every tick
+    def __init__(self, *args):
+        ControlRateEngine.__init__(self, *args)
+        self.tick_times = []
+    
+    def tick(self, now, dt):
+        self.tick_times.append(now)
+        return ControlRateEngine.tick(self, now, dt)
+
+
+def frame_clock_glide(settings, rate):
+    # the loop body of roundAllKeys for one voice (finger standing still), called rate times per second.
+    # returns the time to reach the key.
+    old_position = START
+    now = 0.0
+    while True:
+        now += 1.0 / rate
+        current_position = old_position + (TARGET - old_position) * settings.round_speed_to_key
+        if abs(TARGET - current_position) <= 1:
+            return now
+        old_position = current_position
+
+
+def control_rate_glide(settings, rate, jitter=0):
+    # the same with the engine (ticks late by up to "jitter" percent). Returns the time to reach the key.
+    engine = ControlRateEngine(settings, rate, KEY_MOVEMENT_THRESHOLD)
+    engine.set_port(NullPort())
+    pitch_table = make_pitch_table(settings)
+    voice = engine.add(0, START, START, pitch_table, pitch_table.key_bases[0], 0.0, 0)
+    engine.move(voice, TARGET, TARGET, -settings.movement_decay, 0)
+    now = 0.0
+    while True:
+        dt = 1.0 / rate * (1 + random.random() * jitter / 100.0)
+        now += dt
+        engine.tick(now, dt)
+        if voice.position == TARGET:
+            return now
+
+
+def threaded_run(settings, rate):
+    engine = TracingEngine(settings, rate, KEY_MOVEMENT_THRESHOLD)
+    port = NullPort()
+    engine.set_port(port)
+    engine.start()
+    pitch_table = make_pitch_table(settings)
+    voice = engine.add(0, START, START, pitch_table, pitch_table.key_bases[0], time.time(), 0)
+    
+    # the "UI thread": 30 frames per second, busy with python code most of the frame, the finger is always moving
+    frame_time = 1.0 / UI_FRAME_RATE
+    end = time.time() + THREADED_SECONDS
+    frame = 0
+    while time.time() < end:
+        frame += 1
+        frame_start = time.time()
+        x = START + (frame % 20) * 5
+        engine.move(voice, x, START, frame_start, 5)
+        busy_end = frame_start + frame_time * UI_BUSY_FRACTION
+        while time.time() < busy_end:
+            sum(range(100))
+        delay = frame_start + frame_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    engine.close()
+    
+    gaps = [b - a for a, b in zip(engine.tick_times, engine.tick_times[1:])]
+    return len(engine.tick_times) / THREADED_SECONDS, percentile(gaps, 0.5), percentile(gaps, 0.99), max(gaps), engine.late_ticks
+
+
+class SlowPort(object):
+    # a device with slow driver calls, keeps all the messages
+    def __init__(self):
+        self.messages = []
+    
+    def write(self, data):
+        time.sleep(SLOW_WRITE)
+        self.messages.extend(message for message, timestamp in data)
+    
+    def close(self):
+        pass
+
+
+def two_producers_run():
+    # the "control-rate thread" sends rising pitch bends, the "UI thread" notes. Every note remembers
+    # the last bend sent before it - when it's written, at least this bend has to be written before.
+    port = SlowPort()
+    worker = MidiWorker(port, WORKER_QUEUE_SIZE)
+    last_bend = [-1]
+    bend_before_note = {}
+    
+    def send_bends():
+        for value in xrange(PRODUCER_BENDS):
+            worker.write_short(PITCH_BEND, value & 0x7F, value >> 7)
+            last_bend[0] = value
+    
+    def send_notes():
+        # (the note number and the velocity encode the index of the note)
+        for index in xrange(PRODUCER_NOTES):
+            bend_before_note[index] = last_bend[0]
+            worker.write([[[NOTE_ON, index & 0x7F, (index >> 7) + 1], 0]])
+    
+    threads = [threading.Thread(target=send_bends), threading.Thread(target=send_notes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    worker.close()
+    
+    bend = -1
+    notes = 0
+    overtaken = 0
+    for status, data1, data2 in port.messages:
+        if status == PITCH_BEND:
+            bend = data1 | (data2 << 7)
+        elif status == NOTE_ON:
+            notes += 1
+            if bend < bend_before_note[data1 | ((data2 - 1) << 7)]:
+                overtaken += 1
+    return notes, overtaken, worker.coalesced
+
+
+def main():
+    settings = AppSettings(make_config())
+    random.seed(0)
+    
+    rows = []
+    for rate in FRAME_RATES:
+        rows.append(('frame clock, %i calls/s' % rate, frame_clock_glide(settings, rate) * 1000, 'ms'))
+    for rate in CONTROL_RATES:
+        rows.append(('control rate, %i Hz' % rate, control_rate_glide(settings, rate) * 1000, 'ms'))
+        rows.append(('control rate, %i Hz, ticks up to 50%% late' % rate, control_rate_glide(settings, rate, 50) * 1000, 'ms'))
+    report('Glide time over %i pixel (rounding scheduler interval %.3f s)' % (TARGET - START, settings.rounding_scheduler_interval), rows)
+    
+    rows = []
+    for rate in CONTROL_RATES:
+        ticks_per_second, median_gap, gap_99, max_gap, late_ticks = threaded_run(settings, rate)
+        rows += [
+            ('%i Hz: ticks per second' % rate, ticks_per_second, ''),
+            ('%i Hz: tick interval, 50th percentile' % rate, median_gap * 1000, 'ms'),
+            ('%i Hz: tick interval, 99th percentile' % rate, gap_99 * 1000, 'ms'),
+            ('%i Hz: tick interval, max' % rate, max_gap * 1000, 'ms'),
+            ('%i Hz: late ticks' % rate, late_ticks, ''),
+            ]
+    report('Control rate thread while the UI thread renders at %i fps (%i%% busy)' % (UI_FRAME_RATE, UI_BUSY_FRACTION * 100), rows)
+    
+    notes, overtaken, coalesced = two_producers_run()
+    report('Two threads writing to a MidiWorker (queue of %i messages)' % WORKER_QUEUE_SIZE, [
+        ('notes written', notes, ''),
+        ('pitch bends coalesced', coalesced, ''),
+        ('notes written before an earlier pitch bend', overtaken, ''),
+        ])
+
+
+if __name__ == '__main__':
+    main()
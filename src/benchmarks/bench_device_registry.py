@@ -0,0 +1,137 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+Opening the MIDI device popup with 40 devices (many virtual ports): the
+get_count / get_device_info calls SettingMIDI._create_popup made on the UI
+thread (up to five per device) against reading the snapshot of the
+DeviceRegistry. Then a device appears while the registry polls in the
+background: how long until the change event arrives.
+
+The stub PortMidi simulates the cost of one enumeration call with a busy wait
+(CALL_OVERHEAD).
+
+    python -m benchmarks.bench_device_registry
+'''
+
+
+import threading
+import time
+
+from deviceregistry import DeviceRegistry, MidiDevice
+from benchmarks import measure, report
+
+
+DEVICES = 40
+CALL_OVERHEAD = 0.0001 # 100 us per PortMidi enumeration call
+POLL_INTERVAL = 0.1
+SELECTED = 'Virtual port 7'
+
+
+def busy_wait(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class StubPortMidi(object):
+    # get_count and get_device_info of pygame.midi, counting the calls
+    def __init__(self, count):
+        self.devices = [('stub', 'Virtual port %i' % i, 0, 1, 0) for i in range(count)]
+        self.calls = 0
+    
+    def get_count(self):
+        self.calls += 1
+        busy_wait(CALL_OVERHEAD)
+        return len(self.devices)
+    
+    def get_device_info(self, i):
+        self.calls += 1
+        busy_wait(CALL_OVERHEAD)
+        return self.devices[i]
+    
+    def scan(self):
+        # like deviceregistry.scan_pygame_devices
+        return [MidiDevice(i, *self.get_device_info(i)) for i in range(self.get_count())]
+
+
+def popup_before(midi):
+    # the device list of SettingMIDI._create_popup as it was
+    names = []
+    height = midi.get_count() * 30 + 150
+    for i in range(midi.get_count()):
+        if midi.get_device_info(i)[3] == 1 and (midi.get_device_info(i)[4] == 0 or midi.get_device_info(i)[1] == SELECTED):
+            state = 'down' if midi.get_device_info(i)[1] == SELECTED else 'normal'
+            names.append((midi.get_device_info(i)[1], state))
+    return names, height
+
+
+def popup_after(registry):
+    devices = registry.snapshot.devices
+    names = []
+    height = len(devices) * 30 + 150
+    for device_id, interface, name, is_input, is_output, opened in devices:
+        if is_output == 1 and (opened == 0 or name == SELECTED):
+            state = 'down' if name == SELECTED else 'normal'
+            names.append((name, state))
+    return names, height
+
+
+def hot_plug_latency():
+    # a device appears: the time until the listener is called
+    midi = StubPortMidi(DEVICES)
+    registry = DeviceRegistry(midi.scan, POLL_INTERVAL)
+    changed = threading.Event()
+    registry.bind(lambda new, old: changed.set())
+    registry.start()
+    
+    time.sleep(POLL_INTERVAL / 2)
+    midi.devices.append(('stub', 'New synth', 0, 1, 0))
+    start = time.time()
+    changed.wait(5)
+    latency = time.time() - start
+    registry.close()
+    return latency, registry.scans
+
+
+def main():
+    midi = StubPortMidi(DEVICES)
+    popup_before(midi)
+    calls = midi.calls
+    registry = DeviceRegistry(midi.scan, 0)
+    assert popup_before(midi) == popup_after(registry)
+    latency, scans = hot_plug_latency()
+    
+    rows = [
+        ('popup before: PortMidi calls', calls, ''),
+        ('popup before: time on the UI thread', measure(lambda: popup_before(midi), 10), 'us'),
+        ('popup after: PortMidi calls', 0, ''),
+        ('popup after: time on the UI thread', measure(lambda: popup_after(registry), 1000), 'us'),
+        ('one background scan', measure(registry.refresh, 10), 'us'),
+        ('new device: change event after', latency * 1000, 'ms (polling every %i ms)' % (POLL_INTERVAL * 1000)),
+        ]
+    report('MIDI device list with %i devices (%i us per PortMidi call)' % (DEVICES, CALL_OVERHEAD * 1000000), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+'''
+Frame times while playing and changing the background at the same time:
+the old way (Image(source=...) on the UI thread) against the kivy Loader.
+A frame is counted as dropped if it takes longer than 1/60 s; the frame time
+includes the swap request, which runs on the UI thread as well.
+
+    python -m benchmarks.bench_image_swap [trace.txt]
+
+With a file name, the time of every frame is written to that file
+(one line per frame: variant, frame number, frame time in ms, swap marker).
+'''
+
+
+import sys
+import time
+
+from benchmarks import report
+from benchmarks.harness import Harness, percentile
+
+# (after the harness: it configures kivy)
+from kivy.loader import Loader
+from kivy.uix.image import Image
+from imageloader import load_texture
+
+
+FINGERS = 3
+# frames between two swaps
+SWAP_INTERVAL = 30
+FRAME_BUDGET = 1.0 / 60
+# every variant gets its own images, so none of them comes from the cache
+IMAGES = {
+    'synchronous': [
+        'backgrounds/cold blue/background_blue_cold4.jpg',
+        'backgrounds/cold blue/background_blue_cold5.jpg',
+        'backgrounds/cold blue/background_blue_cold9.jpg',
+        ],
+    'loader': [
+        'backgrounds/cold red/background_red_cold1.jpg',
+        'backgrounds/cold red/background_red_cold2.jpg',
+        'backgrounds/cold blue/background_blue_cold2.jpg',
+        ],
+    }
+
+
+def play(harness, variant, trace):
+    keyboard = harness.keyboard
+    y = keyboard.center_y
+    touches = [harness.touch_down(harness.key_x(finger * 4), y) for finger in range(FINGERS)]
+    shown = []
+    
+    def swap_loaded(filename, texture):
+        shown.append(texture)
+    
+    frame_times = []
+    swaps = list(IMAGES[variant])
+    frame = 0
+    # play until all the images are swapped in, plus a few frames
+    while swaps or len(shown) < len(IMAGES[variant]) or frame % SWAP_INTERVAL:
+        # (the frame time includes the swap request: it runs on the UI thread too)
+        start = time.time()
+        frame += 1
+        swap = frame % SWAP_INTERVAL == 0 and swaps
+        if swap:
+            filename = swaps.pop(0)
+            if variant == 'synchronous':
+                shown.append(Image(source=filename))
+            else:
+                load_texture(filename, swap_loaded)
+        
+        # a vibrato on every finger
+        for finger, touch in enumerate(touches):
+            harness.touch_move(touch, harness.key_x(finger * 4) + (frame % 10) * 2 - 10, y)
+        harness.frame()
+        frame_times.append(time.time() - start)
+        trace.append((variant, frame, frame_times[-1] * 1000, 'swap' if swap else ''))
+    
+    for touch in touches:
+        harness.touch_up(touch)
+    harness.settle(1)
+    return frame_times
+
+
+def main():
+    harness = Harness()
+    # the loader starts its threads and loads its error image (load_texture compares with it) on
+    # first use. In the application that's at startup, with the first background - not while playing.
+    Loader.start()
+    Loader.error_image
+    trace = []
+    rows = []
+    for variant in ('synchronous', 'loader'):
+        frame_times = play(harness, variant, trace)
+        rows += [
+            ('%s: frame time, 50th percentile' % variant, percentile(frame_times, 0.5) * 1000, 'ms'),
+            ('%s: frame time, max' % variant, max(frame_times) * 1000, 'ms'),
+            ('%s: dropped frames' % variant, len([t for t in frame_times if t > FRAME_BUDGET]), ''),
+            ]
+    
+    report('Background swaps while playing with %i fingers (%i images per variant)' % (FINGERS, len(IMAGES['loader'])), rows)
+    
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w') as trace_file:
+            for line in trace:
+                trace_file.write('%s %i %.3f %s\n' % line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+x-to-key lookups: the calculation calculate_key did per call (a division and a
+new dict) against KeyGeometry.key_at, for 60 keys of the same width and for 60
+keys of different widths. Every lookup is checked against a binary
+search over the key edges.
+Then the key lookups of one Keyboard.on_touch_move, before and after: binding
+the x positions to the keyboard used to look up the window through the widget
+tree (stand-in widgets here) every time, calculate_key bound them once more.
+
+    python -m benchmarks.bench_key_geometry
+'''
+
+
+import bisect
+import random
+
+from keygeometry import KeyGeometry
+from benchmarks import measure, report
+
+
+KEYS = 60
+KEY_WIDTH = 50
+LOOKUPS = 10000
+REPEAT = 20
+
+
+def calculate_key_dict(x):
+    # calculate_key as it was (without the window lookup of bind_x_on_keyboard)
+    keynumber = int(x / KEY_WIDTH)
+    return {'keyposition_relative_to_keyboard': keynumber * KEY_WIDTH, 'keynumber': keynumber}
+
+
+class StandInWidget(object):
+    # get_parent_window like kivy's Widget (the window returns itself)
+    def __init__(self, parent=None, width=1280):
+        self.parent = parent
+        self.width = width
+        self.x = 0
+    
+    def get_parent_window(self):
+        if self.parent:
+            return self.parent.get_parent_window()
+        return self
+
+
+def boundary(value, minvalue, maxvalue):
+    # like kivy.utils.boundary
+    return min(max(value, minvalue), maxvalue)
+
+
+def bind_x_before(keyboard, x):
+    win = keyboard.get_parent_window()
+    if keyboard.x > 0:
+        return boundary(x, keyboard.x, win.width)
+    elif keyboard.x < win.width - keyboard.width:
+        return boundary(x, 0, keyboard.x + keyboard.width)
+    return x
+
+
+def bind_x_after(keyboard, x, window_width):
+    if keyboard.x > 0:
+        return boundary(x, keyboard.x, window_width)
+    elif keyboard.x < window_width - keyboard.width:
+        return boundary(x, 0, keyboard.x + keyboard.width)
+    return x
+
+
+def move_before(keyboard, x, px):
+    bounded_x = bind_x_before(keyboard, x)
+    bounded_previous_x = bind_x_before(keyboard, px)
+    rounded_key = int(calculate_key_dict(bind_x_before(keyboard, bounded_x) - keyboard.x)['keyposition_relative_to_keyboard'] + (KEY_WIDTH / 2.0))
+    return calculate_key_dict(bind_x_before(keyboard, bounded_previous_x) - keyboard.x)['keyposition_relative_to_keyboard'] + keyboard.x
+
+
+def move_after(keyboard, geometry, x, px):
+    window_width = keyboard.window.width
+    bounded_x = bind_x_after(keyboard, x, window_width)
+    bounded_previous_x = bind_x_after(keyboard, px, window_width)
+    key = geometry.key_at(bounded_x - keyboard.x)
+    previous_key = geometry.key_at(bounded_previous_x - keyboard.x)
+    return int(geometry.centers[key]), key != previous_key
+
+
+def lookups_per_second(function, positions):
+    def run():
+        for x in positions:
+            function(x)
+    return 1000000.0 / measure(run, REPEAT) * len(positions)
+
+
+def errors(geometry, positions):
+    count = 0
+    for x in positions:
+        expected = min(max(bisect.bisect_right(geometry.lefts, x) - 1, 0), geometry.count - 1)
+        if geometry.key_at(x) != expected:
+            count += 1
+    return count
+
+
+def main():
+    random.seed(1)
+    uniform = KeyGeometry.uniform(KEY_WIDTH, KEYS * KEY_WIDTH)
+    # e.g. a layout with wider keys in the middle
+    mixed = KeyGeometry([random.choice((30, 40, 50, 65.5)) for i in xrange(KEYS)])
+    
+    uniform_positions = [random.uniform(0, uniform.width) for i in xrange(LOOKUPS)]
+    mixed_positions = [random.uniform(0, mixed.width) for i in xrange(LOOKUPS)]
+    
+    window = StandInWidget()
+    keyboard = StandInWidget(StandInWidget(window), KEYS * KEY_WIDTH)
+    keyboard.x = -500
+    keyboard.window = window
+    
+    report('Key lookups (%i keys)' % KEYS, [
+        ('division + dict (calculate_key before)', lookups_per_second(calculate_key_dict, uniform_positions), 'lookups/s'),
+        ('KeyGeometry, same widths', lookups_per_second(uniform.key_at, uniform_positions), 'lookups/s'),
+        ('KeyGeometry, different widths', lookups_per_second(mixed.key_at, mixed_positions), 'lookups/s'),
+        ('binary search, different widths', lookups_per_second(lambda x: bisect.bisect_right(mixed.lefts, x) - 1, mixed_positions), 'lookups/s'),
+        ('wrong keys, same widths', errors(uniform, uniform_positions), ''),
+        ('wrong keys, different widths', errors(mixed, mixed_positions), ''),
+        ('build the table', measure(lambda: KeyGeometry.uniform(KEY_WIDTH, KEYS * KEY_WIDTH), 1000), 'us'),
+        ])
+    report('Key lookups of one on_touch_move', [
+        ('before (window lookups, dicts)', measure(lambda: move_before(keyboard, 700.5, 690.5), LOOKUPS * 10), 'us'),
+        ('after (KeyGeometry)', measure(lambda: move_after(keyboard, uniform, 700.5, 690.5), LOOKUPS * 10), 'us'),
+        ])
+
+
+if __name__ == '__main__':
+    main()
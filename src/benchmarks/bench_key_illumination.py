@@ -0,0 +1,148 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+Frame time during a glissando over 60 keys with 5 fingers, with the pooled key
+lights (KeyLightPool) and with the key illumination they have replaced: one
+StencilView with two Image widgets per key, faded by two Animations and removed
+afterwards (rebuilt here from the textures the keyboard passes to its lights).
+
+    python -m benchmarks.bench_key_illumination
+'''
+
+
+from benchmarks import report
+from benchmarks.harness import Harness, percentile
+
+# (after the harness: it configures kivy)
+from kivy.animation import Animation
+from kivy.uix.image import Image
+from kivy.uix.stencilview import StencilView
+from keyboard import KEY_FADEOUT_TIME
+
+
+FINGERS = 5
+KEYS = 60
+# pixels per frame and finger
+STEP = 10
+
+
+class StencilKeyLight(object):
+    # the interface of a KeyLight, with the widgets of the old illumination
+    def __init__(self, keyboard):
+        self.keyboard = keyboard
+    
+    def show(self, clip, universal_texture, universal_rect, universal_alpha, key_texture, key_rect, key_rgba):
+        x, y, width, height = clip
+        self.stencil = StencilView(pos=(x, y), size=(width, height))
+        self.universal_image = Image(texture=universal_texture, color=(1, 1, 1, universal_alpha), allow_stretch=True,
+            pos=universal_rect[:2], size=universal_rect[2:])
+        self.key_image = Image(texture=key_texture, color=key_rgba, allow_stretch=True,
+            pos=key_rect[:2], size=key_rect[2:])
+        self.stencil.add_widget(self.universal_image)
+        self.stencil.add_widget(self.key_image)
+        self.keyboard.add_widget(self.stencil)
+    
+    def move_key_image(self, y):
+        self.key_image.y = y
+    
+    def set_universal_alpha(self, alpha):
+        self.universal_image.color = (1, 1, 1, alpha)
+
+
+class StencilKeyLights(object):
+    # the interface of a KeyLightPool: a new light per key, two Animations per fade out
+    def __init__(self, keyboard):
+        self.keyboard = keyboard
+    
+    def acquire(self):
+        return StencilKeyLight(self.keyboard)
+    
+    def fadeout(self, light):
+        fadeouts = [
+            (light.key_image, Animation(color=(1, 1, 1, 0), t='out_expo', duration=KEY_FADEOUT_TIME)),
+            (light.universal_image, Animation(color=(1, 1, 1, 0), t='out_expo', duration=KEY_FADEOUT_TIME))]
+        for image, animation in fadeouts:
+            animation.bind(on_complete=self.fadeout_complete)
+            animation.start(image)
+    
+    def fadeout_complete(self, animation, image):
+        # the second image to finish removes the StencilView
+        stencil = image.parent
+        stencil.remove_widget(image)
+        if not stencil.children:
+            self.keyboard.remove_widget(stencil)
+
+
+def glissando(harness):
+    # returns the frame times and the highest number of widgets in the tree
+    keyboard = harness.keyboard
+    y = keyboard.center_y
+    
+    # all the fingers start on the lowest keys and glide up together
+    touches = [harness.touch_down(harness.key_x(finger), y) for finger in range(FINGERS)]
+    harness.frame()
+    
+    frame_times = []
+    max_widgets = 0
+    distance = 0
+    while distance < (KEYS - FINGERS) * keyboard.key_width:
+        distance += STEP
+        for finger, touch in enumerate(touches):
+            harness.touch_move(touch, harness.key_x(finger) + distance, y + (distance % 40) - 20)
+        frame_times.append(harness.frame())
+        max_widgets = max(max_widgets, harness.widget_count())
+    
+    for touch in touches:
+        harness.touch_up(touch)
+    harness.settle(2.5)
+    return frame_times, max_widgets
+
+
+def main():
+    harness = Harness()
+    keyboard = harness.keyboard
+    key_lights = keyboard.key_lights
+    
+    rows = []
+    for name, lights in (('stencil views', StencilKeyLights(keyboard)), ('light pool', key_lights)):
+        keyboard.key_lights = lights
+        frame_times, max_widgets = glissando(harness)
+        rows.extend([
+            ('%s: frame time, mean' % name, sum(frame_times) / len(frame_times) * 1000, 'ms'),
+            ('%s: frame time, 50th percentile' % name, percentile(frame_times, 0.5) * 1000, 'ms'),
+            ('%s: frame time, 95th percentile' % name, percentile(frame_times, 0.95) * 1000, 'ms'),
+            ('%s: frame time, max' % name, max(frame_times) * 1000, 'ms'),
+            ('%s: widgets, max' % name, max_widgets, ''),
+            ('%s: widgets after the fade out' % name, harness.widget_count(), ''),
+            ])
+    
+    rows.extend([
+        ('blob pool misses', harness.host.blob_pool.misses, ''),
+        ('key light pool misses', key_lights.lights.misses, ''),
+        ])
+    report('Glissando over %i keys with %i fingers (%i frames)' % (KEYS, FINGERS, len(frame_times)), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+The cost of the latency tracing (latencytracer.py): one frame of MIDI messages
+through MidiOutput with the tracing off and on, and recording one value into a
+histogram. Also checks the percentiles of the histogram against the exact ones
+of the same values.
+
+    python -m benchmarks.bench_latency
+'''
+
+
+import random
+
+import latencytracer
+from latencytracer import Histogram, LatencyTracer
+from midioutput import MidiOutput
+from benchmarks import measure, percentile, report
+
+
+VOICES = 10
+ITERATIONS = 20000
+SAMPLES = 100000
+
+
+class NullPort(object):
+    def write(self, data):
+        pass
+
+
+def frame(midi_out, tracer, time_update):
+    # what one frame sends for 10 moving fingers: a pitch bend and a CC per voice
+    for channel in xrange(VOICES):
+        if tracer is not None:
+            tracer.move(channel, time_update)
+        midi_out.write_short(0xE0 + channel, channel, 64)
+        midi_out.write_short(0xB0 + channel, 1, channel)
+    midi_out.flush()
+    midi_out.reset()
+
+
+def main():
+    midi_out = MidiOutput(NullPort())
+    latencytracer.disable()
+    off = measure(lambda: frame(midi_out, latencytracer.tracer, 0), ITERATIONS)
+    tracer = latencytracer.enable()
+    on = measure(lambda: frame(midi_out, latencytracer.tracer, 1.0), ITERATIONS)
+    latencytracer.disable()
+    
+    histogram = Histogram()
+    record = measure(lambda: histogram.record(1234.5), ITERATIONS)
+    
+    # accuracy: log-normal latencies around 2 ms with a long tail
+    random.seed(1)
+    values = [random.lognormvariate(7.6, 0.8) for i in xrange(SAMPLES)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    worst_error = max(abs(histogram.percentile(fraction) - int(percentile(values, fraction))) / percentile(values, fraction)
+        for fraction in latencytracer.PERCENTILES)
+    
+    report('Latency tracing (%i voices, one frame: %i messages)' % (VOICES, VOICES * 2), [
+        ('frame, tracing off', off, 'us'),
+        ('frame, tracing on', on, 'us'),
+        ('histogram record', record, 'us'),
+        ('largest percentile error (%i values)' % SAMPLES, worst_error * 100, '%'),
+        ('bend: MIDI write samples', tracer.histograms[latencytracer.BEND_WRITE].count, ''),
+        ])
+
+
+if __name__ == '__main__':
+    main()
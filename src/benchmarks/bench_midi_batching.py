@@ -0,0 +1,111 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Throughput of unbatched (one write_short per message) against batched
+(MidiOutput, one Output.write per tick) MIDI output on a stub device.
+
+The stub simulates the fixed cost of one PortMidi driver call with a busy
+wait (CALL_OVERHEAD), plus a small cost per message.
+
+    python -m benchmarks.bench_midi_batching
+'''
+
+
+import time
+
+from midioutput import MidiOutput
+from benchmarks import report
+
+
+VOICES = 10
+TICKS = 2000
+CALL_OVERHEAD = 0.00002 # 20 us per driver call
+MESSAGE_OVERHEAD = 0.000001 # 1 us per message
+
+
+def busy_wait(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class StubOutput(object):
+    # has the interface of pygame.midi.Output, but only counts
+    def __init__(self):
+        self.calls = 0
+        self.messages = 0
+    
+    def write_short(self, status, data1=0, data2=0):
+        self.calls += 1
+        self.messages += 1
+        busy_wait(CALL_OVERHEAD + MESSAGE_OVERHEAD)
+    
+    def write(self, data):
+        self.calls += 1
+        self.messages += len(data)
+        busy_wait(CALL_OVERHEAD + MESSAGE_OVERHEAD * len(data))
+    
+    def close(self):
+        pass
+
+
+def run_unbatched():
+    port = StubOutput()
+    start = time.time()
+    for tick in xrange(TICKS):
+        for voice in xrange(VOICES):
+            port.write_short(0xE0, tick & 0x7F, voice)
+    return port, time.time() - start
+
+
+def run_batched(batch_size):
+    port = StubOutput()
+    midi_out = MidiOutput(port, batch_size)
+    start = time.time()
+    for tick in xrange(TICKS):
+        for voice in xrange(VOICES):
+            midi_out.write_short(0xE0, tick & 0x7F, voice)
+        # end of the rounding tick
+        midi_out.flush()
+    return port, time.time() - start
+
+
+def main():
+    rows = []
+    port, duration = run_unbatched()
+    rows.append(('unbatched: messages/s', port.messages / duration, ''))
+    rows.append(('unbatched: port calls', port.calls, ''))
+    
+    for batch_size in (4, 64):
+        port, duration = run_batched(batch_size)
+        rows.append(('batched (max %i): messages/s' % batch_size, port.messages / duration, ''))
+        rows.append(('batched (max %i): port calls' % batch_size, port.calls, ''))
+    
+    report('MIDI output, %i voices x %i ticks' % (VOICES, TICKS), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Recording a long take with the MidiFileWriter: 10 voices with a continuous pitch
+bend at 100 Hz each (plus a new note every second per voice) for an hour of
+simulated time - 3.6 million events. The clock of the writer is simulated, so this
+runs as fast as the writer can go.
+Reports the time per event, the file size and how much the memory grew (it must
+not grow with the length of the take), then reads the file back and repairs a copy
+that was cut off in the middle of an event (like after a crash).
+
+    python -m benchmarks.bench_midifile [minutes]
+'''
+
+
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import midifile
+from benchmarks import report
+
+
+VOICES = 10
+BEND_RATE = 100
+MINUTES = 60
+
+
+class SimulatedClock(object):
+    # stands in for the time module of midifile
+    def __init__(self):
+        self.now = 1000.0
+    
+    def time(self):
+        return self.now
+
+
+def max_rss():
+    # peak memory of the process in KB (Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def record(filename, minutes):
+    clock = SimulatedClock()
+    midifile.time = clock
+    try:
+        writer = midifile.MidiFileWriter(filename)
+        start = time.time()
+        tick = 1.0 / BEND_RATE
+        for step in xrange(int(minutes * 60 * BEND_RATE)):
+            clock.now += tick
+            for channel in xrange(VOICES):
+                if step % BEND_RATE == 0:
+                    if step:
+                        writer.note_off(48 + channel, 0, channel)
+                    writer.note_on(48 + channel, 100, channel)
+                value = 8192 + (step * 37 + channel * 1000) % 4096 - 2048
+                writer.write_short(0xE0 + channel, value & 0x7F, value >> 7)
+        writer.close()
+        return writer.events, time.time() - start
+    finally:
+        midifile.time = time
+
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else MINUTES
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'take.mid')
+        rss_before = max_rss()
+        events, duration = record(filename, minutes)
+        rss_growth = max_rss() - rss_before
+        
+        start = time.time()
+        read_back = sum(1 for event in midifile.read_events(filename))
+        read_duration = time.time() - start
+        
+        # a crash in the middle of an event: the track length is still 0 and the last event is cut off
+        crashed = os.path.join(directory, 'crashed.mid')
+        shutil.copyfile(filename, crashed)
+        with open(crashed, 'r+b') as f:
+            f.seek(midifile.TRACK_LENGTH_OFFSET)
+            f.write('\x00\x00\x00\x00')
+            f.truncate(os.path.getsize(filename) // 2 + 1)
+        start = time.time()
+        repaired = midifile.repair(crashed)
+        repair_duration = time.time() - start
+        repaired_events = sum(1 for event in midifile.read_events(crashed))
+        
+        report('MIDI file recording (%i voices, pitch bend at %i Hz, %g minutes)' % (VOICES, BEND_RATE, minutes), [
+            ('events written', events, ''),
+            ('time per event', duration * 1000000.0 / events, 'us'),
+            ('file size', os.path.getsize(filename) / 1024, 'KB'),
+            ('bytes per event', os.path.getsize(filename) / float(events), ''),
+            ('peak memory growth while recording', rss_growth, 'KB'),
+            ('events read back', read_back, ''),
+            ('read back', read_duration, 's'),
+            ('cut-off copy repaired', int(repaired), ''),
+            ('repair', repair_duration, 's'),
+            ('events in the repaired copy', repaired_events, ''),
+            ])
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+A synthetic 240 Hz touch screen: 5 fingers with a vibrato and a slow slide,
+4 moves per finger and frame at 60 frames per second. Without coalescing every
+move updates the graphics (blob, key light, feedback wall), with a
+MoveCoalescer only the newest move per finger and frame does. Both runs get
+the same moves: the pitch path has to see all of them and the Y axis MIDI
+messages have to be the same.
+
+    python -m benchmarks.bench_move_coalescing
+'''
+
+
+import math
+import time
+
+from kivy.clock import Clock
+
+from movecoalescer import MoveCoalescer
+from midioutput import CHANNEL_PRESSURE
+from benchmarks import report, percentile
+from benchmarks.harness import Harness
+
+
+INPUT_RATE = 240
+FRAME_RATE = 60
+FRAMES = 300
+KEYS = (12, 16, 19, 24, 28)
+
+
+class CapturingPort(object):
+    # a MIDI device that keeps all the messages
+    def __init__(self):
+        self.messages = []
+    
+    def write(self, data):
+        self.messages.extend(tuple(message) for message, timestamp in data)
+    
+    def write_short(self, status, data1=0, data2=0):
+        self.messages.append((status, data1, data2))
+    
+    def close(self):
+        pass
+
+
+def run(harness, coalescer):
+    keyboard = harness.keyboard
+    keyboard.move_coalescer = coalescer
+    port = CapturingPort()
+    harness.host.midi_out.set_port(port)
+    
+    # count the moves reaching the pitch path
+    pitch_moves = [0]
+    move_pitch = keyboard.move_pitch
+    def counting_move_pitch(touch):
+        pitch_moves[0] += 1
+        move_pitch(touch)
+    keyboard.move_pitch = counting_move_pitch
+    
+    y = keyboard.center_y
+    touches = [harness.touch_down(harness.key_x(key), y) for key in KEYS]
+    harness.frame()
+    
+    moves_per_frame = INPUT_RATE / FRAME_RATE
+    frame_times = []
+    for frame in xrange(FRAMES):
+        # (the moves of a frame count to its time)
+        start = time.time()
+        for sample in xrange(moves_per_frame):
+            t = (frame * moves_per_frame + sample) / float(INPUT_RATE)
+            offset = 10 * math.sin(2 * math.pi * 6 * t) + 100 * t
+            for finger, (key, touch) in enumerate(zip(KEYS, touches)):
+                harness.touch_move(touch, harness.key_x(key) + offset, y + 40 * math.sin(2 * math.pi * t + finger))
+        harness.frame()
+        frame_times.append(time.time() - start)
+    
+    for touch in touches:
+        harness.touch_up(touch)
+    harness.settle(2.5)
+    keyboard.x = 0
+    del keyboard.move_pitch
+    keyboard.move_coalescer = None
+    
+    y_axis = [message for message in port.messages if message[0] & 0xF0 == CHANNEL_PRESSURE]
+    return frame_times, pitch_moves[0], y_axis
+
+
+def main():
+    harness = Harness()
+    moves = FRAMES * (INPUT_RATE / FRAME_RATE) * len(KEYS)
+    
+    # (the same timing the app uses: before the next frame is drawn)
+    coalescer = MoveCoalescer(lambda callback: Clock.schedule_once(callback, -1))
+    plain_frames, plain_pitch_moves, plain_y_axis = run(harness, None)
+    coalesced_frames, coalesced_pitch_moves, coalesced_y_axis = run(harness, coalescer)
+    
+    rows = [
+        ('moves sent', moves, ''),
+        ('every move: frame time, 50th percentile', percentile(plain_frames, 0.5) * 1000, 'ms'),
+        ('every move: frame time, 95th percentile', percentile(plain_frames, 0.95) * 1000, 'ms'),
+        ('every move: moves to the pitch path', plain_pitch_moves, ''),
+        ('coalesced: frame time, 50th percentile', percentile(coalesced_frames, 0.5) * 1000, 'ms'),
+        ('coalesced: frame time, 95th percentile', percentile(coalesced_frames, 0.95) * 1000, 'ms'),
+        ('coalesced: moves to the pitch path', coalesced_pitch_moves, ''),
+        ('coalesced: moves received', coalescer.received, ''),
+        ('coalesced: moves processed for the graphics', coalescer.processed, ''),
+        ('Y axis MIDI messages: every move', len(plain_y_axis), ''),
+        ('Y axis MIDI messages: coalesced', len(coalesced_y_axis), ''),
+        ('Y axis MIDI messages identical', int(plain_y_axis == coalesced_y_axis), ''),
+        ]
+    report('%i Hz input, %i fingers, %i frames at %i fps' % (INPUT_RATE, len(KEYS), FRAMES, FRAME_RATE), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+Switching the MIDI output back and forth between two devices while 8 notes
+are held and bent: opening a new port for every switch (as set_midi_device
+did, the old port was never closed) against the OutputPool and
+MidiOutput.swap_port (the ports are opened once). Last, the same with the pitch
+bends sent by a ControlRateEngine (ControlRate on): it has to reset its bent
+channels on the old device too.
+
+The stub devices simulate the cost of opening a PortMidi output with a busy
+wait (OPEN_OVERHEAD), the driver calls themselves cost nothing here.
+
+    python -m benchmarks.bench_output_pool
+'''
+
+
+import time
+
+from appsettings import AppSettings
+from midioutput import MidiOutput, NOTE_OFF, PITCH_BEND
+from outputpool import OutputPool
+from deviceregistry import DeviceRegistry, MidiDevice
+from controlrate import ControlRateEngine
+from keygeometry import KeyGeometry
+from tuning import Tuning, PitchTable
+from benchmarks import make_config, percentile, report
+
+
+DEVICES = ['Synth A', 'Synth B']
+HELD_NOTES = 8
+SWITCHES = 200
+OPEN_OVERHEAD = 0.005 # 5 ms per opened device
+# for the control-rate engine (the voices are bent by BEND_OFFSET pixel)
+KEY_WIDTH = 50
+KEYS = 60
+BEND_OFFSET = 20
+CONTROL_RATE = 500
+
+
+def busy_wait(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class StubOutput(object):
+    # has the interface of pygame.midi.Output, remembers what was written to it
+    open_ports = 0
+    
+    def __init__(self, device_id):
+        busy_wait(OPEN_OVERHEAD)
+        StubOutput.open_ports += 1
+        self.device_id = device_id
+        self.messages = []
+        self.closed = False
+    
+    def write(self, data):
+        self.messages.extend(tuple(message) for message, timestamp in data)
+    
+    def write_short(self, status, data1=0, data2=0):
+        self.messages.append((status, data1, data2))
+    
+    def close(self):
+        StubOutput.open_ports -= 1
+        self.closed = True
+
+
+def scan_devices():
+    return [MidiDevice(i, 'stub', name, 0, 1, 0) for i, name in enumerate(DEVICES)]
+
+
+def play(midi_out):
+    # the held notes, every one bent on its own channel (like MPE)
+    for channel in xrange(HELD_NOTES):
+        midi_out.write_short(PITCH_BEND + channel, 0, 70)
+        midi_out.note_on(60 + channel, 127, channel)
+    midi_out.flush()
+
+
+def is_silenced(port):
+    # every note got its note-off and every channel its pitch bend reset
+    notes_off = set((status & 0x0F, note) for status, note, velocity in port.messages if status & 0xF0 == NOTE_OFF)
+    bends_reset = set(status & 0x0F for status, lsb, msb in port.messages if status & 0xF0 == PITCH_BEND and (lsb, msb) == (0, 64))
+    return len(notes_off) == HELD_NOTES and len(bends_reset) == HELD_NOTES
+
+
+def reopening():
+    # a new port on every switch (the old one stays open, its notes keep sounding)
+    StubOutput.open_ports = 0
+    midi_out = MidiOutput(StubOutput(0))
+    times = []
+    silenced = 0
+    for switch in xrange(SWITCHES):
+        play(midi_out)
+        old_port = midi_out.port
+        start = time.time()
+        midi_out.set_port(StubOutput((switch + 1) % len(DEVICES)))
+        times.append(time.time() - start)
+        silenced += is_silenced(old_port)
+    return times, StubOutput.open_ports, silenced
+
+
+def pooled():
+    StubOutput.open_ports = 0
+    pool = OutputPool(DeviceRegistry(scan_devices, 0), StubOutput)
+    midi_out = MidiOutput(pool.acquire(DEVICES[0]))
+    times = []
+    silenced = 0
+    for switch in xrange(SWITCHES):
+        play(midi_out)
+        old_port = midi_out.port
+        del old_port.messages[:]
+        start = time.time()
+        midi_out.swap_port(pool.acquire(DEVICES[(switch + 1) % len(DEVICES)]))
+        times.append(time.time() - start)
+        silenced += is_silenced(old_port)
+    open_ports = StubOutput.open_ports
+    pool.close()
+    return times, open_ports, silenced, pool.opened
+
+
+def pooled_with_control_rate():
+    # the notes are played by the MidiOutput, the pitch bends sent by the engine (its thread isn't started, it's ticked here)
+    StubOutput.open_ports = 0
+    settings = AppSettings(make_config())
+    pool = OutputPool(DeviceRegistry(scan_devices, 0), StubOutput)
+    midi_out = MidiOutput(pool.acquire(DEVICES[0]))
+    engine = ControlRateEngine(settings, CONTROL_RATE, 1)
+    engine.set_port(midi_out.port)
+    pitch_table = PitchTable(Tuning.equal_temperament(), KeyGeometry.uniform(KEY_WIDTH, KEYS * KEY_WIDTH), 0, settings.pitch_bend_range)
+    for channel in xrange(HELD_NOTES):
+        key = 10 + channel
+        position = (key + 0.5) * KEY_WIDTH + BEND_OFFSET
+        engine.add(channel, position, position, pitch_table, pitch_table.key_bases[key], 0.0, 0)
+    
+    times = []
+    silenced = 0
+    for switch in xrange(SWITCHES):
+        for channel in xrange(HELD_NOTES):
+            midi_out.note_on(60 + channel, 127, channel)
+        # (sends the pitch bends again after a switch)
+        engine.tick(0.0, 0)
+        old_port = midi_out.port
+        del old_port.messages[:]
+        start = time.time()
+        port = pool.acquire(DEVICES[(switch + 1) % len(DEVICES)])
+        engine.set_port(port)
+        midi_out.swap_port(port)
+        times.append(time.time() - start)
+        silenced += is_silenced(old_port)
+    pool.close()
+    return times, silenced
+
+
+def main():
+    rows = []
+    times, open_ports, silenced = reopening()
+    rows += [
+        ('reopen: switch, 50th percentile', percentile(times, 0.5) * 1000000, 'us'),
+        ('reopen: switch, max', max(times) * 1000000, 'us'),
+        ('reopen: ports left open', open_ports, ''),
+        ('reopen: old ports silenced', silenced, 'of %i' % SWITCHES),
+        ]
+    times, open_ports, silenced, opened = pooled()
+    rows += [
+        ('pool: switch, 50th percentile', percentile(times, 0.5) * 1000000, 'us'),
+        ('pool: switch, max', max(times) * 1000000, 'us'),
+        ('pool: ports opened', opened, ''),
+        ('pool: ports left open', open_ports, ''),
+        ('pool: old ports silenced', silenced, 'of %i' % SWITCHES),
+        ]
+    times, silenced = pooled_with_control_rate()
+    rows += [
+        ('pool + control rate: switch, 50th percentile', percentile(times, 0.5) * 1000000, 'us'),
+        ('pool + control rate: old ports silenced', silenced, 'of %i' % SWITCHES),
+        ]
+    report('%i device switches with %i held notes (opening a port: %i ms)' % (SWITCHES, HELD_NOTES, OPEN_OVERHEAD * 1000), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+'''
+The touch-to-MIDI pipeline (Keyboard.on_touch_down, on_touch_move, on_touch_up
+and the rounding) driven by synthetic multi-touch scenarios, with a NullMidiPort
+as MIDI device. Per scenario: events/s, MIDI messages/s, pitch bends, latency
+percentiles per event type, widgets in the tree and objects left behind.
+
+Every scenario runs twice: rounded on the frame clock (roundAllKeys, ControlRate
+0, the default) and by the ControlRateEngine at 500 Hz (its ticks aren't timed,
+they run on their own thread).
+
+    python -m benchmarks.bench_pipeline [--json results.json] [scenario ...]
+
+With --json, the results are written as JSON too ("-" for the console), so
+the numbers of two revisions can be compared by a script.
+'''
+
+
+import gc
+import sys
+import json
+import math
+import time
+import platform
+
+import kivy
+
+from benchmarks import report, percentile
+from benchmarks.harness import Harness
+
+
+# the rate of the second run of every scenario (the application rounds on the frame clock by default)
+CONTROL_RATE = 500
+
+
+'''
+####################################
+##
+##   Scenarios
+##
+####################################
+'''
+# every scenario is a generator: it sends the touch events through the harness and
+# yields after every frame's events (the frame itself is run by the caller)
+
+def single_taps(harness):
+    # one finger taps 120 keys one after the other
+    y = harness.keyboard.center_y
+    for i in range(120):
+        touch = harness.touch_down(harness.key_x(i * 7 % 60), y)
+        yield
+        harness.touch_up(touch)
+        yield
+
+
+def chords(harness):
+    # 10-finger chords, held for 30 frames with the fingers trembling a little
+    y = harness.keyboard.center_y
+    for chord in range(10):
+        touches = [harness.touch_down(harness.key_x((chord + finger * 5) % 60), y) for finger in range(10)]
+        yield
+        for frame in range(30):
+            for finger, touch in enumerate(touches):
+                harness.touch_move(touch, touch.x + (1 if frame % 2 else -1), y + finger)
+            yield
+        for touch in touches:
+            harness.touch_up(touch)
+        yield
+
+
+def glissando(harness):
+    # 5 fingers slide fast over 55 keys, up and down again
+    keyboard = harness.keyboard
+    y = keyboard.center_y
+    step = 25
+    touches = [harness.touch_down(harness.key_x(finger), y) for finger in range(5)]
+    yield
+    distance = 0
+    for direction in (1, -1):
+        for frame in range(int(55 * keyboard.key_width / step)):
+            distance += step * direction
+            for finger, touch in enumerate(touches):
+                harness.touch_move(touch, harness.key_x(finger) + distance, y)
+            yield
+    for touch in touches:
+        harness.touch_up(touch)
+    yield
+
+
+def vibrato(harness):
+    # 4 fingers with a 6 Hz vibrato of +/- 10 pixel (at 60 frames per second)
+    y = harness.keyboard.center_y
+    keys = (12, 16, 19, 24)
+    touches = [harness.touch_down(harness.key_x(key), y) for key in keys]
+    yield
+    for frame in range(300):
+        offset = 10 * math.sin(2 * math.pi * 6 * frame / 60.0)
+        for key, touch in zip(keys, touches):
+            harness.touch_move(touch, harness.key_x(key) + offset, y)
+        yield
+    for touch in touches:
+        harness.touch_up(touch)
+    yield
+
+
+def scroll_while_playing(harness):
+    # 3 fingers hold a chord while the keyboard is scrolled underneath them
+    keyboard = harness.keyboard
+    y = keyboard.center_y
+    touches = [harness.touch_down(harness.key_x(key), y) for key in (20, 24, 27)]
+    yield
+    for frame in range(200):
+        harness.scroll(-5 if frame < 100 else 5)
+        for touch in touches:
+            harness.touch_move(touch, touch.x, y)
+        yield
+    for touch in touches:
+        harness.touch_up(touch)
+    yield
+
+
+SCENARIOS = [
+    ('single_taps', single_taps),
+    ('chords', chords),
+    ('glissando', glissando),
+    ('vibrato', vibrato),
+    ('scroll_while_playing', scroll_while_playing),
+    ]
+
+
+'''
+####################################
+##
+##   Measurement
+##
+####################################
+'''
+class TimedHarness(object):
+    # the harness, with the time of every event (and rounding tick) recorded
+    def __init__(self, harness):
+        self.harness = harness
+        self.keyboard = harness.keyboard
+        self.latencies = {'down': [], 'move': [], 'up': [], 'rounding': []}
+        
+        # (has to be replaced before the keyboard schedules it)
+        round_all_keys = harness.keyboard.roundAllKeys
+        def timed_round_all_keys(dt):
+            start = time.time()
+            result = round_all_keys(dt)
+            self.latencies['rounding'].append(time.time() - start)
+            return result
+        harness.keyboard.roundAllKeys = timed_round_all_keys
+    
+    def key_x(self, key):
+        return self.harness.key_x(key)
+    
+    def timed(self, kind, function, *args):
+        start = time.time()
+        result = function(*args)
+        self.latencies[kind].append(time.time() - start)
+        return result
+    
+    def touch_down(self, x, y):
+        return self.timed('down', self.harness.touch_down, x, y)
+    
+    def touch_move(self, touch, x, y):
+        self.timed('move', self.harness.touch_move, touch, x, y)
+    
+    def touch_up(self, touch):
+        self.timed('up', self.harness.touch_up, touch)
+    
+    def scroll(self, dx):
+        self.harness.scroll(dx)
+
+
+def object_count():
+    gc.collect()
+    return len(gc.get_objects())
+
+
+def run_scenario(harness, scenario):
+    timed_harness = TimedHarness(harness)
+    keyboard = harness.keyboard
+    midi_port = harness.host.midi_port
+    blob_misses = harness.host.blob_pool.misses
+    key_light_misses = keyboard.key_lights.lights.misses
+    
+    objects_before = object_count()
+    messages_before = midi_port.messages
+    pitch_bends_before = midi_port.pitch_bends
+    frame_times = []
+    max_widgets = 0
+    
+    start = time.time()
+    for step in scenario(timed_harness):
+        frame_times.append(harness.frame())
+        max_widgets = max(max_widgets, harness.widget_count())
+    duration = time.time() - start
+    
+    # let everything fade out, put the keyboard back
+    harness.settle(2.5)
+    keyboard.x = 0
+    del keyboard.roundAllKeys
+    
+    latencies = timed_harness.latencies
+    events = sum(len(latencies[kind]) for kind in ('down', 'move', 'up'))
+    event_time = sum(sum(latencies[kind]) for kind in ('down', 'move', 'up'))
+    messages = midi_port.messages - messages_before
+    
+    result = {
+        'frames': len(frame_times),
+        'duration_s': duration,
+        'events': events,
+        'events_per_s': events / event_time if event_time else 0,
+        'midi_messages': messages,
+        'midi_messages_per_s': messages / duration,
+        'pitch_bends': midi_port.pitch_bends - pitch_bends_before,
+        'frame_time_ms': percentiles(frame_times),
+        'widgets_max': max_widgets,
+        'widgets_after': harness.widget_count(),
+        'blob_pool_misses': harness.host.blob_pool.misses - blob_misses,
+        'key_light_pool_misses': keyboard.key_lights.lights.misses - key_light_misses,
+        'objects_left_behind': object_count() - objects_before,
+        }
+    for kind, values in latencies.items():
+        result['%s_latency_us' % kind] = percentiles(values, 1000000)
+    return result
+
+
+def percentiles(values, scale=1000):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.5) * scale,
+        'p95': percentile(values, 0.95) * scale,
+        'p99': percentile(values, 0.99) * scale,
+        'max': max(values) * scale if values else 0,
+        }
+
+
+def report_scenario(title, result):
+    rows = [
+        ('events', result['events'], ''),
+        ('events/s (time in the touch handlers)', result['events_per_s'], ''),
+        ('MIDI messages', result['midi_messages'], ''),
+        ('MIDI messages/s', result['midi_messages_per_s'], ''),
+        ('pitch bends', result['pitch_bends'], ''),
+        ]
+    for kind in ('down', 'move', 'up', 'rounding'):
+        values = result['%s_latency_us' % kind]
+        if values['count']:
+            rows += [('%s latency, %s' % (kind, key), values[key], 'us') for key in ('p50', 'p99', 'max')]
+    rows += [
+        ('frame time, p50', result['frame_time_ms']['p50'], 'ms'),
+        ('frame time, p99', result['frame_time_ms']['p99'], 'ms'),
+        ('widgets in the tree, max', result['widgets_max'], ''),
+        ('widgets in the tree, after the fade out', result['widgets_after'], ''),
+        ('pool misses (blob + key light)', result['blob_pool_misses'] + result['key_light_pool_misses'], ''),
+        ('objects left behind', result['objects_left_behind'], ''),
+        ]
+    report(title, rows)
+
+
+def main():
+    args = sys.argv[1:]
+    json_filename = None
+    if '--json' in args:
+        index = args.index('--json')
+        json_filename = args[index + 1]
+        del args[index:index + 2]
+    names = args or [name for name, scenario in SCENARIOS]
+    
+    harness = Harness()
+    modes = [
+        ('frame clock', 0, ''),
+        ('control rate %i Hz' % CONTROL_RATE, CONTROL_RATE, '_control_rate'),
+        ]
+    results = {}
+    for mode, rate, suffix in modes:
+        harness.set_control_rate(rate)
+        for name, scenario in SCENARIOS:
+            if name in names:
+                result = results[name + suffix] = run_scenario(harness, scenario)
+                report_scenario('Scenario "%s", %s (%i frames)' % (name, mode, result['frames']), result)
+    harness.close()
+    
+    if json_filename is not None:
+        document = {
+            'benchmark': 'pipeline',
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'kivy': kivy.__version__,
+            'platform': platform.platform(),
+            'scenarios': results,
+            }
+        if json_filename == '-':
+            json.dump(document, sys.stdout, indent=2, sort_keys=True)
+            print
+        else:
+            with open(json_filename, 'w') as json_file:
+                json.dump(document, json_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+'''
+One rounding tick for 1, 10 and 64 voices: the loop of Keyboard.roundAllKeys
+(one Voice per touch) against the vectorized RoundingEngine (needs numpy).
+Both are fed with the same simulated finger movements (and fingers lifted and put
+down again); every tick, the positions, the pitch bend values and the "scheduler
+continue" results of both are compared for exact equality, with and without pitch lock.
+
+    python -m benchmarks.bench_rounding
+'''
+
+
+import random
+
+from appsettings import AppSettings
+from voice import Voice
+from keygeometry import KeyGeometry
+from tuning import Tuning, PitchTable
+from roundingengine import RoundingEngine, numpy_available
+from benchmarks import make_config, measure, report
+
+
+VOICE_COUNTS = (1, 10, 64)
+# like in keyboard.py (which can't be imported without kivy)
+KEY_MOVEMENT_THRESHOLD = 1
+KEY_WIDTH = 50
+KEYS = 60
+TICK = 0.01
+TICKS = 2000
+ITERATIONS = 2000
+
+
+class SimulatedTouch(object):
+    # the attributes of a kivy touch the rounding reads
+    __slots__ = ('voice', 'time_update', 'dx')
+
+
+def python_tick(touches, settings, pitch_table, now):
+    # the loop of Keyboard.roundAllKeys and Keyboard.midi_set_pitch_bend, without kivy and MIDI.
+    # returns the pitch bend values (roundAllKeys sends them all - MidiOutput drops the repeated ones)
+    request_scheduler_continue = False
+    pitch_values = []
+    for touch in touches:
+        voice = touch.voice
+        if settings.pitch_lock:
+            voice.current_position = voice.rounded_key
+            request_scheduler_continue = False
+        else:
+            voice.key_moving = now - touch.time_update < settings.movement_decay and abs(touch.dx) > KEY_MOVEMENT_THRESHOLD
+            if voice.key_moving:
+                voice.current_position = voice.old_position + (voice.finger_position - voice.old_position) * settings.round_speed_to_finger
+            else:
+                voice.current_position = voice.old_position + (voice.rounded_key - voice.old_position) * settings.round_speed_to_key
+                if abs(voice.rounded_key - voice.current_position) <= 1:
+                    voice.current_position = voice.rounded_key
+        
+        if int(voice.current_position) != int(voice.old_position) or int(voice.current_position) != voice.rounded_key:
+            request_scheduler_continue = True
+        
+        pitch_values.append(pitch_table.pitch_value(voice.current_position, voice.pitch_base))
+        
+        voice.old_position = voice.current_position
+    return pitch_values, request_scheduler_continue
+
+
+def engine_tick(engine, settings, pitch_table, now):
+    return engine.step(now, settings.pitch_lock, settings.movement_decay, KEY_MOVEMENT_THRESHOLD,
+        settings.round_speed_to_finger, settings.round_speed_to_key, pitch_table)
+
+
+def make_pitch_table(settings):
+    # (like Keyboard.get_pitch_table)
+    return PitchTable(Tuning.equal_temperament(), KeyGeometry.uniform(KEY_WIDTH, KEYS * KEY_WIDTH), settings.transpose, settings.pitch_bend_range)
+
+
+def rounded_key(x):
+    return int(int(x / KEY_WIDTH) * KEY_WIDTH + (KEY_WIDTH / 2.0))
+
+
+def start_voices(count, engine, pitch_table, now):
+    touches = []
+    for i in range(count):
+        keyposition = random.randrange(KEYS) * KEY_WIDTH
+        touch = SimulatedTouch()
+        touch.time_update = now
+        touch.dx = 0
+        voice = touch.voice = Voice(keyposition // KEY_WIDTH, keyposition, rounded_key(keyposition))
+        voice.note = pitch_table.key_notes[voice.keynumber]
+        voice.pitch_base = pitch_table.key_bases[voice.keynumber]
+        voice.rounding_slot = engine.add(voice, voice.finger_position, voice.rounded_key, voice.pitch_base, now, 0)
+        touches.append(touch)
+    return touches
+
+
+def move_voices(touches, engine, now):
+    # every voice moves from time to time: a slide, a vibrato or a little jitter
+    for touch in touches:
+        if random.random() < 0.3:
+            voice = touch.voice
+            dx = random.choice((random.uniform(-30, 30), random.uniform(-4, 4), random.uniform(-1, 1)))
+            x = min(max(voice.finger_position + dx, 0), KEYS * KEY_WIDTH - 1)
+            touch.dx = x - voice.finger_position
+            voice.finger_position = x
+            voice.rounded_key = rounded_key(x)
+            touch.time_update = now
+            engine.move(voice.rounding_slot, x, voice.rounded_key, now, touch.dx)
+
+
+def replace_voice(touches, engine, pitch_table, now):
+    # a finger is lifted and another one put down (it's the newest touch, like in EventLoop.touches)
+    touch = touches.pop(random.randrange(len(touches)))
+    engine.remove(touch.voice.rounding_slot)
+    touches.extend(start_voices(1, engine, pitch_table, now))
+
+
+def compare(count, settings):
+    # returns the number of values and of "scheduler continue" results that differ between both implementations
+    random.seed(count)
+    engine = RoundingEngine()
+    pitch_table = make_pitch_table(settings)
+    now = 1000.0
+    touches = start_voices(count, engine, pitch_table, now)
+    sent = [None] * engine.capacity
+    mismatches = 0
+    continue_mismatches = 0
+    for tick in xrange(TICKS):
+        now += TICK
+        if random.random() < 0.02:
+            replace_voice(touches, engine, pitch_table, now)
+        move_voices(touches, engine, now)
+        pitch_values, python_continue = python_tick(touches, settings, pitch_table, now)
+        changed_slots, engine_continue = engine_tick(engine, settings, pitch_table, now)
+        if python_continue != engine_continue:
+            continue_mismatches += 1
+        for slot in changed_slots:
+            sent[slot] = int(engine.pitch_value[slot])
+        for touch, pitch_value in zip(touches, pitch_values):
+            slot = touch.voice.rounding_slot
+            if engine.old_position[slot] != touch.voice.old_position or sent[slot] != pitch_value:
+                mismatches += 1
+    return mismatches, continue_mismatches
+
+
+def main():
+    if not numpy_available():
+        print 'This benchmark needs numpy.'
+        return
+    
+    settings = AppSettings(make_config())
+    config = make_config()
+    config.set('General', 'PitchLock', 'On')
+    pitch_lock_settings = AppSettings(config)
+    
+    rows = []
+    for count in VOICE_COUNTS:
+        mismatches, continue_mismatches = compare(count, settings)
+        pitch_lock_mismatches, pitch_lock_continue_mismatches = compare(count, pitch_lock_settings)
+        
+        # the timing: voices in the middle of a slide, so both have to compute everything
+        random.seed(count)
+        engine = RoundingEngine()
+        pitch_table = make_pitch_table(settings)
+        touches = start_voices(count, engine, pitch_table, 1000.0)
+        move_voices(touches, engine, 1000.0)
+        rows += [
+            ('%i voices: Python loop' % count, measure(lambda: python_tick(touches, settings, pitch_table, 1000.0), ITERATIONS), 'us'),
+            ('%i voices: RoundingEngine' % count, measure(lambda: engine_tick(engine, settings, pitch_table, 1000.0), ITERATIONS), 'us'),
+            ('%i voices: values differing in %i ticks' % (count, TICKS), mismatches, ''),
+            ('%i voices: continue differing' % count, continue_mismatches, ''),
+            ('%i voices, pitch lock: values differing' % count, pitch_lock_mismatches, ''),
+            ('%i voices, pitch lock: continue differing' % count, pitch_lock_continue_mismatches, ''),
+            ]
+    
+    report('Rounding tick (positions, pitch bend values and scheduler continue)', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Compares the settings access of one rounding tick and one touch move:
+ConfigParser lookups (as done before the AppSettings snapshot) against
+the plain attributes of AppSettings.
+
+    python -m benchmarks.bench_settings
+'''
+
+
+from ConfigParser import RawConfigParser
+
+from appsettings import AppSettings
+from benchmarks import make_config, measure, report
+
+
+VOICES = 10
+ITERATIONS = 20000
+
+
+class CountingConfig(RawConfigParser):
+    # counts every lookup done on the config
+    lookups = 0
+    
+    def get(self, section, option, *args, **kwargs):
+        self.lookups += 1
+        return RawConfigParser.get(self, section, option, *args, **kwargs)
+
+
+def tick_with_config(config):
+    # the settings reads of one roundAllKeys() call before the snapshot: per touch the pitch
+    # lock, the movement decay, one of the round speeds and the channel/range for the pitch bend
+    for voice in xrange(VOICES):
+        if config.get('General', 'PitchLock') == 'On':
+            continue
+        float(config.get('Advanced', 'MovementDecay'))
+        float(config.get('Advanced', 'RoundSpeedToKey'))
+        config.getint('MIDI', 'PitchbendRange')
+        config.getint('MIDI', 'Channel')
+
+
+def tick_with_snapshot(settings):
+    for voice in xrange(VOICES):
+        if settings.pitch_lock:
+            continue
+        settings.movement_decay
+        settings.round_speed_to_key
+        settings.pitch_bend_range
+        settings.channel
+
+
+def move_with_config(config):
+    # the settings reads of one on_touch_move(): scheduler interval, y axis and the aftertouch channel
+    float(config.get('Advanced', 'RoundingSchedulerInterval'))
+    if config.get('General', 'YAxis') == 'Aftertouch':
+        config.getint('MIDI', 'Channel')
+
+
+def move_with_snapshot(settings):
+    settings.rounding_scheduler_interval
+    if settings.y_axis_is_aftertouch:
+        settings.channel
+
+
+def main():
+    config = make_config(CountingConfig)
+    settings = AppSettings(config)
+    
+    config.lookups = 0
+    tick_with_config(config)
+    tick_config_lookups = config.lookups
+    
+    config.lookups = 0
+    move_with_config(config)
+    move_config_lookups = config.lookups
+    
+    config.lookups = 0
+    tick_with_snapshot(settings)
+    move_with_snapshot(settings)
+    snapshot_config_lookups = config.lookups
+    
+    report('Settings access (%i voices)' % VOICES, [
+        ('rounding tick, ConfigParser', measure(lambda: tick_with_config(config), ITERATIONS), 'us'),
+        ('rounding tick, AppSettings', measure(lambda: tick_with_snapshot(settings), ITERATIONS), 'us'),
+        ('touch move, ConfigParser', measure(lambda: move_with_config(config), ITERATIONS), 'us'),
+        ('touch move, AppSettings', measure(lambda: move_with_snapshot(settings), ITERATIONS), 'us'),
+        ('config lookups per tick, ConfigParser', tick_config_lookups, ''),
+        ('config lookups per move, ConfigParser', move_config_lookups, ''),
+        ('config lookups per tick + move, AppSettings', snapshot_config_lookups, ''),
+        ('AppSettings rebuild (on_config_change)', measure(lambda: settings.update(config), ITERATIONS / 10), 'us'),
+        ])
+
+
+if __name__ == '__main__':
+    main()
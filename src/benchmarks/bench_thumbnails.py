@@ -0,0 +1,96 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Time to build and show the appearance panel (MySettingsPanel), and the texture
+memory of its images: with the full resolution images (as the panel was built
+before the thumbnail cache) and with the thumbnail cache (cold and warm).
+The time includes the first frame: kivy may load the images of the buttons
+only when they are drawn.
+
+    python -m benchmarks.bench_thumbnails
+'''
+
+
+import time
+import shutil
+import tempfile
+
+from benchmarks import report
+from benchmarks.harness import Harness
+
+
+def build_panel(harness, thumbnail_cache):
+    from kivy.cache import Cache
+    from kivy.core.image import Image as CoreImage
+    from mysettingspanel import MySettingsPanel
+    
+    # start without any texture in the kivy cache
+    Cache.remove('kv.image')
+    Cache.remove('kv.texture')
+    
+    start = time.time()
+    panel = MySettingsPanel(thumbnail_cache=thumbnail_cache)
+    harness.window.add_widget(panel)
+    harness.frame()
+    duration = time.time() - start
+    harness.window.remove_widget(panel)
+    
+    # texture memory of all the images shown on the buttons (RGBA)
+    sources = set()
+    for grid in (panel.background_scroll_view_grid, panel.keyboard_scroll_view_box):
+        for button in grid.children:
+            sources.add(button.background_normal)
+    memory = 0
+    for source in sources:
+        width, height = CoreImage(source).texture.size
+        memory += width * height * 4
+    
+    return duration, memory
+
+
+def main():
+    from imagecache import ImageCache
+    harness = Harness()
+    
+    cache_directory = tempfile.mkdtemp()
+    try:
+        full_time, full_memory = build_panel(harness, None)
+        cold_time, cold_memory = build_panel(harness, ImageCache(cache_directory))
+        warm_time, warm_memory = build_panel(harness, ImageCache(cache_directory))
+    finally:
+        shutil.rmtree(cache_directory)
+    
+    report('Appearance panel: construction and first frame', [
+        ('full resolution images: time', full_time * 1000, 'ms'),
+        ('full resolution images: texture memory', full_memory / 1048576.0, 'MB'),
+        ('thumbnails, cold cache: time', cold_time * 1000, 'ms'),
+        ('thumbnails, warm cache: time', warm_time * 1000, 'ms'),
+        ('thumbnails: texture memory', warm_memory / 1048576.0, 'MB'),
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+Pitch bend values: the formula Keyboard.midi_set_pitch_bend computed per call
+(12-tone equal temperament only) against the lookup in a tuning.PitchTable. The
+two take about the same time (the table is needed for the Scala tunings, not
+for the speed).
+Every pixel of every key is checked: in 12-tone equal temperament, the table has
+to give exactly the values of the formula. Then the time to build the table
+(after a change of the tuning, the key width, the transposition or the pitch
+bend range) for 12-TET and for a Scala scale with a keyboard mapping.
+
+    python -m benchmarks.bench_tuning
+'''
+
+
+import random
+
+from appsettings import AppSettings
+from keygeometry import KeyGeometry
+from tuning import Tuning, PitchTable, BEND_LSB, BEND_MSB
+from benchmarks import make_config, measure, report
+
+
+KEYS = 60
+KEY_WIDTHS = (30, 37, 50, 80)
+PITCH_BEND_RANGES = (2, 12, 24, 48)
+LOOKUPS = 10000
+REPEAT = 20
+
+
+def pitch_bend_formula(current_position, keyposition, key_width, pitch_bend_range):
+    # midi_set_pitch_bend as it was, returns the two data bytes
+    pixel_distance = int(current_position) - (keyposition + (key_width / 2.0))
+    pitch_value = int(pixel_distance * 8192.0 / (pitch_bend_range * key_width) + 0.5) + 8192
+    if pitch_value > 16383:
+        pitch_value = 16383
+    elif pitch_value < 0:
+        pitch_value = 0
+    return pitch_value - int(pitch_value / 128) * 128, int(pitch_value / 128)
+
+
+def pitch_bend_table(pitch_table, current_position, pitch_base):
+    pitch_value = pitch_table.pitch_value(current_position, pitch_base)
+    return BEND_LSB[pitch_value], BEND_MSB[pitch_value]
+
+
+def differences(tuning, transpose):
+    # the pixels (of all the keys, key widths and ranges) where table and formula differ
+    count = 0
+    for key_width in KEY_WIDTHS:
+        geometry = KeyGeometry.uniform(key_width, KEYS * key_width)
+        for pitch_bend_range in PITCH_BEND_RANGES:
+            pitch_table = PitchTable(tuning, geometry, transpose, pitch_bend_range)
+            for key in xrange(KEYS):
+                base = pitch_table.key_bases[key]
+                for position in xrange(KEYS * key_width):
+                    if pitch_bend_table(pitch_table, position, base) != pitch_bend_formula(position, key * key_width, key_width, pitch_bend_range):
+                        count += 1
+    return count
+
+
+def main():
+    settings = AppSettings(make_config())
+    equal_temperament = Tuning.equal_temperament()
+    just_intonation = Tuning.load('tunings/just_intonation_7.scl', 'tunings/white_keys.kbm')
+    geometry = KeyGeometry.uniform(50, KEYS * 50)
+    pitch_table = PitchTable(equal_temperament, geometry, settings.transpose, settings.pitch_bend_range)
+    
+    random.seed(0)
+    lookups = [(random.uniform(0, KEYS * 50), random.randrange(KEYS)) for i in xrange(LOOKUPS)]
+    bases = pitch_table.key_bases
+    
+    def formula():
+        for position, key in lookups:
+            pitch_bend_formula(position, key * 50, 50, settings.pitch_bend_range)
+    
+    def table():
+        for position, key in lookups:
+            pitch_bend_table(pitch_table, position, bases[key])
+    
+    rows = [
+        ('formula per pitch bend', min(measure(formula, 1) for i in xrange(REPEAT)) / LOOKUPS, 'us'),
+        ('pitch table per pitch bend', min(measure(table, 1) for i in xrange(REPEAT)) / LOOKUPS, 'us'),
+        ('12-TET: differences to the formula', differences(equal_temperament, settings.transpose), ''),
+        ('build the table: 12-TET', measure(lambda: PitchTable(equal_temperament, geometry, settings.transpose, settings.pitch_bend_range), 100), 'us'),
+        ('build the table: just intonation (.scl/.kbm)', measure(lambda: PitchTable(just_intonation, geometry, settings.transpose, settings.pitch_bend_range), 100), 'us'),
+        ]
+    report('Pitch bend values (%i keys)' % KEYS, rows)
+
+
+if __name__ == '__main__':
+    main()
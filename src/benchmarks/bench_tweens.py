@@ -0,0 +1,130 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Clock time per frame against the number of running fades: one kivy Animation
+per widget (as the blobs and circles were faded before) against the shared
+tween engine. Every fade animates the color, the size and the position, like
+a blob fade out. The fades are long enough not to finish during the run.
+
+It doesn't need a window (nothing is drawn, only the Clock runs).
+
+    python -m benchmarks.bench_tweens
+'''
+
+
+import time
+
+from kivy.config import Config
+Config.set('graphics', 'maxfps', '0') # don't sleep between the frames
+
+from kivy.clock import Clock
+from kivy.animation import Animation
+from kivy.properties import ListProperty
+from kivy.uix.widget import Widget
+
+from tween import tweens
+from benchmarks import report, percentile
+
+
+FADES = (10, 50, 100, 200, 500)
+FRAMES = 200
+DURATION = 60.0
+BLOB_SIZE = 60
+
+
+class Blob(Widget):
+    # the properties of an Image used by the blob fade out
+    color = ListProperty([1, 1, 1, 1])
+
+
+def make_blobs(count):
+    return [Blob(size=(BLOB_SIZE, BLOB_SIZE), pos=(i % 1000, 300)) for i in range(count)]
+
+
+def run_frames():
+    # returns the time of every frame
+    frame_times = []
+    for i in range(FRAMES):
+        start = time.time()
+        Clock.tick()
+        frame_times.append(time.time() - start)
+    return frame_times
+
+
+def start_animations(blobs):
+    animations = []
+    for blob in blobs:
+        animation = Animation(
+            color=(1, 1, 1, 0),
+            size=(BLOB_SIZE * 3, BLOB_SIZE * 3),
+            x=blob.x - BLOB_SIZE,
+            y=blob.y - BLOB_SIZE,
+            t='out_expo', duration=DURATION)
+        animation.start(blob)
+        animations.append(animation)
+    return animations
+
+
+def start_tweens(blobs):
+    for blob in blobs:
+        tweens.start(blob, DURATION, 'out_expo',
+            color=(1, 1, 1, 0),
+            size=(BLOB_SIZE * 3, BLOB_SIZE * 3),
+            pos=(blob.x - BLOB_SIZE, blob.y - BLOB_SIZE))
+
+
+def main():
+    # an empty frame: the cost of the Clock itself
+    empty = percentile(run_frames(), 0.5)
+    
+    rows = [('empty frame, 50th percentile', empty * 1000000, 'us')]
+    for count in FADES:
+        blobs = make_blobs(count)
+        animations = start_animations(blobs)
+        animation_times = run_frames()
+        for animation, blob in zip(animations, blobs):
+            animation.stop(blob)
+        Clock.tick()
+        
+        blobs = make_blobs(count)
+        start_tweens(blobs)
+        tween_times = run_frames()
+        for blob in blobs:
+            tweens.stop(blob)
+        Clock.tick()
+        
+        rows.extend([
+            ('%i fades, Animation objects, 50th percentile' % count, percentile(animation_times, 0.5) * 1000000, 'us'),
+            ('%i fades, tween engine, 50th percentile' % count, percentile(tween_times, 0.5) * 1000000, 'us'),
+            ('%i fades, tween engine, per fade' % count, (percentile(tween_times, 0.5) - empty) * 1000000 / count, 'us'),
+            ])
+    
+    rows.append(('tween slots allocated', len(tweens.targets), ''))
+    report('Clock time per frame (%i frames per run)' % FRAMES, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+The state of a keyboard touch: the string-keyed touch.ud dict used before
+against the Voice object (voice.py). Compares the memory per voice and the time
+of the state accesses of Keyboard.on_touch_move and of one voice in
+roundAllKeys (without kivy: the widgets are stand-ins).
+
+    python -m benchmarks.bench_voice
+'''
+
+
+import sys
+
+from voice import Voice
+from benchmarks import measure, report
+
+
+ITERATIONS = 100000
+REPEAT = 7
+KEY_WIDTH = 50
+# like in keyboard.py (which can't be imported without kivy)
+KEY_MOVEMENT_THRESHOLD = 1
+ROUND_SPEED_TO_FINGER = 0.6
+ROUND_SPEED_TO_KEY = 0.2
+MOVEMENT_DECAY = 0.2
+
+
+class StandIn(object):
+    # blob, key light and touch
+    x = y = dx = 0
+    size = (60, 60)
+    time_update = 0.0
+
+
+def calculate_key_dict(x):
+    # calculate_key as it was: a new dict per call
+    keynumber = int(x / KEY_WIDTH)
+    return {'keyposition_relative_to_keyboard': keynumber * KEY_WIDTH, 'keynumber': keynumber}
+
+
+def calculate_key(x):
+    return int(x / KEY_WIDTH)
+
+
+def new_ud(x):
+    ud = {}
+    ud['initial_key'] = calculate_key_dict(x)
+    ud['finger_position'] = ud['initial_key']['keyposition_relative_to_keyboard']
+    ud['rounded_key'] = int(ud['finger_position'] + (KEY_WIDTH / 2.0))
+    ud['key_moving'] = False
+    ud['vibrato'] = False
+    ud['current_position'] = ud['rounded_key']
+    ud['old_position'] = ud['rounded_key']
+    ud['channel'] = 0
+    ud['blob'] = StandIn()
+    ud['key_light'] = StandIn()
+    return ud
+
+
+def new_voice(x):
+    keynumber = calculate_key(x)
+    keyposition = keynumber * KEY_WIDTH
+    voice = Voice(keynumber, keyposition, int(keyposition + (KEY_WIDTH / 2.0)))
+    voice.channel = 0
+    voice.blob = StandIn()
+    voice.key_light = StandIn()
+    return voice
+
+
+def move_ud(ud, x, px):
+    ud['finger_position'] = x
+    ud['rounded_key'] = int(calculate_key_dict(x)['keyposition_relative_to_keyboard'] + (KEY_WIDTH / 2.0))
+    if ud['channel'] is not None:
+        pass
+    ud['blob'].x = x - ud['blob'].size[0] / 2
+    ud['blob'].y = x - ud['blob'].size[1] / 2
+    latest_key_light = ud['key_light']
+    return calculate_key_dict(px)['keyposition_relative_to_keyboard']
+
+
+def move_voice(voice, x, px):
+    voice.finger_position = x
+    voice.rounded_key = int(calculate_key(x) * KEY_WIDTH + (KEY_WIDTH / 2.0))
+    if voice.channel is not None:
+        pass
+    blob = voice.blob
+    blob.x = x - blob.size[0] / 2
+    blob.y = x - blob.size[1] / 2
+    latest_key_light = voice.key_light
+    return calculate_key(px) * KEY_WIDTH
+
+
+def round_ud(ud, touch, now):
+    ud['key_moving'] = now - touch.time_update < MOVEMENT_DECAY and abs(touch.dx) > KEY_MOVEMENT_THRESHOLD
+    if ud['key_moving']:
+        ud['current_position'] = ud['old_position'] + (ud['finger_position'] - ud['old_position']) * ROUND_SPEED_TO_FINGER
+    else:
+        ud['current_position'] = ud['old_position'] + (ud['rounded_key'] - ud['old_position']) * ROUND_SPEED_TO_KEY
+        if abs(ud['rounded_key'] - ud['current_position']) <= 1:
+            ud['current_position'] = ud['rounded_key']
+    busy = int(ud['current_position']) != int(ud['old_position']) or int(ud['current_position']) != ud['rounded_key']
+    pixel_distance = int(ud['current_position']) - (ud['initial_key']['keyposition_relative_to_keyboard'] + (KEY_WIDTH / 2.0))
+    if 'canvas_line' in ud:
+        pass
+    ud['old_position'] = ud['current_position']
+    return busy, pixel_distance
+
+
+def round_voice(voice, touch, now):
+    # like roundAllKeys: the positions are read once into local variables
+    old_position = voice.old_position
+    rounded_key = voice.rounded_key
+    key_moving = voice.key_moving = now - touch.time_update < MOVEMENT_DECAY and abs(touch.dx) > KEY_MOVEMENT_THRESHOLD
+    if key_moving:
+        current_position = old_position + (voice.finger_position - old_position) * ROUND_SPEED_TO_FINGER
+    else:
+        current_position = old_position + (rounded_key - old_position) * ROUND_SPEED_TO_KEY
+        if abs(rounded_key - current_position) <= 1:
+            current_position = rounded_key
+    voice.current_position = current_position
+    busy = int(current_position) != int(old_position) or int(current_position) != rounded_key
+    pixel_distance = int(current_position) - (voice.keyposition + (KEY_WIDTH / 2.0))
+    if voice.canvas_line is not None:
+        pass
+    voice.old_position = current_position
+    return busy, pixel_distance
+
+
+def best(function):
+    # the fastest of REPEAT runs (the others were disturbed by something else)
+    return min(measure(function, ITERATIONS) for i in xrange(REPEAT))
+
+
+def main():
+    ud = new_ud(1234.0)
+    voice = new_voice(1234.0)
+    touch = StandIn()
+    
+    # memory of the containers (the values themselves are the same for both)
+    ud_size = sys.getsizeof(ud) + sys.getsizeof(ud['initial_key'])
+    voice_size = sys.getsizeof(voice)
+    
+    report('Voice state: touch.ud dict vs Voice', [
+        ('memory per voice, dict', ud_size, 'bytes'),
+        ('memory per voice, Voice', voice_size, 'bytes'),
+        ('touch down: create the state, dict', best(lambda: new_ud(1234.0)), 'us'),
+        ('touch down: create the state, Voice', best(lambda: new_voice(1234.0)), 'us'),
+        ('on_touch_move state, dict', best(lambda: move_ud(ud, 1234.0, 1230.0)), 'us'),
+        ('on_touch_move state, Voice', best(lambda: move_voice(voice, 1234.0, 1230.0)), 'us'),
+        ('roundAllKeys per voice, dict', best(lambda: round_ud(ud, touch, 0.0)), 'us'),
+        ('roundAllKeys per voice, Voice', best(lambda: round_voice(voice, touch, 0.0)), 'us'),
+        ])
+
+
+if __name__ == '__main__':
+    main()
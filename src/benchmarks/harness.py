@@ -0,0 +1,276 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Drives a real Keyboard widget with synthetic touches, without the rest of the
+application and without a MIDI device (the messages go to a NullMidiPort).
+
+It needs a Kivy window. On a Linux box without a display, the benchmark starts
+itself again in a virtual X server (xvfb-run, from the package "xvfb"), so
+
+    python -m benchmarks.<name>
+
+works on a plain server too.
+'''
+
+
+import os
+import sys
+import time
+from distutils.spawn import find_executable
+
+# the images are referenced relative to the "src" folder
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(SRC_DIR)
+
+# keyboard: 5 octaves, 50 pixel per key. The window shows the whole keyboard.
+KEY_WIDTH = 50
+KEYBOARD_HEIGHT = 468
+WINDOW_WIDTH = 12 * 5 * KEY_WIDTH
+WINDOW_HEIGHT = 800
+
+
+def ensure_display():
+    # no X server: run the benchmark module again under xvfb-run (only once - xvfb-run sets DISPLAY)
+    if not sys.platform.startswith('linux') or os.environ.get('DISPLAY'):
+        return
+    xvfb_run = find_executable('xvfb-run')
+    if xvfb_run is None:
+        print 'Warning: No display and no xvfb-run found, the window can\'t be created.'
+        return
+    module = 'benchmarks.' + os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    sys.stdout.flush()
+    os.execv(xvfb_run, [xvfb_run, '-a', '-s', '-screen 0 %ix%ix24' % (WINDOW_WIDTH, WINDOW_HEIGHT),
+        sys.executable, '-m', module] + sys.argv[1:])
+
+ensure_display()
+
+from kivy.config import Config
+Config.set('graphics', 'maxfps', '0') # don't sleep between the frames
+Config.set('graphics', 'width', str(WINDOW_WIDTH))
+Config.set('graphics', 'height', str(WINDOW_HEIGHT))
+
+from kivy.base import EventLoop
+from kivy.clock import Clock
+from kivy.lang import Builder
+from kivy.properties import NumericProperty
+from kivy.uix.image import Image
+from kivy.uix.widget import Widget
+
+from appsettings import AppSettings
+from keyboard import Keyboard, KEY_MOVEMENT_THRESHOLD
+from midioutput import MidiOutput, MidiWorker, PITCH_BEND
+from controlrate import ControlRateEngine
+from pool import Pool
+from tuning import Tuning
+from voiceallocator import VoiceAllocator
+from benchmarks import make_config, percentile
+
+
+class NullMidiPort(object):
+    # a MIDI device that only counts the messages (and the pitch bends among them)
+    def __init__(self):
+        self.messages = 0
+        self.pitch_bends = 0
+        self.writes = 0
+    
+    def write(self, data):
+        self.writes += 1
+        self.messages += len(data)
+        for (status, data1, data2), timestamp in data:
+            if status & 0xF0 == PITCH_BEND:
+                self.pitch_bends += 1
+    
+    def write_short(self, status, data1=0, data2=0):
+        self.writes += 1
+        self.messages += 1
+        if status & 0xF0 == PITCH_BEND:
+            self.pitch_bends += 1
+    
+    def close(self):
+        pass
+
+
+class FakeTouch(object):
+    # the attributes of a kivy MotionEvent used by the keyboard
+    next_uid = 0
+    
+    def __init__(self, x, y):
+        FakeTouch.next_uid += 1
+        self.uid = FakeTouch.next_uid
+        self.ud = {}
+        self.x = self.px = x
+        self.y = self.py = y
+        self.dx = self.dy = 0
+        self.time_start = self.time_update = time.time()
+    
+    @property
+    def pos(self):
+        return (self.x, self.y)
+    
+    def move(self, x, y):
+        self.px, self.py = self.x, self.y
+        self.x, self.y = x, y
+        self.dx, self.dy = x - self.px, y - self.py
+        self.time_update = time.time()
+
+
+class FakeFeedback(Widget):
+    # stands in for the feedback wall of the IcarusTouchWidget
+    transparency = NumericProperty(0)
+
+
+class FakeApp(object):
+    def __init__(self, config):
+        self.config = config
+        self.settings = AppSettings(config)
+
+
+class HostWidget(Widget):
+    # stands in for the IcarusTouchWidget: it offers what the keyboard looks up on its parent
+    def __init__(self, **kwargs):
+        super(HostWidget, self).__init__(**kwargs)
+        self.app = FakeApp(make_config())
+        self.settings = self.app.settings
+        self.midi_port = NullMidiPort()
+        self.midi_out = MidiOutput(self.midi_port, self.settings.midi_batch_size)
+        self.voice_allocator = VoiceAllocator(self.settings.channel, self.settings.voice_channels)
+        self.blob_pool = Pool(lambda: Image(allow_stretch=True), 20)
+        self.feedback_wall = FakeFeedback()
+        self.add_widget(self.feedback_wall)
+        
+        # like the IcarusTouchWidget: send the MIDI messages of a frame at its end
+        Clock.schedule_interval(self.midi_out.flush, 0)
+
+
+class Harness(object):
+    '''control_rate: 0 rounds on the frame clock (Keyboard.roundAllKeys, like the
+    application with its default settings), otherwise a ControlRateEngine rounds at
+    that rate on its thread, writing to a MidiWorker. See set_control_rate().
+    '''
+    
+    def __init__(self, control_rate=0):
+        Builder.load_file('icarustouch.kv')
+        EventLoop.ensure_window()
+        self.window = EventLoop.window
+        
+        self.host = HostWidget(size=self.window.size)
+        self.keyboard = self.create_keyboard()
+        self.window.add_widget(self.host)
+        
+        self.control_engine = None
+        self.midi_worker = None
+        self.set_control_rate(control_rate)
+        
+        # draw the first frames (texture uploads etc.)
+        for i in range(5):
+            self.frame()
+    
+    def create_keyboard(self):
+        keyboard = Keyboard(
+            source=self.host.settings.keyboard,
+            pos=(0, 230),
+            size=(12*5*KEY_WIDTH, KEYBOARD_HEIGHT),
+            border_width=145,
+            key_width=KEY_WIDTH)
+        keyboard.settings = self.host.settings
+        keyboard.blob_pool = self.host.blob_pool
+        keyboard.tuning = Tuning.equal_temperament()
+        self.host.add_widget(keyboard)
+        return keyboard
+    
+    def replace_keyboard(self):
+        # a new keyboard instead of the current one (without fingers on it), e.g. to load its images again
+        self.host.remove_widget(self.keyboard)
+        self.keyboard = self.create_keyboard()
+        self.keyboard.control_engine = self.control_engine
+        self.frame()
+    
+    def set_control_rate(self, rate):
+        # switch between the rounding on the frame clock (0) and a ControlRateEngine (only without fingers on the keyboard)
+        host = self.host
+        if self.control_engine is not None:
+            self.control_engine.close()
+            self.control_engine = None
+            host.midi_out.set_port(host.midi_port)
+            self.midi_worker.close()
+            self.midi_worker = None
+        
+        if rate > 0:
+            # (the engine writes from its own thread: the device is owned by a MidiWorker, like in the application)
+            self.midi_worker = MidiWorker(host.midi_port, host.settings.midi_queue_size)
+            host.midi_out.set_port(self.midi_worker)
+            self.control_engine = ControlRateEngine(host.settings, rate, KEY_MOVEMENT_THRESHOLD)
+            self.control_engine.set_port(self.midi_worker)
+            self.control_engine.start()
+        self.keyboard.control_engine = self.control_engine
+    
+    def close(self):
+        self.set_control_rate(0)
+    
+    def key_x(self, key):
+        # x position of the middle of a key
+        return self.keyboard.x + (key + 0.5) * KEY_WIDTH
+    
+    def touch_down(self, x, y):
+        # (like the EventLoop: the touch is in EventLoop.touches from its down to its up - roundAllKeys rounds those)
+        touch = FakeTouch(x, y)
+        EventLoop.touches.append(touch)
+        self.keyboard.on_touch_down(touch)
+        return touch
+    
+    def touch_move(self, touch, x, y):
+        touch.move(x, y)
+        self.keyboard.on_touch_move(touch)
+    
+    def touch_up(self, touch):
+        touch.move(touch.x, touch.y)
+        self.keyboard.on_touch_up(touch)
+        EventLoop.touches.remove(touch)
+    
+    def scroll(self, dx):
+        # what the IcarusTouchWidget does with a scroll touch (the fingers on the keyboard stay where they are)
+        self.keyboard.x += dx
+    
+    def frame(self):
+        # run one frame of the event loop (clock, input, drawing) and return how long it took
+        start = time.time()
+        EventLoop.idle()
+        return time.time() - start
+    
+    def settle(self, seconds):
+        # let the running animations (fade outs) finish
+        end = time.time() + seconds
+        while time.time() < end:
+            self.frame()
+    
+    def widget_count(self):
+        count = 0
+        stack = [self.host]
+        while stack:
+            widget = stack.pop()
+            count += 1
+            stack.extend(widget.children)
+        return count
@@ -0,0 +1,313 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+'''
+Replays a touch trace (recorded with "Record touch trace" in the advanced
+settings) through a Keyboard, for profiling:
+
+    python -m benchmarks.replay_trace traces/session-....trace [--speed SPEED]
+
+SPEED: "original" (default), "fast" (as fast as possible) or a factor (2 = twice
+as fast). The rounding is driven by the recorded ticks with the recorded times,
+so the replay sends the same MIDI messages as the live take. The number of
+messages and a checksum of them are printed, to compare two replays.
+(With the control-rate engine, the order between its pitch bends and the other
+messages of the same frame can differ, as they come from two threads.)
+
+    python -m benchmarks.replay_trace --check
+
+records the scenarios of bench_pipeline live (rounded on the frame clock) and
+replays them: the replay has to send the same number of messages with the same
+checksum as the live take.
+'''
+
+
+import os
+import sys
+import time
+import tempfile
+from hashlib import sha1
+
+from kivy.base import EventLoop
+
+import keyboard as keyboard_module
+from keyboard import Keyboard, KEY_MOVEMENT_THRESHOLD
+from controlrate import ControlRateEngine
+from voiceallocator import VoiceAllocator
+from touchtrace import TraceWriter, TraceReader, TOUCH_DOWN, TOUCH_MOVE, TOUCH_UP, ROUNDING_TICK, ROUNDING_CONTROL_RATE
+from benchmarks import report
+from benchmarks.harness import Harness, FakeTouch
+
+
+# --check: the rounding ticks after the last touch of a live take (in seconds)
+CHECK_SETTLE_TIME = 0.5
+
+
+class CapturingPort(object):
+    # a MIDI device that keeps all the messages
+    def __init__(self):
+        self.messages = []
+    
+    def write(self, data):
+        for message, timestamp in data:
+            self.messages.append(tuple(message))
+    
+    def write_short(self, status, data1=0, data2=0):
+        self.messages.append((status, data1, data2))
+    
+    def close(self):
+        pass
+    
+    def checksum(self):
+        return sha1(repr(self.messages)).hexdigest()
+
+
+class TraceClock(object):
+    # replaces the time module of the keyboard: the time is the one of the record being replayed
+    def __init__(self):
+        self.now = 0
+    
+    def time(self):
+        return self.now
+
+
+class ReplayTouch(object):
+    # the attributes of a kivy MotionEvent used by the keyboard, with the recorded values
+    def __init__(self, uid, x, y, timestamp):
+        self.uid = uid
+        self.ud = {}
+        self.x = self.px = x
+        self.y = self.py = y
+        self.dx = self.dy = 0
+        self.time_start = self.time_update = timestamp
+    
+    @property
+    def pos(self):
+        return (self.x, self.y)
+    
+    def move(self, x, y, timestamp):
+        self.px, self.py = self.x, self.y
+        self.x, self.y = x, y
+        self.dx, self.dy = x - self.px, y - self.py
+        self.time_update = timestamp
+
+
+class RecordingHarness(object):
+    # the harness, recording the touches into a trace like the IcarusTouchWidget does (the keyboard records the ticks)
+    def __init__(self, harness, trace):
+        self.harness = harness
+        self.keyboard = harness.keyboard
+        self.trace = trace
+    
+    def key_x(self, key):
+        return self.harness.key_x(key)
+    
+    def touch_down(self, x, y):
+        touch = FakeTouch(x, y)
+        self.trace.touch(TOUCH_DOWN, touch, self.keyboard.x)
+        EventLoop.touches.append(touch)
+        self.keyboard.on_touch_down(touch)
+        return touch
+    
+    def touch_move(self, touch, x, y):
+        touch.move(x, y)
+        self.trace.touch(TOUCH_MOVE, touch, self.keyboard.x)
+        self.keyboard.on_touch_move(touch)
+    
+    def touch_up(self, touch):
+        touch.move(touch.x, touch.y)
+        self.trace.touch(TOUCH_UP, touch, self.keyboard.x)
+        self.keyboard.on_touch_up(touch)
+        EventLoop.touches.remove(touch)
+    
+    def scroll(self, dx):
+        self.harness.scroll(dx)
+
+
+def reset_host(harness, port):
+    # every take starts the same: the same channel allocation, no values sent yet
+    host = harness.host
+    host.midi_out.set_port(port)
+    host.voice_allocator = VoiceAllocator(host.settings.channel, host.settings.voice_channels)
+    harness.keyboard.x = 0
+
+
+def replay(harness, trace, speed):
+    keyboard = harness.keyboard
+    host = harness.host
+    port = CapturingPort()
+    reset_host(harness, port)
+    
+    # the rounding only runs on the recorded ticks (never on the clock of the replay)
+    keyboard.roundAllKeys = lambda dt: False
+    clock = TraceClock()
+    keyboard_module.time = clock
+    
+    engine = None
+    if trace.rounding == ROUNDING_CONTROL_RATE:
+        engine = ControlRateEngine(host.settings, trace.control_rate, KEY_MOVEMENT_THRESHOLD)
+        engine.set_port(port)
+        keyboard.control_engine = engine
+    
+    touches = {}
+    first_timestamp = None
+    start = time.time()
+    for kind, timestamp, x, y, value, uid in trace:
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        
+        # wait for the record's time (and draw the frames meanwhile)
+        if speed:
+            due = start + (timestamp - first_timestamp) / speed
+            while time.time() < due:
+                harness.frame()
+        clock.now = timestamp
+        
+        if kind == ROUNDING_TICK:
+            if engine is not None:
+                engine.tick(timestamp, value)
+            else:
+                Keyboard.roundAllKeys(keyboard, value)
+            continue
+        
+        keyboard.x = value
+        if kind == TOUCH_DOWN:
+            # (only the touches on the keyboard are replayed - the buttons, scrolling etc. are not part of the pipeline)
+            if keyboard.collide_point(x, y):
+                touch = touches[uid] = ReplayTouch(uid, x, y, timestamp)
+                # (roundAllKeys rounds the touches in EventLoop.touches, like live)
+                EventLoop.touches.append(touch)
+                keyboard.on_touch_down(touch)
+        elif uid in touches:
+            touch = touches[uid]
+            touch.move(x, y, timestamp)
+            if kind == TOUCH_MOVE:
+                keyboard.on_touch_move(touch)
+            elif kind == TOUCH_UP:
+                keyboard.on_touch_up(touch)
+                EventLoop.touches.remove(touch)
+                del touches[uid]
+    
+    host.midi_out.flush()
+    duration = time.time() - start
+    
+    # the touches still down at the end of the trace, the keyboard goes back to its own rounding
+    for touch in touches.values():
+        EventLoop.touches.remove(touch)
+    keyboard_module.time = time
+    del keyboard.roundAllKeys
+    keyboard.rounding_function_running = False
+    keyboard.control_engine = harness.control_engine
+    return port, duration
+
+
+def record_take(harness, scenario, filename):
+    # play the scenario live (rounded on the frame clock), recording the touch trace and the MIDI messages
+    port = CapturingPort()
+    reset_host(harness, port)
+    keyboard = harness.keyboard
+    trace = keyboard.trace = TraceWriter(filename, keyboard.key_width)
+    for step in scenario(RecordingHarness(harness, trace)):
+        harness.frame()
+    harness.settle(CHECK_SETTLE_TIME)
+    harness.host.midi_out.flush()
+    keyboard.trace = None
+    trace.close()
+    return port
+
+
+def check(harness):
+    # returns True if all the replays send the same messages as their live takes
+    from benchmarks.bench_pipeline import SCENARIOS
+    
+    rows = []
+    all_equal = True
+    filename = tempfile.mktemp('.trace')
+    try:
+        for name, scenario in SCENARIOS:
+            live_port = record_take(harness, scenario, filename)
+            trace = TraceReader(filename)
+            replay_port, duration = replay(harness, trace, 0)
+            trace.close()
+            
+            equal = len(live_port.messages) == len(replay_port.messages) and live_port.checksum() == replay_port.checksum()
+            all_equal = all_equal and equal
+            pitch_bends = len([message for message in live_port.messages if message[0] & 0xF0 == 0xE0])
+            rows += [
+                ('%s: MIDI messages, live' % name, len(live_port.messages), ''),
+                ('%s: pitch bends, live' % name, pitch_bends, ''),
+                ('%s: MIDI messages, replay' % name, len(replay_port.messages), ''),
+                ('%s: same checksum' % name, int(equal), ''),
+                ]
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+    
+    report('Live takes against their replays (frame clock rounding)', rows)
+    return all_equal
+
+
+def main():
+    args = sys.argv[1:]
+    speed = 1.0
+    if '--speed' in args:
+        index = args.index('--speed')
+        value = args[index + 1]
+        speed = {'original': 1.0, 'fast': 0}.get(value)
+        if speed is None:
+            speed = float(value)
+        del args[index:index + 2]
+    if args == ['--check']:
+        harness = Harness()
+        if not check(harness):
+            print 'Error: A replay differs from its live take.'
+            sys.exit(1)
+        return
+    if len(args) != 1:
+        print 'Usage: python -m benchmarks.replay_trace TRACE_FILE [--speed original|fast|FACTOR]'
+        print '       python -m benchmarks.replay_trace --check'
+        return
+    
+    trace = TraceReader(args[0])
+    harness = Harness()
+    if trace.key_width != harness.keyboard.key_width:
+        print 'Warning: The trace was recorded with a key width of %i pixel, the replay uses %i.' % (trace.key_width, harness.keyboard.key_width)
+    
+    port, duration = replay(harness, trace, speed)
+    
+    report('Replay of %s' % args[0], [
+        ('records', len(trace), ''),
+        ('recorded duration', trace.duration(), 's'),
+        ('replay duration', duration, 's'),
+        ('records/s', len(trace) / duration if duration else 0, ''),
+        ('MIDI messages', len(port.messages), ''),
+        ])
+    print 'MIDI checksum: %s' % port.checksum()
+    trace.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+Build step: packs the user interface images into a Kivy atlas.
+Run it from the "src" folder whenever one of the images changes:
+
+    python buildatlas.py
+
+The application uses the atlas automatically if it exists (see atlasloader.py).
+'''
+
+
+from kivy.atlas import Atlas
+
+from atlasloader import ATLAS_NAME, ATLAS_SIZE, ATLAS_IMAGES
+
+
+if __name__ == '__main__':
+    Atlas.create(ATLAS_NAME, ATLAS_IMAGES, ATLAS_SIZE)
+    print 'Atlas <%s.atlas> created with %i images.' % (ATLAS_NAME, len(ATLAS_IMAGES))
@@ -0,0 +1,274 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+import time
+import threading
+
+from tuning import BEND_LSB, BEND_MSB
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Tick Rate
+# ---------------------------------------------------------
+MIN_RATE = 50
+MAX_RATE = 2000
+
+# MIDI
+# ---------------------------------------------------------
+PITCH_BEND = 0xE0
+PITCH_BEND_CENTER = 8192
+
+
+def dt_correct(speed, dt, reference_interval):
+    '''The fraction of the way to move in dt seconds, if "speed" is the fraction
+    moved per reference_interval: after n ticks of dt, the remaining distance is
+    (1 - speed) ** (n * dt / reference_interval) - the same at any tick rate.
+    '''
+    speed = max(0.0, min(speed, 1.0))
+    return 1.0 - (1.0 - speed) ** (dt / reference_interval)
+
+
+'''
+####################################
+##
+##   ControlVoice Class
+##
+####################################
+'''
+class ControlVoice(object):
+    # the rounding state of one voice (written by the UI thread, read by the engine - under its lock)
+    __slots__ = ('channel', 'position', 'finger_position', 'rounded_key', 'pitch_table', 'pitch_base',
+        'time_update', 'dx', 'pitch_value')
+
+
+'''
+####################################
+##
+##   ControlRateEngine Class
+##
+####################################
+'''
+class ControlRateEngine(object):
+    '''The rounding of the pitch (see Keyboard.roundAllKeys) on its own thread with its
+    own timer, at a fixed control rate instead of the frame rate of the UI.
+    
+    The round speeds of the settings are fractions per RoundingSchedulerInterval.
+    Every tick applies them corrected for the real time since the last tick (see
+    dt_correct), so a glide takes the same time at any tick rate and a late tick
+    doesn't slow it down. If all the voices have reached their key (and no finger
+    moves), the thread sleeps until the UI thread adds or moves a voice.
+    
+    The engine writes the pitch bends itself, so its port has to be thread safe
+    (a MidiWorker). A pitch bend is only sent if its value has changed. When the
+    port is changed, the channels it has bent are reset on the old one.
+    '''
+    
+    def __init__(self, settings, rate, movement_threshold):
+        self.settings = settings
+        self.rate = rate
+        self.movement_threshold = movement_threshold
+        self.port = None
+        
+        # TraceWriter recording the ticks (while a touch trace is recorded)
+        self.trace = None
+        # MidiFileWriter recording the pitch bends (while the MIDI output is recorded)
+        self.recorder = None
+        
+        self.voices = set()
+        self.lock = threading.Lock()
+        
+        # last pitch bend value sent per channel (also of the voices already removed)
+        self.channel_bends = {}
+        
+        # statistics
+        self.ticks = 0
+        self.late_ticks = 0
+        self.messages_sent = 0
+        
+        self.running = False
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='ControlRateEngine')
+        self.thread.daemon = True
+    
+    def start(self):
+        self.running = True
+        self.thread.start()
+    
+    def _get_rate(self):
+        return self._rate
+    
+    def _set_rate(self, value):
+        self._rate = max(MIN_RATE, min(int(value), MAX_RATE))
+    
+    rate = property(_get_rate, _set_rate)
+    
+    def set_port(self, port):
+        # put the channels bent by the engine back to the center on the old device.
+        # the new device doesn't know the pitch bends yet: send them all again
+        with self.lock:
+            self.reset_pitch_bends()
+            self.port = port
+            for voice in self.voices:
+                voice.pitch_value = None
+        self.wakeup.set()
+    
+    def reset_pitch_bends(self):
+        # (call with the lock held)
+        if self.port is not None:
+            for channel, pitch_value in sorted(self.channel_bends.items()):
+                if pitch_value != PITCH_BEND_CENTER:
+                    self.port.write_short(PITCH_BEND + channel, BEND_LSB[PITCH_BEND_CENTER], BEND_MSB[PITCH_BEND_CENTER])
+                    self.messages_sent += 1
+                    if self.recorder is not None:
+                        self.recorder.write_short(PITCH_BEND + channel, BEND_LSB[PITCH_BEND_CENTER], BEND_MSB[PITCH_BEND_CENTER])
+        self.channel_bends.clear()
+    
+    def add(self, channel, finger_position, rounded_key, pitch_table, pitch_base, time_update, dx):
+        '''Starts a voice at its key (like on_touch_down) and sends its pitch bend right away.
+        The voice keeps the pitch table it was started with (a new one is built by the UI thread).
+        Returns the voice, to be given to move() and remove().
+        '''
+        voice = ControlVoice()
+        voice.channel = channel
+        voice.position = rounded_key
+        voice.finger_position = finger_position
+        voice.rounded_key = rounded_key
+        voice.pitch_table = pitch_table
+        voice.pitch_base = pitch_base
+        voice.time_update = time_update
+        voice.dx = dx
+        voice.pitch_value = None
+        
+        with self.lock:
+            self.voices.add(voice)
+            self.send_pitch_bend(voice)
+        self.wakeup.set()
+        return voice
+    
+    def move(self, voice, finger_position, rounded_key, time_update, dx):
+        # (like on_touch_move)
+        with self.lock:
+            voice.finger_position = finger_position
+            voice.rounded_key = rounded_key
+            voice.time_update = time_update
+            voice.dx = dx
+        self.wakeup.set()
+    
+    def silence(self, voice):
+        # the voice has lost its channel (stolen by a newer one), it doesn't send anything anymore
+        with self.lock:
+            voice.channel = None
+    
+    def remove(self, voice):
+        with self.lock:
+            self.voices.discard(voice)
+    
+    def run(self):
+        last_tick = next_tick = time.time()
+        while self.running:
+            now = time.time()
+            busy = self.tick(now, now - last_tick)
+            last_tick = now
+            
+            if not busy:
+                # everything has converged: sleep until something changes
+                self.wakeup.wait()
+                self.wakeup.clear()
+                last_tick = next_tick = time.time()
+                continue
+            
+            next_tick += 1.0 / self.rate
+            delay = next_tick - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # too late: don't try to catch up, the next tick's dt covers the gap
+                self.late_ticks += 1
+                next_tick = time.time()
+    
+    def tick(self, now, dt):
+        # one rounding step for all the voices. Returns False if all of them have converged.
+        settings = self.settings
+        threshold = self.movement_threshold
+        busy = False
+        
+        with self.lock:
+            self.ticks += 1
+            if self.trace is not None:
+                self.trace.tick(now, dt)
+            if dt > 0:
+                to_finger = dt_correct(settings.round_speed_to_finger, dt, settings.rounding_scheduler_interval)
+                to_key = dt_correct(settings.round_speed_to_key, dt, settings.rounding_scheduler_interval)
+            else:
+                to_finger = to_key = 0.0
+            
+            for voice in self.voices:
+                if settings.pitch_lock:
+                    # fully rounding - chromatic
+                    voice.position = voice.rounded_key
+                elif now - voice.time_update < settings.movement_decay and abs(voice.dx) > threshold:
+                    # the finger is moving around: snap to the finger
+                    voice.position += (voice.finger_position - voice.position) * to_finger
+                    busy = True
+                else:
+                    # the finger stands still: snap to the key under it (but no changes under 1 pixel)
+                    voice.position += (voice.rounded_key - voice.position) * to_key
+                    if abs(voice.rounded_key - voice.position) <= 1:
+                        voice.position = voice.rounded_key
+                    else:
+                        busy = True
+                
+                self.send_pitch_bend(voice)
+        return busy
+    
+    def send_pitch_bend(self, voice):
+        # (call with the lock held) like Keyboard.midi_set_pitch_bend, but only if the value has changed
+        if voice.channel is None or self.port is None:
+            return
+        
+        pitch_value = voice.pitch_table.pitch_value(voice.position, voice.pitch_base)
+        
+        if pitch_value != voice.pitch_value:
+            voice.pitch_value = pitch_value
+            self.channel_bends[voice.channel] = pitch_value
+            self.port.write_short(PITCH_BEND + voice.channel, BEND_LSB[pitch_value], BEND_MSB[pitch_value])
+            self.messages_sent += 1
+            if self.recorder is not None:
+                self.recorder.write_short(PITCH_BEND + voice.channel, BEND_LSB[pitch_value], BEND_MSB[pitch_value])
+    
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
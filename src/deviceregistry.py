@@ -0,0 +1,193 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+The MIDI devices of the system, enumerated once into an immutable snapshot that
+everybody reads (the device list of the settings, set_midi_device, the output
+pool) and refreshed on a background thread.
+
+Note: PortMidi reads the list of devices at pygame.midi.init(), on most systems
+devices plugged in later only show up after a new init - which isn't possible
+while a port is open. So the polling mostly sees the "opened" flags change
+(other applications taking or releasing a device) and the backends that do
+rescan by themselves.
+'''
+
+
+import threading
+from collections import namedtuple
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Polling
+# ---------------------------------------------------------
+# seconds between two scans of the devices (0: only scan on refresh())
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+# one device, as returned by pygame.midi.get_device_info (plus its id)
+MidiDevice = namedtuple('MidiDevice', ('id', 'interface', 'name', 'is_input', 'is_output', 'opened'))
+
+
+def scan_pygame_devices():
+    # all the devices PortMidi knows, one get_device_info call per device
+    import pygame.midi
+    return [MidiDevice(i, *pygame.midi.get_device_info(i)) for i in range(pygame.midi.get_count())]
+
+
+'''
+####################################
+##
+##   DeviceSnapshot Class
+##
+####################################
+'''
+class DeviceSnapshot(object):
+    '''The devices at one point in time. It's never changed after it's built, so
+    it can be read from any thread without a lock: a new scan builds a new one.
+    '''
+    
+    def __init__(self, devices, generation=0):
+        self.devices = tuple(devices)
+        self.generation = generation
+        self.outputs = tuple(device for device in self.devices if device.is_output == 1)
+        # (if two outputs have the same name, the last one wins - like the old scan of set_midi_device)
+        self.output_ids = dict((device.name, device.id) for device in self.outputs)
+    
+    def __eq__(self, other):
+        return isinstance(other, DeviceSnapshot) and self.devices == other.devices
+    
+    def __ne__(self, other):
+        return not self == other
+    
+    def device(self, device_id):
+        # (the ids are the positions in the list of PortMidi)
+        return self.devices[device_id]
+    
+    def output_id(self, name):
+        # the id of the output device with that name (None if there is none)
+        return self.output_ids.get(name)
+    
+    def output_list(self):
+        # (device id, name) of every output device
+        return [(device.id, device.name) for device in self.outputs]
+    
+    def diff(self, old):
+        # (added, removed): the names of the output devices that came and went since the old snapshot
+        names = set(self.output_ids)
+        old_names = set(old.output_ids)
+        return sorted(names - old_names), sorted(old_names - names)
+
+
+'''
+####################################
+##
+##   DeviceRegistry Class
+##
+####################################
+'''
+class DeviceRegistry(object):
+    '''Holds the current DeviceSnapshot. refresh() scans the devices (scan() returns a
+    list of MidiDevice); with an interval, a background thread refreshes the snapshot
+    by itself. If it has changed, the listeners are called with (new, old) snapshot -
+    on the thread that scanned, so a UI listener has to hand it over to the Clock.
+    '''
+    
+    def __init__(self, scan=scan_pygame_devices, interval=DEFAULT_POLL_INTERVAL):
+        self.scan = scan
+        self.interval = interval
+        self.listeners = []
+        self.lock = threading.Lock()
+        
+        # the first scan is done right away (the app needs the devices to start)
+        self.snapshot = DeviceSnapshot(scan())
+        
+        # statistics
+        self.scans = 1
+        self.changes = 0
+        
+        self.running = False
+        self.wakeup = threading.Event()
+        self.thread = None
+    
+    def bind(self, listener):
+        self.listeners.append(listener)
+    
+    def unbind(self, listener):
+        self.listeners.remove(listener)
+    
+    def refresh(self):
+        # scan the devices now, returns True if the snapshot has changed
+        with self.lock:
+            old = self.snapshot
+            new = DeviceSnapshot(self.scan(), old.generation + 1)
+            self.scans += 1
+            if new == old:
+                return False
+            self.snapshot = new
+            self.changes += 1
+        
+        for listener in self.listeners[:]:
+            listener(new, old)
+        return True
+    
+    def start(self):
+        # start polling (if there is an interval)
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='DeviceRegistry')
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def set_interval(self, interval):
+        # (0 stops the polling until the next change)
+        self.interval = max(0.0, interval)
+        self.wakeup.set()
+    
+    def run(self):
+        while self.running:
+            if self.interval > 0:
+                self.wakeup.wait(self.interval)
+            else:
+                self.wakeup.wait()
+            if self.wakeup.is_set():
+                # woken up by set_interval or close: wait again (with the new interval)
+                self.wakeup.clear()
+                continue
+            if self.running:
+                self.refresh()
+    
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
@@ -0,0 +1,174 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import os
+import thread
+import threading
+from hashlib import sha1
+from os.path import abspath, exists, getmtime, getsize, join, splitext
+
+import pygame
+
+
+def size_bucket(width, height, step):
+    # round a window size up to a multiple of step (one copy serves all the window sizes of a bucket)
+    return (int(-(-width // step) * step), int(-(-height // step) * step))
+
+
+'''
+####################################
+##
+##   ImageCache Class
+##
+####################################
+'''
+class ImageCache(object):
+    '''Downscaled copies of images, stored on disk.
+    A copy is generated once and reused as long as the original file doesn't change:
+    the name of the cached file is derived from the path, the modification time and
+    the size of the original (and from the requested size), so a modified file gets
+    a new copy automatically.
+    '''
+    
+    def __init__(self, directory):
+        self.directory = directory
+        if not exists(directory):
+            os.makedirs(directory)
+        
+        # statistics
+        self.hits = 0
+        self.misses = 0
+    
+    def cache_filename(self, filename, max_width, max_height, stretch=False):
+        key = '%s|%r|%i|%ix%i' % (abspath(filename), getmtime(filename), getsize(filename), max_width, max_height)
+        if stretch:
+            key += '|stretch'
+        return join(self.directory, sha1(key).hexdigest() + splitext(filename)[1].lower())
+    
+    def get(self, filename, max_width, max_height, stretch=False):
+        '''Returns the filename of a copy fitting into max_width x max_height (keeping the ratio).
+        With stretch, the copy is max_width x max_height (for images displayed without keeping
+        the ratio, like the background), only the sides bigger than that are scaled down.
+        If the image is already smaller or can't be scaled, the original filename is returned.
+        (may be called from any thread)
+        '''
+        try:
+            cached = self.cache_filename(filename, max_width, max_height, stretch)
+            if exists(cached):
+                self.hits += 1
+                return cached
+            
+            self.misses += 1
+            return self.create(filename, cached, max_width, max_height, stretch)
+        
+        except Exception, e:
+            print 'Image cache: Unable to scale <%s>. Reason: %s' % (filename, e)
+            return filename
+    
+    def create(self, filename, cached, max_width, max_height, stretch=False):
+        surface = pygame.image.load(filename)
+        width, height = surface.get_size()
+        if stretch:
+            size = (min(width, max_width), min(height, max_height))
+            if size == (width, height):
+                return filename
+        else:
+            scale = min(float(max_width) / width, float(max_height) / height)
+            if scale >= 1:
+                return filename
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        
+        try:
+            surface = pygame.transform.smoothscale(surface, size)
+        except ValueError:
+            # smoothscale only works with 24 and 32 bit images
+            surface = pygame.transform.scale(surface, size)
+        
+        # write to a temporary file first, so there is never a half written image in the cache
+        # (the name is unique per thread: two threads may create the same copy)
+        temporary = '%s.%i.tmp%s' % (cached, thread.get_ident(), splitext(cached)[1])
+        pygame.image.save(surface, temporary)
+        os.rename(temporary, cached)
+        return cached
+
+
+'''
+####################################
+##
+##   ImageCacheWorker Class
+##
+####################################
+'''
+class ImageCacheWorker(object):
+    '''Creates the copies of an ImageCache on one thread of its own, so the caller never
+    waits for the decoding and scaling. Only the newest request is kept: a request that is
+    replaced before the worker gets to it is dropped (while the window is resized, only the
+    last size is scaled).
+    callback(filename, max_width, max_height, copy) is called on the worker thread.
+    '''
+    
+    def __init__(self, cache):
+        self.cache = cache
+        
+        # (filename, max_width, max_height, stretch, callback) of the newest request, or None
+        self.pending = None
+        self.lock = threading.Lock()
+        
+        # statistics
+        self.requests = 0
+        self.dropped = 0
+        
+        self.running = True
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='ImageCacheWorker')
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def request(self, filename, max_width, max_height, callback, stretch=False):
+        with self.lock:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = (filename, max_width, max_height, stretch, callback)
+            self.requests += 1
+        self.wakeup.set()
+    
+    def run(self):
+        while self.running:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            
+            with self.lock:
+                pending, self.pending = self.pending, None
+            if pending is None:
+                continue
+            
+            filename, max_width, max_height, stretch, callback = pending
+            callback(filename, max_width, max_height, self.cache.get(filename, max_width, max_height, stretch))
+    
+    def close(self):
+        # stop the thread (the copy being scaled is finished first)
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
@@ -0,0 +1,59 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+from kivy.loader import Loader
+
+
+'''
+####################################
+##
+##   Asynchronous Image Loading
+##
+####################################
+'''
+def load_texture(filename, callback):
+    '''Decodes the image on a worker thread of the kivy Loader and calls
+    callback(filename, texture) on the main thread once the texture is uploaded.
+    If the image can't be loaded, the callback gets None as the texture.
+    (big images like the backgrounds take up to a few hundred ms to decode, that's
+    why they must not be loaded with Image(source=...) while the user is playing)
+    '''
+    proxy = Loader.image(filename)
+    
+    def on_load(proxy):
+        proxy.unbind(on_load=on_load)
+        if proxy.image is Loader.error_image:
+            print 'Warning: Unable to load the image "%s".' % filename
+            callback(filename, None)
+        else:
+            callback(filename, proxy.texture)
+    
+    # already in the loader's cache?
+    if proxy.loaded:
+        on_load(proxy)
+    else:
+        proxy.bind(on_load=on_load)
+    return proxy
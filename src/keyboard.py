@@ -28,13 +28,22 @@ import time
 from kivy.clock import Clock
 from kivy.base import EventLoop
 from kivy.utils import boundary
-from kivy.animation import Animation
 from kivy.graphics import Color, Rectangle
 from kivy.properties import ObjectProperty, NumericProperty
 
+from kivy.core.image import Image as CoreImage
+from kivy.core.window import Window
 from kivy.uix.image import Image
-from kivy.uix.widget import Widget
-from kivy.uix.stencilview import StencilView
+
+from keylight import KeyLightPool
+from atlasloader import resolve_image
+from startupprofiler import profiler
+from voice import Voice
+from keygeometry import KeyGeometry
+from tuning import PitchTable, BEND_LSB, BEND_MSB
+from tween import tweens
+import latencytracer
+from latencytracer import NOTE_HANDLER, BEND_HANDLER
 
 
 '''
@@ -49,11 +58,15 @@ from kivy.uix.stencilview import StencilView
 # ---------------------------------------------------------
 KEY_FADEOUT_TIME = 0.8
 KEY_IMAGE_COLOR = (1, 1, 1, .8)
-KEY_IMAGE_COLOR_TRANSPARENT = (1, 1, 1, 0)
 
 UNIVERSAL_KEY_IMAGE = 'images/key_universal.png'
 UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN = 0.1
 UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MAX = 0.5
+UNIVERSAL_KEY_IMAGE_SIZE = (100, 500)
+
+KEY_IMAGE_SIZE = (100, 1000)
+# number of pre-allocated key lights: 10 fingers, each with some keys still fading out
+KEY_LIGHT_POOL_SIZE = 64
 
 # Feedback Wall Graphics
 # ---------------------------------------------------------
@@ -82,22 +95,58 @@ KEY_MOVEMENT_THRESHOLD = 1
 ####################################
 '''
 class Keyboard(Image):
-    keyboard_x_animation = Animation()
-    old_keyboard_change_animation = Animation()
-    new_keyboard_change_animation = Animation()
     keyboard_is_animated = False
     border_width = NumericProperty(None)
     rounding_function_running = False
     app = ObjectProperty(None)
     key_width = NumericProperty(None)
     
+    # typed snapshot of the application settings (an AppSettings instance, assigned by the IcarusTouchWidget)
+    settings = None
+    
+    # pool of the blob images (shared by all keyboards, assigned by the IcarusTouchWidget)
+    blob_pool = None
+    
+    # vectorized RoundingEngine (shared by all keyboards, assigned by the IcarusTouchWidget). If None, roundAllKeys does the rounding itself.
+    rounding_engine = None
+    
+    # ControlRateEngine (shared by all keyboards, assigned by the IcarusTouchWidget). If set, it does the rounding on its own thread instead of roundAllKeys.
+    control_engine = None
+    
+    # TraceWriter recording the rounding ticks (assigned by the IcarusTouchWidget while a touch trace is recorded)
+    trace = None
+    
+    # MoveCoalescer of the graphics of the touch moves (assigned by the IcarusTouchWidget if "Coalesce touch moves" is on).
+    # If None, every move updates the graphics right away.
+    move_coalescer = None
+    
+    # textures of the key illumination images, shared by all keyboards
+    key_textures = {}
+    
+    # KeyGeometry of the keys (see get_key_geometry), None if it has to be rebuilt
+    key_geometry = None
+    
+    # Tuning of the keys (assigned by the IcarusTouchWidget) and its PitchTable (see get_pitch_table), None if it has to be rebuilt
+    tuning = None
+    pitch_table = None
+    
+    def __init__(self, **kwargs):
+        super(Keyboard, self).__init__(**kwargs)
+        
+        # the key illuminations are drawn directly on the canvas (above the keyboard image, below the blobs)
+        self.key_lights = KeyLightPool(self.canvas, KEY_LIGHT_POOL_SIZE, KEY_FADEOUT_TIME)
+        
+        # the key geometry only changes with the key width or the width of the keyboard
+        self.bind(key_width=self.invalidate_key_geometry, width=self.invalidate_key_geometry)
+    
     def on_touch_down(self, touch):
         # if the touch doesn't belong to me, discard it
         if not self.collide_point(*touch.pos):
             return super(Keyboard, self).on_touch_down(touch)
         
-        # define a short name for the touch-specific and unique UserDictionary "ud"
-        ud = touch.ud
+        tracer = latencytracer.tracer
+        if tracer is not None:
+            tracer.stamp(NOTE_HANDLER, touch.time_start)
         
         ######################################################################################################################
         # 
@@ -105,30 +154,52 @@ class Keyboard(Image):
         # 
         ######################################################################################################################
         
-        # if not yet started, start the rounding algorithm now
-        if not self.rounding_function_running:
-            Clock.schedule_interval(self.roundAllKeys, float(self.parent.app.config.get('Advanced', 'RoundingSchedulerInterval')))
+        # if not yet started, start the rounding algorithm now (the control-rate engine runs by itself)
+        if self.control_engine is None and not self.rounding_function_running:
+            Clock.schedule_interval(self.roundAllKeys, self.settings.rounding_scheduler_interval)
             self.rounding_function_running = True
         
-        # define all the touch-specific properties with the given key touched
-        ud['initial_key'] = self.calculate_key(touch.x)
-        ud['finger_position'] = ud['initial_key']['keyposition_relative_to_keyboard']
-        ud['rounded_key'] = int(ud['finger_position'] + (self.key_width / 2.0))
-        ud['key_moving'] = False
-        ud['vibrato'] = False # this isn't implemented yet.
-        
+        # define all the touch-specific properties with the given key touched: they are kept in a Voice, attached to the touch
         # (remember that here is the only situation in the code where 'current_position' is set/changed outside the scheduled roundAllKeys function!)
-        ud['current_position'] = ud['rounded_key']
-        ud['old_position'] = ud['rounded_key']
+        geometry = self.get_key_geometry()
+        pitch_table = self.get_pitch_table()
+        keynumber = self.calculate_key(touch.x)
+        keyposition = geometry.lefts[keynumber]
+        voice = touch.ud['voice'] = Voice(keynumber, keyposition, int(geometry.centers[keynumber]))
+        voice.keyboard = self
+        
+        # the note is fixed for the whole touch, the pitch bend goes from there
+        voice.note = pitch_table.key_notes[keynumber]
+        voice.pitch_base = pitch_table.key_bases[keynumber]
+        
+        # the rounding engine keeps its own copy of the rounding values
+        if self.rounding_engine is not None:
+            voice.rounding_slot = self.rounding_engine.add(
+                voice, voice.finger_position, voice.rounded_key,
+                voice.pitch_base,
+                touch.time_update, touch.dx)
+        
+        # get a MIDI channel for this voice
+        self.midi_allocate_voice(touch)
         
         # set pichbend to neutral middle position
-        self.midi_set_pitch_bend(ud)
+        if self.control_engine is not None:
+            # the control-rate engine writes its pitch bends directly to the MIDI thread, so first send what's queued (keeps the order)
+            self.parent.midi_out.flush()
+            voice.control_voice = self.control_engine.add(
+                voice.channel, voice.finger_position, voice.rounded_key,
+                pitch_table, voice.pitch_base,
+                touch.time_update, touch.dx)
+        else:
+            self.midi_set_pitch_bend(voice)
         
         # Y-Axis to MIDI:
-        self.midi_change_y_value(self.bind_y_on_keyboard(touch.y))
+        self.midi_change_y_value(voice, self.bind_y_on_keyboard(touch.y))
         
         # play note
-        self.midi_note_on(ud['initial_key']['keynumber'])
+        if tracer is not None and voice.channel is not None:
+            tracer.note(voice.channel, voice.note, touch.time_start)
+        self.midi_note_on(voice)
         
         ######################################################################################################################
         # 
@@ -143,54 +214,94 @@ class Keyboard(Image):
         self.illumniate_key(touch)
         
         # illustrate the current position with a canvas line (if desired)
-        if self.parent.app.config.get('Advanced', 'ShowPitchLine') == 'On':
+        if self.settings.show_pitch_line:
             with self.canvas:
                 Color(0, 0, 0)
-                ud['canvas_line'] = Rectangle(pos=(ud['current_position']+self.x, self.y), size=(2, self.height))
+                voice.canvas_line = Rectangle(pos=(voice.current_position+self.x, self.y), size=(2, self.height))
+            
+            # with the control-rate engine, the lines follow its positions at the frame rate
+            if self.control_engine is not None:
+                Clock.unschedule(self.update_pitch_lines)
+                Clock.schedule_interval(self.update_pitch_lines, 0)
         
         # feedback wall: if there is an feedbackwall fadeout animation in progress, stop it.
-        self.parent.feedback_wall.feedback_animation.stop(self.parent.feedback_wall)
+        tweens.stop(self.parent.feedback_wall)
         self.parent.feedback_wall.transparency = FEEDBACK_IMAGE_TRANSPARENCY_MIN + ((self.bind_y_on_keyboard(touch.y) - self.y) / self.height) * (FEEDBACK_IMAGE_TRANSPARENCY_MAX - FEEDBACK_IMAGE_TRANSPARENCY_MIN)
-          
+        
+        # (while the keyboard is changed, the old and the new keyboard overlap - only one of them gets the touch)
+        return True
+    
     
     def on_touch_move(self, touch):
-        # define a short name for the touch-specific and unique UserDictionary "ud"
-        ud = touch.ud
+        # while the keyboard is changed, both keyboards get the touch: only the one that has its voice handles it
+        if touch.ud['voice'].keyboard is not self:
+            return
+        
+        # every move goes to the pitch and the MIDI right away, the graphics maybe only once per frame
+        self.move_pitch(touch)
+        if self.move_coalescer is not None:
+            self.move_coalescer.push(touch, self.move_graphics)
+        else:
+            self.move_graphics(touch)
+    
+    
+    def move_pitch(self, touch):
+        # the state of this finger
+        voice = touch.ud['voice']
+        
+        # latency tracing: the next pitch bend of this voice answers this move
+        tracer = latencytracer.tracer
+        if tracer is not None:
+            tracer.stamp(BEND_HANDLER, touch.time_update)
+            if voice.channel is not None:
+                tracer.move(voice.channel, touch.time_update)
         
-        # if not yet started, start the rounding algorithm
-        if not self.rounding_function_running:
-            Clock.schedule_interval(self.roundAllKeys, float(self.parent.app.config.get('Advanced', 'RoundingSchedulerInterval')))
+        # if not yet started, start the rounding algorithm (the control-rate engine runs by itself)
+        if self.control_engine is None and not self.rounding_function_running:
+            Clock.schedule_interval(self.roundAllKeys, self.settings.rounding_scheduler_interval)
             self.rounding_function_running = True
         
         # bind all touch coordinates to real keyboard dimensions
         bounded_x = self.bind_x_on_keyboard(touch.x)
         bounded_y = self.bind_y_on_keyboard(touch.y)
         
-        bounded_previous_x = self.bind_x_on_keyboard(touch.px)
-        bounded_previous_y = self.bind_y_on_keyboard(touch.py)
+        # the key under the finger
+        geometry = self.get_key_geometry()
+        key = geometry.key_at(bounded_x - self.x)
         
         # here comes all the action for calculating the keyboard position...
-        ud['finger_position'] = bounded_x - self.x
-        ud['rounded_key'] = int(self.calculate_key(bounded_x)['keyposition_relative_to_keyboard'] + (self.key_width / 2.0))
-        #ud['vibrato'] = False
+        voice.finger_position = bounded_x - self.x
+        voice.rounded_key = int(geometry.centers[key])
+        #voice.vibrato = False
         
-        # Y-Axis to MIDI:
-        self.midi_change_y_value(bounded_y)
+        if self.rounding_engine is not None:
+            self.rounding_engine.move(voice.rounding_slot, voice.finger_position, voice.rounded_key, touch.time_update, touch.dx)
+        elif self.control_engine is not None:
+            self.control_engine.move(voice.control_voice, voice.finger_position, voice.rounded_key, touch.time_update, touch.dx)
         
-        # blob move
-        ud['blob'].x = bounded_x - ud['blob'].size[0] / 2
-        ud['blob'].y = bounded_y  - ud['blob'].size[1] / 2
+        # Y-Axis to MIDI:
+        self.midi_change_y_value(voice, bounded_y)
+    
+    
+    def move_graphics(self, touch):
+        # the state of this finger
+        voice = touch.ud['voice']
         
-        # TODO: key painting with canvas - maybe much better performance and less ram usage!
+        # bind all touch coordinates to real keyboard dimensions
+        bounded_x = self.bind_x_on_keyboard(touch.x)
+        bounded_y = self.bind_y_on_keyboard(touch.y)
+        key = self.get_key_geometry().key_at(bounded_x - self.x)
         
-        # get the key image instance: I just have to modify the latest key in the entire list (which is the one I'm currently touching):
-        latest_key_stencil = ud['keys'][len(ud['keys'])-1]
+        # blob move
+        blob = voice.blob
+        blob.x = bounded_x - blob.size[0] / 2
+        blob.y = bounded_y  - blob.size[1] / 2
         
-        # get the position of the key on which the old touch was laying
-        oldkeyposition_relative_to_window = self.calculate_key(bounded_previous_x)['keyposition_relative_to_keyboard'] + self.x
+        # get the key light: I just have to modify the latest key (which is the one I'm currently touching):
+        latest_key_light = voice.key_light
         
-        # Has the touch moved over a new key?
-        if bounded_x < oldkeyposition_relative_to_window or bounded_x > oldkeyposition_relative_to_window + self.key_width - 1:
+        # Has the touch moved over a new key? (since the last graphics update - there may have been several moves)
+        if key != voice.lit_key:
             
             # maybe the slide was so fast that touch.dx is over self.key_width -> multiple keys where not illuminated cause we "overrun" them.
             '''
@@ -203,51 +314,60 @@ class Keyboard(Image):
             '''
             
             # let the old key fade out
-            self.key_fadeout(ud['keys'][len(ud['keys'])-1])
+            self.key_fadeout(latest_key_light)
             
             # paint new key
             self.illumniate_key(touch)
+            latest_key_light = voice.key_light
         
-        # regardless of the x-movement, the stencil's "key image" has to be moved up and down on the key with the touch's y-position
-        # (because the key image lays over the universal key image (it is on the top) its index is the lower one = 0)
-        latest_key_stencil.children[0].y += bounded_y - bounded_previous_y
+        # regardless of the x-movement, the "key image" has to be moved up and down on the key with the touch's y-position
+        latest_key_light.move_key_image(bounded_y - KEY_IMAGE_SIZE[1] / 2)
         
         # the universal key has to change its brightness
-        # (because the universal key image lays under the key image (it is on the bottom) its index is the higher one = 1)
-        latest_key_stencil.children[1].color = (1, 1, 1, UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN + ((bounded_y - self.y) / self.height) * (UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MAX - UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN))
+        latest_key_light.set_universal_alpha(UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN + ((bounded_y - self.y) / self.height) * (UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MAX - UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN))
         
         # the feedback wall has to change its brightness too
         self.parent.feedback_wall.transparency = FEEDBACK_IMAGE_TRANSPARENCY_MIN + ((self.bind_y_on_keyboard(touch.y) - self.y) / self.height) * (FEEDBACK_IMAGE_TRANSPARENCY_MAX - FEEDBACK_IMAGE_TRANSPARENCY_MIN)
     
     
     def on_touch_up(self, touch):
-        # define a short name for the touch-specific and unique UserDictionary "ud"
-        ud = touch.ud
+        # the state of this finger
+        voice = touch.ud['voice']
+        if voice.keyboard is not self:
+            return
+        
+        # its graphics are faded out right now, a move still waiting for them doesn't matter anymore
+        if self.move_coalescer is not None:
+            self.move_coalescer.discard(touch)
         
         # MIDI: note off
-        self.midi_note_off(ud['initial_key']['keynumber'])
+        self.midi_note_off(touch)
         
         # the pitchbend value should be set to 0 too, but I make this not until a new touch_down occurs,
         # otherwise a sound with some release time (NOT the effects but the sound itself) could be bended around.
         
         # little hack - don't know why, but if this isn't here, an initial touch on the bottom of the keyboard gives a short "click" instead of total silence...
-        if self.parent.app.config.get('General', 'YAxis') != 'Aftertouch':
+        if not self.settings.y_axis_is_aftertouch and voice.channel is not None:
             # Y axis = Volume
-            self.midi_set_modulation(0)
+            self.midi_set_modulation(voice.channel, 0)
         
         # if the advanced setting "pitch line" was turned on, delete the line by now.
-        if 'canvas_line' in ud:
-            self.canvas.remove(ud['canvas_line'])
+        if voice.canvas_line is not None:
+            self.canvas.remove(voice.canvas_line)
+        
+        if self.rounding_engine is not None:
+            self.rounding_engine.remove(voice.rounding_slot)
+        elif self.control_engine is not None:
+            self.control_engine.remove(voice.control_voice)
         
         # let the last key fadeout --> only the last has to be faded out by now. the others are already fading
-        self.key_fadeout(ud['keys'][len(ud['keys'])-1])
+        self.key_fadeout(voice.key_light)
         
         # let the blob fade out
         self.blob_fadeout(touch)
         
         # let the feedback wall disappear
-        self.parent.feedback_wall.feedback_animation = Animation(transparency=0, t='out_expo', duration=FEEDBACK_IMAGE_FADEOUT_TIME)
-        self.parent.feedback_wall.feedback_animation.start(self.parent.feedback_wall)
+        tweens.start(self.parent.feedback_wall, FEEDBACK_IMAGE_FADEOUT_TIME, 'out_expo', transparency=0)
     
 
     '''
@@ -258,118 +378,100 @@ class Keyboard(Image):
     ####################################
     '''
     def create_blob(self, touch):
-        # define a short name for the touch-specific and unique UserDictionary "ud"
-        ud = touch.ud
-        
-        # create the new blob
-        ud['blob'] = Image(
-            source=self.parent.app.config.get('Advanced', 'BlobImage'),
-            color=BLOB_IMAGE_COLOR,
-            allow_stretch=True,
-            size=(self.parent.app.config.getint('Advanced', 'BlobSize'), self.parent.app.config.getint('Advanced', 'BlobSize')))
+        # take a blob from the pool and reset it (the image is only reloaded if the setting has changed)
+        blob = touch.ud['voice'].blob = self.blob_pool.acquire()
+        if blob.source != self.settings.blob_image:
+            blob.source = self.settings.blob_image
+        blob.color = BLOB_IMAGE_COLOR
+        blob.size = (self.settings.blob_size, self.settings.blob_size)
         
         # set the blobs position right under the finger
-        ud['blob'].x = touch.x - ud['blob'].size[0] / 2
-        ud['blob'].y = touch.y - ud['blob'].size[1] / 2
-        self.add_widget(ud['blob'])
+        blob.x = touch.x - blob.size[0] / 2
+        blob.y = touch.y - blob.size[1] / 2
+        self.add_widget(blob)
     
     def illumniate_key(self, touch):
-        # define a short name for the touch-specific and unique UserDictionary "ud"
-        ud = touch.ud
-        
         # bind all touch coordinates to real keyboard dimensions
         bounded_x = self.bind_x_on_keyboard(touch.x)
         bounded_y = self.bind_y_on_keyboard(touch.y)
         
-        # TODO: port the whole calculation into "calculate_key"
         # find out on which x position to put the key
-        x_to_keyboard = bounded_x - self.x;
+        geometry = self.get_key_geometry()
+        keynumber = geometry.key_at(bounded_x - self.x)
         y_to_keyboard = bounded_y - self.y;
-        keynumber_absolute = int(x_to_keyboard / self.key_width);
-        keyposition_to_keyboard = keynumber_absolute * self.key_width;
-        keyposition_absolute_x = keyposition_to_keyboard + self.x;
-        keyposition_absolute_y = y_to_keyboard + self.y - 500;
-        
-        # create a stencilView with the dimension of one key
-        stencil = StencilView(
-            size=(self.key_width-2, self.height-2),
-            pos=(keyposition_absolute_x+1, self.y+1))
-        
-        # first, add an image called "universal key" which is just a white image. This can be made more or less bright (changes with the y-position of the finger)
-        stencil.add_widget(Image(
-            color=(1, 1, 1, UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN + (y_to_keyboard / self.height) * (UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MAX - UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN)),
-            source=UNIVERSAL_KEY_IMAGE,
-            allow_stretch=True,
-            size=(100, 500),
-            pos=(keyposition_absolute_x, self.y)))
-        
-        # then, add an image called "key image" which is basically a huge blob in a rectangle shape. It changes his position with the y-position of the finger
-        stencil.add_widget(Image(
-            color=KEY_IMAGE_COLOR,
-            source=self.parent.app.config.get('Advanced', 'KeyImage'),
-            allow_stretch=True,
-            size=(100, 1000),
-            pos=(keyposition_absolute_x-25, keyposition_absolute_y)))
-        
-        # if the user dictionary key 'keys' wasn't created yet, create it now.
-        if not 'keys' in ud:
-            ud['keys'] = [Widget()]
-        
-        # then add the key to the list of this touch AND to the keybaord widget
-        ud['keys'].append(stencil)
-        self.add_widget(stencil)
-        
-        # workaround for having the blob image IN FRONT of the key images
-        self.remove_widget(ud['blob'])
-        self.add_widget(ud['blob'])
-    
-    
-    def key_fadeout(self, stencil):
-        # make the key fade out
-        animation = Animation(color=KEY_IMAGE_COLOR_TRANSPARENT, t='out_expo', duration=KEY_FADEOUT_TIME)
-        animation2 = Animation(color=(1, 1, 1, 0), t='out_expo', duration=KEY_FADEOUT_TIME)
-        
-        animation.start(stencil.children[0])
-        animation2.start(stencil.children[1])
-        
-        # after fading out, call the "death"-function
-        animation.bind(on_complete=self.key_fadeout_complete)
-        animation2.bind(on_complete=self.key_fadeout_complete)
+        keyposition_absolute_x = geometry.lefts[keynumber] + self.x;
+        keyposition_absolute_y = y_to_keyboard + self.y - KEY_IMAGE_SIZE[1] / 2;
+        
+        # take a key light from the pool and clip it to the dimension of one key
+        light = self.key_lights.acquire()
+        light.show(
+            clip=(keyposition_absolute_x+1, self.y+1, geometry.widths[keynumber]-2, self.height-2),
+            
+            # first, the image called "universal key" which is just a white image. This can be made more or less bright (changes with the y-position of the finger)
+            universal_texture=self.get_key_texture(UNIVERSAL_KEY_IMAGE),
+            universal_rect=(keyposition_absolute_x, self.y) + UNIVERSAL_KEY_IMAGE_SIZE,
+            universal_alpha=UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN + (y_to_keyboard / self.height) * (UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MAX - UNIVERSAL_KEY_IMAGE_TRANSPARENCY_MIN),
+            
+            # then, the image called "key image" which is basically a huge blob in a rectangle shape. It changes his position with the y-position of the finger
+            key_texture=self.get_key_texture(self.settings.key_image),
+            key_rect=(keyposition_absolute_x-25, keyposition_absolute_y) + KEY_IMAGE_SIZE,
+            key_rgba=KEY_IMAGE_COLOR)
+        
+        # this is the key the touch currently lays on
+        voice = touch.ud['voice']
+        voice.key_light = light
+        voice.lit_key = keynumber
+    
+    
+    def get_key_texture(self, filename):
+        # the key images are loaded only once
+        texture = self.key_textures.get(filename)
+        if texture is None:
+            texture = self.key_textures[filename] = CoreImage(resolve_image(filename)).texture
+        return texture
+    
+    
+    def key_fadeout(self, light):
+        # make the key fade out (and give it back to the pool afterwards)
+        self.key_lights.fadeout(light)
     
     
     def blob_fadeout(self, touch):
-        # define a short name for the touch-specific and unique UserDictionary "ud"
-        ud = touch.ud
+        blob = touch.ud['voice'].blob
+        fadeoutpos = blob.pos
+        blob_size = self.settings.blob_size
         
-        fadeoutpos = ud['blob'].pos
-        
-        # make the blob fade out
-        animation = Animation(
+        # make the blob fade out. after fading out, call the "death"-function
+        tweens.start(blob, BLOB_IMAGE_FADEOUT_TIME, 'out_expo', self.blob_fadeout_complete,
             color=BLOB_IMAGE_COLOR_TRANSPARENT,
-            size=(self.parent.app.config.getint('Advanced', 'BlobSize') * 3, self.parent.app.config.getint('Advanced', 'BlobSize') * 3),
-            x=fadeoutpos[0] - self.parent.app.config.getint('Advanced', 'BlobSize'), # workarround for centering the image during resizing
-            y=fadeoutpos[1] - self.parent.app.config.getint('Advanced', 'BlobSize'), # workarround for centering the image during resizing
-            t='out_expo', duration=BLOB_IMAGE_FADEOUT_TIME)
-        
-        animation.start(ud['blob'])
-        
-        # after fading out, call the "death"-function
-        animation.bind(on_complete=self.blob_fadeout_complete)
+            size=(blob_size * 3, blob_size * 3),
+            pos=(fadeoutpos[0] - blob_size, fadeoutpos[1] - blob_size)) # workarround for centering the image during resizing
     
     
-    def blob_fadeout_complete(self, animation, widget):
-        self.remove_widget(widget)
+    def blob_fadeout_complete(self, widget):
+        # (the blob may have been created by the keyboard this one has replaced)
+        if widget.parent is not None:
+            widget.parent.remove_widget(widget)
+        self.blob_pool.release(widget)
     
     
-    def key_fadeout_complete(self, animation, widget):
-        # first look up if the other key image has already been deleted (in his own call of this method)
-        if len(widget.parent.children) == 1:
-            # if so, delete the whole parent widget (= a StencilView)!
-            self.remove_widget(widget.parent)
+    def take_over(self, keyboard):
+        # after a keyboard change: the fingers still down on the old keyboard are handled by this one from now on
+        for touch in EventLoop.touches[:]:
+            voice = touch.ud.get('voice')
+            if voice is None or voice.keyboard is not keyboard:
+                continue
+            voice.keyboard = self
             
-        else:
-            #if not, delete only the actual calling key image. The other key will do the rest.
-            widget.parent.remove_widget(widget)
+            # move their graphics over
+            if voice.blob is not None:
+                keyboard.remove_widget(voice.blob)
+                self.add_widget(voice.blob)
+            if voice.key_light is not None:
+                self.key_lights.take_over(voice.key_light)
+            if voice.canvas_line is not None:
+                keyboard.canvas.remove(voice.canvas_line)
+                voice.canvas_line = None
     
     
     '''
@@ -381,16 +483,16 @@ class Keyboard(Image):
     '''
     def bind_x_on_keyboard(self, x):
         # bind the fingers position to a real possible keyboard location.
-        # get the parent window to look up the screen size.
-        win = self.get_parent_window()
+        # (the keyboard always lives in the application window, no need to walk up the widget tree to find it)
+        window_width = Window.width
         bounded_x = x
         
         # if on the left side of the keyboard
         if self.x > 0:
-            bounded_x = boundary(x, self.x, win.width)
+            bounded_x = boundary(x, self.x, window_width)
         
         # if on the right side of the keyboard
-        elif self.x < win.width - self.width:
+        elif self.x < window_width - self.width:
             bounded_x = boundary(x, 0, self.x + self.width)
         
         return bounded_x
@@ -403,73 +505,159 @@ class Keyboard(Image):
     
     
     def calculate_key(self, x):
-        # calculate useful informations concerning the key pressed, this keys absolute and relative position and so on.
+        # the number of the key pressed (its edges and center are in the key geometry)
         bounded_x = self.bind_x_on_keyboard(x)
-        x_relative_to_keyboard = bounded_x - self.x;
-        
-        keynumber = int(x_relative_to_keyboard / self.key_width);
-        keyposition_relative_to_keyboard = keynumber * self.key_width;
-        
-        returnvalue = {'keyposition_relative_to_keyboard': keyposition_relative_to_keyboard, 'keynumber': keynumber,}        
-        return returnvalue
+        return self.get_key_geometry().key_at(bounded_x - self.x)
+    
+    
+    def get_key_geometry(self):
+        # the table of the key positions, rebuilt after the key width or the keyboard width has changed
+        geometry = self.key_geometry
+        if geometry is None:
+            geometry = self.key_geometry = KeyGeometry.uniform(self.key_width, self.width)
+        return geometry
+    
+    
+    def invalidate_key_geometry(self, *args):
+        self.key_geometry = None
+        self.pitch_table = None
+    
+    
+    def get_pitch_table(self):
+        # the pitch of every pixel, rebuilt after the key geometry, the tuning, the transposition or the pitch bend range have changed
+        pitch_table = self.pitch_table
+        if pitch_table is None:
+            pitch_table = self.pitch_table = PitchTable(self.tuning, self.get_key_geometry(), self.settings.transpose, self.settings.pitch_bend_range)
+        return pitch_table
+    
+    
+    def invalidate_pitch_table(self):
+        # (the voices already playing keep the note they've started with)
+        self.pitch_table = None
     
     def roundAllKeys(self, dt):
         # main function to rounding the pitch AND main function for sending pitch informations over MIDI!
         
+        # a keyboard replaced by a keyboard change has nothing to round anymore (its voices have been taken over)
+        if self.parent is None:
+            self.rounding_function_running = False
+            return False
+        
+        # one point in time for all the touches of this tick
+        now = time.time()
+        if self.trace is not None:
+            self.trace.tick(now, dt)
+        
+        # the same, but for all the voices at once on numpy arrays
+        if self.rounding_engine is not None:
+            return self.round_all_keys_vectorized(now)
+        
         request_scheduler_continue = False
+        # (the settings and the positions of the voice are read once into local variables: faster than the attributes)
+        settings = self.settings
+        pitch_lock = settings.pitch_lock
+        movement_decay = settings.movement_decay
+        round_speed_to_finger = settings.round_speed_to_finger
+        round_speed_to_key = settings.round_speed_to_key
         
         # do the rounding simultanous for all existing touches
         for touch in EventLoop.touches[:]:
-            # define a short name for the touch-specific and unique UserDictionary "ud"
-            ud = touch.ud
+            # the state of this finger
+            voice = touch.ud.get('voice')
             
-            # if this is not a touch on the keyboard,
-            if not 'initial_key' in ud:
+            # if this is not a touch on this keyboard,
+            if voice is None or voice.keyboard is not self:
                 # don't handle it at all.
                 continue
             
+            old_position = voice.old_position
+            rounded_key = voice.rounded_key
+            
             # if there is no "rounding" but only hard lock to chromatic keys:
-            if self.parent.app.config.get('General', 'PitchLock') == 'On':
+            if pitch_lock:
                 # Fully rounding - chromatic
-                ud['current_position'] = ud['rounded_key']
+                current_position = rounded_key
                 request_scheduler_continue = False
             else:
                 # this is the actual "rounding algorithm"...
-                ud['key_moving'] = time.time() - touch.time_update < float(self.parent.app.config.get('Advanced', 'MovementDecay')) and abs(touch.dx) > KEY_MOVEMENT_THRESHOLD
+                key_moving = voice.key_moving = now - touch.time_update < movement_decay and abs(touch.dx) > KEY_MOVEMENT_THRESHOLD
                 
-                if ud['key_moving']:
+                if key_moving:
                     # if the finger is moving around, snap to the finger.
-                    ud['current_position'] = ud['old_position'] + (ud['finger_position'] - ud['old_position']) * float(self.parent.app.config.get('Advanced', 'RoundSpeedToFinger'))
+                    current_position = old_position + (voice.finger_position - old_position) * round_speed_to_finger
                 else:
                     # if the finger stands still, snap to the key under it --> ROUND.
-                    ud['current_position'] = ud['old_position'] + (ud['rounded_key'] - ud['old_position']) * float(self.parent.app.config.get('Advanced', 'RoundSpeedToKey'))
+                    current_position = old_position + (rounded_key - old_position) * round_speed_to_key
                     # prevent from changes under 1 pixel, that doesn't makes sense and keeps the scheduler running -> bad performance
-                    if abs(ud['rounded_key'] - ud['current_position']) <= 1:
-                        ud['current_position'] = ud['rounded_key']
+                    if abs(rounded_key - current_position) <= 1:
+                        current_position = rounded_key
+            voice.current_position = current_position
             
             # if the rounding is not yet completely done, require more callbacks.
             # that means when all the touches in the for...in-loop will have new == old, the callback will return false, the scheduler will stop.
-            if int(ud['current_position']) != int(ud['old_position']) or int(ud['current_position']) != ud['rounded_key']:
+            if int(current_position) != int(old_position) or int(current_position) != rounded_key:
                 request_scheduler_continue = True
             
             # tha fact that I am here prooves that there is still a change on the position, so keep on sending MIDI pitch data:
-            self.midi_set_pitch_bend(ud)
+            self.midi_set_pitch_bend(voice)
             
             # rounding algorithm debugging:
-            #print '%i,%i,%i,%i,%i' % (ud['old_position'], ud['finger_position'], ud['key_moving'], ud['rounded_key'], ud['current_position'])
+            #print '%i,%i,%i,%i,%i' % (voice.old_position, voice.finger_position, voice.key_moving, voice.rounded_key, voice.current_position)
             
             # if the advanced setting "pitch line" is turned on, move it with the pitch
-            if 'canvas_line' in ud:
-                ud['canvas_line'].pos = int(ud['current_position']) + self.x, self.y
+            if voice.canvas_line is not None:
+                voice.canvas_line.pos = int(current_position) + self.x, self.y
             
             # store history data
-            ud['old_position'] = ud['current_position']
+            voice.old_position = current_position
+            
+        # send the pitch bends of all the touches together
+        self.parent.midi_out.flush()
+        
+        # if the function is not used anymore, stop the scheduler
+        self.rounding_function_running = request_scheduler_continue
+        return request_scheduler_continue
+    
+    
+    def round_all_keys_vectorized(self, now):
+        settings = self.settings
+        engine = self.rounding_engine
+        changed_slots, request_scheduler_continue = engine.step(
+            now, settings.pitch_lock, settings.movement_decay, KEY_MOVEMENT_THRESHOLD,
+            settings.round_speed_to_finger, settings.round_speed_to_key, self.get_pitch_table())
+        
+        # only the voices whose pitch bend value has changed have to send something
+        midi_out = self.parent.midi_out
+        for slot in changed_slots:
+            voice = engine.payload[slot]
+            voice.current_position = voice.old_position = float(engine.old_position[slot])
+            
+            if voice.channel is not None:
+                pitch_value = int(engine.pitch_value[slot])
+                midi_out.write_short(0xE0 + voice.channel, BEND_LSB[pitch_value], BEND_MSB[pitch_value])
             
+            if voice.canvas_line is not None:
+                voice.canvas_line.pos = int(voice.current_position) + self.x, self.y
+        
+        # send the pitch bends of all the touches together
+        midi_out.flush()
+        
         # if the function is not used anymore, stop the scheduler
         self.rounding_function_running = request_scheduler_continue
         return request_scheduler_continue
     
     
+    def update_pitch_lines(self, dt):
+        # control-rate engine: move the pitch lines to the positions of the engine (stops when there are no lines anymore)
+        lines = False
+        for touch in EventLoop.touches[:]:
+            voice = touch.ud.get('voice')
+            if voice is not None and voice.canvas_line is not None and voice.control_voice is not None:
+                voice.canvas_line.pos = int(voice.control_voice.position) + self.x, self.y
+                lines = True
+        return lines
+    
+    
     '''
     ####################################
     ##
@@ -477,71 +665,74 @@ class Keyboard(Image):
     ##
     ####################################
     '''
-    def midi_note_on(self, note):  
-        '''
-        # I don't know if this is working properly...      
-        if self.parent.app.config.get('MIDI', 'VoiceMode') == 'Monophonic'
-            # kill all existing notes
-            for search_touch in EventLoop.touches[:]:
-                if 'initial_key' in search_touch.ud and search_touch.ud['initial_key']['keynumber]' != note:
-                    self.parent.midi_out.note_off(search_touch.ud['initial_key']['keynumber]' + self.parent.app.config.getint('MIDI', 'Transpose'), 0, 0)
-        '''
-        self.parent.midi_out.note_on(note + self.parent.app.config.getint('MIDI', 'Transpose'), self.parent.app.config.getint('MIDI', 'Velocity'), self.parent.app.config.getint('MIDI', 'Channel'))
-    
-    
-    def midi_note_off(self, note): # midi_note_off(self, note , touch):
-        '''
-        # I don't know if this is working properly...  
-        if self.parent.app.config.get('MIDI', 'VoiceMode') == 'Monophonic'
-            # if the voice mode is set to mono, and the latest key is removed, see if there is yet another key touched - this would then be turned on again.
-            for search_touch in EventLoop.touches[:]:
-                if 'initial_key' in search_touch.ud and search_touch.ud['initial_key']['keynumber]' != note:
-                    # there is another key touched. If he was touched earlier than the current one, turn him on ( i hope he was turned of before...)
-                    other_touches.append(search_touch)
-            
-            for other_touch in other_touches:
-                if other_touch.time_start < touch.time_start:
-                    # TODO: there could be several other touches - pick the "youngest" one.
-                    self.midi_note_on(other_touch.ud['initial_key']['keynumber]')
-        '''
-        self.parent.midi_out.note_off(note + self.parent.app.config.getint('MIDI', 'Transpose'), 0, 0)
+    def midi_allocate_voice(self, touch):
+        # get a MIDI channel for this voice (in MPE mode every voice has its own one, otherwise it's the shared MIDI channel)
+        voice = touch.ud['voice']
+        voice.channel, stolen_voice = self.parent.voice_allocator.allocate(touch.uid, voice)
+        
+        # if there was no free channel left, the oldest voice had to give its channel away: silence it.
+        if stolen_voice is not None:
+            self.parent.midi_out.note_off(stolen_voice.note, 0, stolen_voice.channel)
+            # from now on, this voice doesn't send anything anymore
+            stolen_voice.channel = None
+            if stolen_voice.control_voice is not None:
+                self.control_engine.silence(stolen_voice.control_voice)
+    
+    
+    def midi_note_on(self, voice):
+        # time-to-first-note (only recorded if the startup is profiled)
+        profiler.mark('first note')
+        self.parent.midi_out.note_on(voice.note, self.settings.velocity, voice.channel)
     
     
-    def midi_change_y_value(self, y):
+    def midi_note_off(self, touch):
+        voice = touch.ud['voice']
+        
+        # a stolen voice has already been turned off
+        if voice.channel is None:
+            return
+        
+        self.parent.midi_out.note_off(voice.note, 0, voice.channel)
+        
+        # give the channel back to the voice allocator
+        self.parent.voice_allocator.release(touch.uid)
+    
+    
+    def midi_change_y_value(self, voice, y):
+        # a stolen voice doesn't send anything anymore
+        if voice.channel is None:
+            return
+        
         # relative y-axis-value (from 0 - 127)
         calculated_y = int(127 * ((y - self.y) / self.height))
         
         # look up what MIDI value to change with the y-axis
-        if self.parent.app.config.get('General', 'YAxis') == 'Aftertouch':
+        if self.settings.y_axis_is_aftertouch:
             # Y axis = Aftertouch
-            self.midi_set_aftertouch(calculated_y)
+            self.midi_set_aftertouch(voice.channel, calculated_y)
         else:
             # Y axis = Volume
-            self.midi_set_modulation(calculated_y)
+            self.midi_set_modulation(voice.channel, calculated_y)
     
     
-    def midi_set_aftertouch(self, y):
-        self.parent.midi_out.write_short(0xD0 + self.parent.app.config.getint('MIDI', 'Channel'), y)
+    def midi_set_aftertouch(self, channel, y):
+        self.parent.midi_out.write_short(0xD0 + channel, y)
     
     
-    def midi_set_modulation(self, y):
-        self.parent.midi_out.write_short(0xB0 + self.parent.app.config.getint('MIDI', 'Channel'), self.parent.app.config.getint('MIDI', 'CCController'), y)
+    def midi_set_modulation(self, channel, y):
+        self.parent.midi_out.write_short(0xB0 + channel, self.settings.cc_controller, y)
     
     
-    def midi_set_pitch_bend(self, ud):
-        # Now, the ud['current_position'] has to be converted to a MIDI pitch bend value and sent over MIDI
-        pixel_distance = int(ud['current_position']) - (ud['initial_key']['keyposition_relative_to_keyboard'] + (self.key_width / 2.0))
+    def midi_set_pitch_bend(self, voice):
+        # a stolen voice doesn't send anything anymore
+        if voice.channel is None:
+            return
+        
+        # Now, the voice.current_position has to be converted to a MIDI pitch bend value and sent over MIDI
         # pitch-resolution: (+/-) = 2^14 / 2 = 8192
         # pitch-range: (+/-) = 2 Oct = 24 semitones (NM G2X)
         # pitch values per semitone: 8192 / 48 = 170.6667
-        # pixel per semitone: 50
-        # pitch values per pixel: 170.6667 / 50 = 3.41333  = 8192 / (24 * 50)
-        pitch_value = int(pixel_distance * 8192.0 / (self.parent.app.config.getint('MIDI', 'PitchBendRange') * self.key_width) + 0.5) + 8192 # (center/normal = 8192)
-        
-        # if the pitch value exceeds the allowed range of 0 to 16383, hold him at the lowest / highest end.
-        if pitch_value > 16383:
-            pitch_value = 16383
-        elif pitch_value < 0:
-            pitch_value = 0
+        # the pitch table has the pitch of every pixel in these units (see tuning.PitchTable), held at 0 - 16383.
+        pitch_value = self.get_pitch_table().pitch_value(voice.current_position, voice.pitch_base)
         
-        self.parent.midi_out.write_short(0xE0 + self.parent.app.config.getint('MIDI', 'Channel'), pitch_value - int(pitch_value / 128) * 128, int(pitch_value / 128))
+        self.parent.midi_out.write_short(0xE0 + voice.channel, BEND_LSB[pitch_value], BEND_MSB[pitch_value])
@@ -0,0 +1,103 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+The geometry of the keys of a keyboard: the edges and centers of all the keys,
+computed once, and a lookup from an x position to the key under it in constant
+time - also for keys of different widths.
+All the positions are in pixels relative to the left edge of the keyboard.
+'''
+
+
+'''
+####################################
+##
+##   KeyGeometry Class
+##
+####################################
+'''
+class KeyGeometry(object):
+    '''If all the keys have the same width, the key at a position is found with a
+    division. Otherwise the keys are looked up in a grid of cells as wide as the
+    narrowest key: every cell knows the first key reaching into it, so one
+    comparison is enough to find the key at a position. Positions left of the first
+    key give the first key, positions right of the last key give the last key.
+    '''
+    
+    def __init__(self, widths):
+        if not widths or min(widths) <= 0:
+            raise ValueError('a keyboard needs keys with a width greater than 0')
+        
+        self.count = len(widths)
+        self.widths = list(widths)
+        self.lefts = []
+        self.rights = []
+        self.centers = []
+        left = 0
+        for width in widths:
+            self.lefts.append(left)
+            self.rights.append(left + width)
+            self.centers.append(left + (width / 2.0))
+            left += width
+        self.width = left
+        # the width of every key, if they are all the same (None otherwise)
+        self.key_width = widths[0] if min(widths) == max(widths) else None
+        if self.key_width:
+            # (no table needed: a division finds the key)
+            self.key_at = self.uniform_key_at
+            return
+        
+        # first_key[cell]: the key at the left edge of the cell
+        self.cell_width = min(widths)
+        self.first_key = []
+        key = 0
+        for cell in xrange(int(self.width / self.cell_width) + 1):
+            x = cell * self.cell_width
+            while key < self.count - 1 and x >= self.rights[key]:
+                key += 1
+            self.first_key.append(key)
+    
+    @classmethod
+    def uniform(cls, key_width, width):
+        # keys of the same width, as many as needed to cover the width
+        count = max(1, int(width / key_width))
+        if count * key_width < width:
+            count += 1
+        return cls([key_width] * count)
+    
+    def key_at(self, x):
+        # the number of the key at the position x
+        if 0 < x < self.width:
+            # (no key is narrower than a cell, so the next key is the only other candidate)
+            key = self.first_key[int(x / self.cell_width)]
+            if x >= self.rights[key]:
+                key += 1
+            return key
+        return 0 if x <= 0 else self.count - 1
+    
+    def uniform_key_at(self, x):
+        # key_at for keys of the same width (used as key_at of such keyboards)
+        key = int(x / self.key_width)
+        if 0 <= key < self.count:
+            return key
+        return 0 if x <= 0 else self.count - 1
@@ -0,0 +1,180 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+from kivy.graphics import Color, Rectangle, InstructionGroup
+
+from pool import Pool
+from tween import tweens
+
+
+'''
+####################################
+##
+##   KeyLight Class
+##
+####################################
+'''
+class KeyLight(object):
+    '''The illumination of one key, drawn with plain canvas instructions:
+    the "universal key" (a white image, brightness depends on the y position of
+    the finger) and the "key image" (a big blob moving up and down with the finger).
+    
+    Both images are bigger than the key. Instead of a StencilView, they are clipped
+    to the key by drawing only the visible part of the rectangle, with the matching
+    part of the texture (texture coordinates).
+    '''
+    
+    def __init__(self):
+        self.group = InstructionGroup()
+        self.universal_color = Color(1, 1, 1, 0)
+        self.universal_rectangle = Rectangle(size=(0, 0))
+        self.key_color = Color(1, 1, 1, 0)
+        self.key_rectangle = Rectangle(size=(0, 0))
+        
+        self.group.add(self.universal_color)
+        self.group.add(self.universal_rectangle)
+        self.group.add(self.key_color)
+        self.group.add(self.key_rectangle)
+        
+        # clipping rectangle (= the key) and the rectangles of the two images
+        self.clip = (0, 0, 0, 0)
+        self.universal_rect = (0, 0, 0, 0)
+        self.key_rect = (0, 0, 0, 0)
+        
+        # fade out: the alphas are multiplied by fade (1 = not fading)
+        self.fade_value = 1
+        self.universal_alpha = 0
+        self.key_alpha = 0
+        
+        # the canvas group of the KeyLightPool the light is drawn in (None while it's in the pool)
+        self.canvas = None
+    
+    def show(self, clip, universal_texture, universal_rect, universal_alpha, key_texture, key_rect, key_rgba):
+        self.clip = clip
+        self.fade_value = 1
+        
+        self.universal_rectangle.texture = universal_texture
+        self.universal_rect = universal_rect
+        self.set_universal_alpha(universal_alpha)
+        self.clip_rectangle(self.universal_rectangle, universal_texture, universal_rect)
+        
+        self.key_rectangle.texture = key_texture
+        self.key_rect = key_rect
+        self.key_color.rgba = key_rgba
+        self.key_alpha = key_rgba[3]
+        self.clip_rectangle(self.key_rectangle, key_texture, key_rect)
+    
+    def move_key_image(self, y):
+        # the key image follows the finger up and down
+        x, old_y, width, height = self.key_rect
+        self.key_rect = (x, y, width, height)
+        self.clip_rectangle(self.key_rectangle, self.key_rectangle.texture, self.key_rect)
+    
+    def set_universal_alpha(self, alpha):
+        self.universal_alpha = alpha
+        self.universal_color.a = alpha
+    
+    def get_fade(self):
+        return self.fade_value
+    
+    def set_fade(self, fade):
+        # animated by the tween engine while the light fades out
+        self.fade_value = fade
+        self.universal_color.a = self.universal_alpha * fade
+        self.key_color.a = self.key_alpha * fade
+    
+    fade = property(get_fade, set_fade)
+    
+    def clip_rectangle(self, rectangle, texture, rect):
+        # draw only the part of rect lying inside the key, with the corresponding part of the texture
+        x, y, width, height = rect
+        clip_x, clip_y, clip_width, clip_height = self.clip
+        left = max(x, clip_x)
+        right = min(x + width, clip_x + clip_width)
+        bottom = max(y, clip_y)
+        top = min(y + height, clip_y + clip_height)
+        
+        if right <= left or top <= bottom or texture is None:
+            rectangle.size = (0, 0)
+            return
+        
+        # (uvpos / uvsize respect flipped textures)
+        u, v = texture.uvpos
+        u_size, v_size = texture.uvsize
+        u0 = u + (left - x) / float(width) * u_size
+        u1 = u + (right - x) / float(width) * u_size
+        v0 = v + (bottom - y) / float(height) * v_size
+        v1 = v + (top - y) / float(height) * v_size
+        
+        rectangle.pos = (left, bottom)
+        rectangle.size = (right - left, top - bottom)
+        rectangle.tex_coords = (u0, v0, u1, v0, u1, v1, u0, v1)
+
+
+'''
+####################################
+##
+##   KeyLightPool Class
+##
+####################################
+'''
+class KeyLightPool(object):
+    '''Pre-allocated key lights. A light is taken from the pool for every key a finger
+    crosses, and given back after it has faded out - a glissando creates no widgets.
+    The fading lights are animated by the shared tween engine.
+    '''
+    
+    def __init__(self, canvas, size, fadeout_time, transition='out_expo'):
+        # all the lights are drawn in this group
+        self.canvas = InstructionGroup()
+        canvas.add(self.canvas)
+        
+        self.fadeout_time = fadeout_time
+        self.transition = transition
+        
+        self.lights = Pool(KeyLight, size)
+    
+    def acquire(self):
+        light = self.lights.acquire()
+        self.canvas.add(light.group)
+        light.canvas = self.canvas
+        return light
+    
+    def take_over(self, light):
+        # draw a light of another pool (of the keyboard this one has replaced) here
+        if light.canvas is not None:
+            light.canvas.remove(light.group)
+        self.canvas.add(light.group)
+        light.canvas = self.canvas
+    
+    def fadeout(self, light):
+        tweens.start(light, self.fadeout_time, self.transition, self.release, fade=0)
+    
+    def release(self, light):
+        # (the light may be drawn by the pool of another keyboard)
+        if light.canvas is not None:
+            light.canvas.remove(light.group)
+            light.canvas = None
+        self.lights.release(light)
@@ -0,0 +1,258 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+Touch-to-MIDI latency tracing. While it's on, the latency since the finger event
+is stamped at every stage of the way to the MIDI device:
+
+    dispatch  IcarusTouchWidget gets the touch
+    handler   the Keyboard handler starts
+    enqueue   the message is handed to the MIDI port (or to the MIDI thread)
+    write     the message has been written to the device
+
+Notes are measured from touch.time_start to their note-on, pitch bends from the
+touch.time_update of the move to the next pitch bend sent on its channel. The
+latencies are counted in histograms with fixed buckets, so tracing doesn't
+allocate anything per event. The report is printed on exit, on
+demand (kill -USR1) or with tracer.report().
+
+It's off unless `tracer` is set (see enable()): the code on the touch and MIDI
+paths only checks `latencytracer.tracer is not None`.
+'''
+
+
+import time
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Histogram
+# ---------------------------------------------------------
+# values in microseconds: exact up to 2 * SUB_BUCKETS, above that the buckets
+# double in width with every power of two (relative error < 1 / SUB_BUCKETS)
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# everything above 2^24 us (16.8 s) is counted as the maximum
+MAX_VALUE_BITS = 24
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+BUCKETS = (MAX_VALUE_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+PERCENTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Stages
+# ---------------------------------------------------------
+NOTE_DISPATCH = 0
+NOTE_HANDLER = 1
+NOTE_ENQUEUE = 2
+NOTE_WRITE = 3
+BEND_DISPATCH = 4
+BEND_HANDLER = 5
+BEND_ENQUEUE = 6
+BEND_WRITE = 7
+
+STAGE_NAMES = (
+    'note: touch dispatch', 'note: keyboard handler', 'note: MIDI enqueue', 'note: MIDI write',
+    'bend: touch dispatch', 'bend: keyboard handler', 'bend: MIDI enqueue', 'bend: MIDI write')
+
+NOTE_ON = 0x90
+PITCH_BEND = 0xE0
+
+# the messages waiting to be enqueued / written, by (status << 7 | note) for
+# note-ons and (status << 7) for pitch bends
+PENDING_SLOTS = 256 << 7
+
+
+# the LatencyTracer while tracing is on
+tracer = None
+
+
+def enable():
+    global tracer
+    if tracer is None:
+        tracer = LatencyTracer()
+    return tracer
+
+
+def disable():
+    # returns the tracer that was active (for its report)
+    global tracer
+    active, tracer = tracer, None
+    return active
+
+
+'''
+####################################
+##
+##   Histogram Class
+##
+####################################
+'''
+class Histogram(object):
+    '''Counts values (in microseconds) into fixed buckets, like an HDR histogram.
+    Recording a value only increments a counter in a preallocated list.
+    '''
+    
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+    
+    def record(self, value):
+        value = int(value)
+        if value < 0:
+            value = 0
+        elif value > MAX_VALUE:
+            value = MAX_VALUE
+        
+        if value < 2 * SUB_BUCKETS:
+            index = value
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            index = shift * SUB_BUCKETS + (value >> shift)
+        
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+    
+    def bucket_range(self, index):
+        # (lowest, highest) value counted in the bucket
+        if index < 2 * SUB_BUCKETS:
+            return index, index
+        shift = index // SUB_BUCKETS - 1
+        lowest = (index - shift * SUB_BUCKETS) << shift
+        return lowest, lowest + (1 << shift) - 1
+    
+    def percentile(self, fraction):
+        # the highest value of the bucket the percentile falls into (never more than the maximum)
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * fraction + 0.999999))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_range(index)[1], self.max)
+        return self.max
+    
+    def mean(self):
+        return self.total / float(self.count) if self.count else 0
+    
+    def reset(self):
+        self.counts[:] = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+'''
+####################################
+##
+##   LatencyTracer Class
+##
+####################################
+'''
+class LatencyTracer(object):
+    '''Collects the stage latencies of notes and pitch bends.
+    The MIDI messages are matched to the touch that caused them by their status
+    (and note): the handler registers the time of the touch event, enqueued() and
+    written() look it up for the messages passing by.
+    Each histogram is only written by one thread - the pitch bends come either from
+    the UI thread or from the control-rate engine, never from both.
+    '''
+    
+    def __init__(self):
+        self.histograms = [Histogram() for name in STAGE_NAMES]
+        
+        # time of the touch event per pending message, 0 if there is none
+        self.origins = [0.0] * PENDING_SLOTS
+        self.queued = [False] * PENDING_SLOTS
+    
+    def stamp(self, stage, origin):
+        # the latency of a stage, origin is the time of the touch event
+        self.histograms[stage].record((time.time() - origin) * 1000000.0)
+    
+    def note(self, channel, note, origin):
+        # a note-on is about to be sent for the touch that started at origin
+        slot = (NOTE_ON + channel) << 7 | note
+        self.origins[slot] = origin
+        self.queued[slot] = False
+    
+    def move(self, channel, origin):
+        # the next pitch bend on the channel answers the move at origin
+        # (a newer move replaces the older one, its bend may have been suppressed as redundant)
+        slot = (PITCH_BEND + channel) << 7
+        self.origins[slot] = origin
+        self.queued[slot] = False
+    
+    def _slot(self, status, data1, data2):
+        kind = status & 0xF0
+        if kind == PITCH_BEND:
+            return status << 7
+        if kind == NOTE_ON and data2 > 0:
+            return status << 7 | data1
+        return -1
+    
+    def enqueued(self, status, data1, data2, now):
+        slot = self._slot(status, data1, data2)
+        if slot >= 0 and self.origins[slot] and not self.queued[slot]:
+            self.queued[slot] = True
+            self.histograms[BEND_ENQUEUE if status & 0xF0 == PITCH_BEND else NOTE_ENQUEUE].record((now - self.origins[slot]) * 1000000.0)
+    
+    def written(self, status, data1, data2, now):
+        slot = self._slot(status, data1, data2)
+        if slot >= 0 and self.origins[slot]:
+            self.histograms[BEND_WRITE if status & 0xF0 == PITCH_BEND else NOTE_WRITE].record((now - self.origins[slot]) * 1000000.0)
+            self.origins[slot] = 0.0
+    
+    def enqueued_batch(self, batch):
+        # batch in the format of pygame.midi.Output.write: [[[status, data1, data2], timestamp], ...]
+        now = time.time()
+        for (status, data1, data2), timestamp in batch:
+            self.enqueued(status, data1, data2, now)
+    
+    def written_batch(self, batch):
+        now = time.time()
+        for (status, data1, data2), timestamp in batch:
+            self.written(status, data1, data2, now)
+    
+    def reset(self):
+        for histogram in self.histograms:
+            histogram.reset()
+    
+    def report(self):
+        lines = ['Touch-to-MIDI latency [ms]:',
+            '%-24s %8s %8s %8s %8s %8s %8s %8s' % ('', 'count', 'mean', 'p50', 'p90', 'p99', 'p99.9', 'max')]
+        for name, histogram in zip(STAGE_NAMES, self.histograms):
+            lines.append('%-24s %8i %8.2f %s %8.2f' % (name, histogram.count, histogram.mean() / 1000.0,
+                ' '.join('%8.2f' % (histogram.percentile(fraction) / 1000.0) for fraction in PERCENTILES),
+                histogram.max / 1000.0))
+        return '\n'.join(lines)
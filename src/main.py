@@ -23,6 +23,14 @@ along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
 
+# has to be imported first: it measures the imports and removes its command line flag before kivy sees it
+from startupprofiler import profiler
+profiler.begin('imports')
+
+import os
+import time
+import signal
+
 import pygame.midi
 
 import kivy
@@ -34,17 +42,37 @@ from kivy.config import Config
 Config.set('modules', 'keybinding', '')
 Config.set('modules', 'inspector', '')
 from kivy.base import EventLoop
-from kivy.animation import Animation
+from kivy.clock import Clock
 from kivy.properties import ObjectProperty, NumericProperty, StringProperty
 
 from kivy.uix.image import Image
 from kivy.uix.widget import Widget
 
+from appsettings import AppSettings
+from atlasloader import resolve_image
 from settingfile import SettingFile
 from settingmidi import SettingMIDI
-from keyboard import Keyboard
+from keyboard import Keyboard, KEY_MOVEMENT_THRESHOLD
+from midioutput import MidiOutput, MidiWorker, PITCH_BEND, CONTROL_CHANGE, CHANNEL_PRESSURE
+from outputpool import OutputPool
+from deviceregistry import DeviceRegistry
+from movecoalescer import MoveCoalescer
+from voiceallocator import VoiceAllocator
+from roundingengine import RoundingEngine, numpy_available
+from controlrate import ControlRateEngine
+from tuning import Tuning
+from tween import tweens
+from touchtrace import TraceWriter, TOUCH_DOWN, TOUCH_MOVE, TOUCH_UP
+from midifile import MidiFileWriter, repair_directory
+import latencytracer
+from latencytracer import NOTE_DISPATCH, BEND_DISPATCH
+from pool import Pool
+from imagecache import ImageCache, ImageCacheWorker, size_bucket
+from imageloader import load_texture
 from mysettingspanel import MySettingsPanel
 
+profiler.end()
+
 
 '''
 ####################################
@@ -67,6 +95,12 @@ CIRCLE_IMAGE_FADEOUT_TIME = 2.0
 CIRCLE_IMAGE_COLOR = (.7, .85, 1, 1)
 CIRCLE_IMAGE_COLOR_TRANSPARENT = (.7, .85, 1, 0)
 
+# Pools
+# ---------------------------------------------------------
+# 10 fingers plus the blobs still fading out
+BLOB_POOL_SIZE = 20
+CIRCLE_POOL_SIZE = 8
+
 # Keyboard Functionality
 # ---------------------------------------------------------
 BORDER_WIDTH = 145
@@ -80,17 +114,35 @@ SCALE_KEYWIDTH_FACTOR = 3
 # Background Functionality
 # ---------------------------------------------------------
 BACKGROUND_CHANGE_DURATION = 0.3
+# the background is shown in a downscaled copy matching the window size (rounded up to a multiple of BACKGROUND_BUCKET_STEP pixels)
+BACKGROUND_CACHE_DIRECTORY = 'cache/backgrounds'
+BACKGROUND_BUCKET_STEP = 128
+# the new copy is only requested once the window hasn't been resized for this long (seconds)
+BACKGROUND_RESIZE_DELAY = 0.3
+
+# Appearance Settings Panel
+# ---------------------------------------------------------
+THUMBNAIL_CACHE_DIRECTORY = 'cache/thumbnails'
+
+# Touch Traces
+# ---------------------------------------------------------
+TRACE_DIRECTORY = 'traces'
+
+# MIDI Recordings
+# ---------------------------------------------------------
+RECORDING_DIRECTORY = 'recordings'
+
+# Deferred Startup
+# ---------------------------------------------------------
+# the panels are built after the first frame, whenever nobody touches the screen (checked every DEFERRED_STARTUP_INTERVAL seconds)
+DEFERRED_STARTUP_INTERVAL = 0.5
 
 
 class Background(Image):
-    background_x_animation = Animation()
-    old_background_change_animation = Animation()
-    new_background_change_animation = Animation()
     background_is_animated = False
 
 
 class Feedback(Image):
-    feedback_animation = Animation()
     transparency = NumericProperty(None)
 
 
@@ -123,32 +175,108 @@ class IcarusTouchWidget(Widget):
     def __init__(self, **kwargs):
         super(IcarusTouchWidget, self).__init__(**kwargs) # don't know if this is necessary?
         
+        # the typed settings snapshot, shared with the keyboard (read this one in all the touch handlers, not the config!)
+        self.settings = self.app.settings
+        
+        # pre-create the images used on the touch path
+        self.blob_pool = Pool(self.create_pool_image, BLOB_POOL_SIZE)
+        self.circle_pool = Pool(self.create_pool_image, CIRCLE_POOL_SIZE)
+        
+        # the rounding on its own thread, or else on the frame clock (vectorized, if wanted - needs numpy)
+        self.control_engine = self.create_control_engine()
+        self.rounding_engine = self.create_rounding_engine()
+        
+        # the tuning of the keys: 12-tone equal temperament or a Scala scale
+        self.tuning = self.load_tuning()
+        
+        # the graphics of the touch moves once per frame (if wanted)
+        self.move_coalescer = self.create_move_coalescer()
+        
         # add background image (and add it in the BACKGROUND! --> index modification)
-        self.background = Background(source=self.app.config.get('Graphics', 'Background'))
+        profiler.begin('background')
+        # (it's invisible until the copy matching the window size is loaded, then it fades in)
+        self.background = Background(color=(1, 1, 1, 0))
+        self.background_cache = ImageCache(BACKGROUND_CACHE_DIRECTORY)
+        self.background_worker = ImageCacheWorker(self.background_cache)
         self.float_layout.add_widget(self.background, index=len(self.float_layout.children))
+        self.load_background(self.settings.background)
+        EventLoop.window.bind(on_resize=self.on_window_resize)
         
         # add feedback wall image
         self.feedback_wall = Feedback(
-            source='images/feedbackwall.png',
+            source=resolve_image('images/feedbackwall.png'),
             transparency=0)
         self.float_layout.add_widget(self.feedback_wall)
+        profiler.end()
         
         # add the keyboard itself
+        profiler.begin('keyboard')
         my_key_width = KEY_WIDTH
         self.keyboard = Keyboard(
-            source=self.app.config.get('Graphics', 'Keyboard'),
+            source=self.settings.keyboard,
             pos=(-540, 230), # 366
             size=(12*5*my_key_width, 468), # optimization for small screens (e.g. smartphones): 468 if self.get_parent_window().height > (468 + self.get_parent_window().height * 0.3) else self.get_parent_window().height * 0.7
             border_width=BORDER_WIDTH,
             key_width=my_key_width)
+        self.keyboard.settings = self.settings
+        self.keyboard.blob_pool = self.blob_pool
+        self.keyboard.rounding_engine = self.rounding_engine
+        self.keyboard.control_engine = self.control_engine
+        self.keyboard.tuning = self.tuning
+        self.keyboard.move_coalescer = self.move_coalescer
         self.add_widget(self.keyboard)
+        self.requested_keyboard = self.settings.keyboard
+        profiler.end()
         
         # initialize the midi device
+        profiler.begin('MIDI init')
         pygame.midi.init()
+        # the devices are scanned once here, then on a background thread (the settings read the same snapshot)
+        self.device_registry = DeviceRegistry(interval=self.settings.midi_device_polling)
+        self.device_registry.bind(self.on_midi_devices_changed)
+        SettingMIDI.device_registry = self.device_registry
+        # the devices used so far stay open (switching back to one of them doesn't open it again)
+        self.output_pool = OutputPool(self.device_registry, self.open_midi_output)
+        SettingMIDI.output_pool = self.output_pool
+        self.midi_device_name = None
         self.set_midi_device()
+        self.device_registry.start()
+        
+        # (the control-rate engine writes to the device, so it can't start before)
+        if self.control_engine is not None:
+            self.control_engine.start()
+        
+        # every voice gets its MIDI channel from the voice allocator
+        self.voice_allocator = VoiceAllocator(self.settings.channel, self.settings.voice_channels)
+        profiler.end()
+        
+        # all the MIDI messages of a frame are sent together at the end of the frame
+        Clock.schedule_interval(self.flush_midi, 0)
+        
+        # record the touches of the session (for replaying it, see touchtrace.py)
+        self.trace = None
+        if self.settings.record_touch_trace:
+            self.start_touch_trace()
+        
+        # record everything sent to the MIDI device into a MIDI file (see midifile.py)
+        self.recorder = None
+        if self.settings.record_midi:
+            self.start_midi_recording()
+        
+        # measure the touch-to-MIDI latency (see latencytracer.py), the report is printed on exit or with kill -USR1
+        if self.settings.latency_tracing:
+            latencytracer.enable()
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self.print_latency_report)
         
         # initialize the settings_panel (I'm doing this here, otherwise opening it in real-time takes ages...)
-        self.my_settings_panel = MySettingsPanel()
+        # (the buttons only show small thumbnails, generated once and cached on disk)
+        # With the deferred startup, the keyboard is playable first and the panels are built when nobody plays.
+        self.my_settings_panel = None
+        if self.settings.deferred_startup:
+            Clock.schedule_once(self.build_panels_when_idle, DEFERRED_STARTUP_INTERVAL)
+        else:
+            self.build_my_settings_panel()
     
     
     '''
@@ -161,8 +289,15 @@ class IcarusTouchWidget(Widget):
     def on_touch_down(self, touch):
         ud = touch.ud
         
+        if self.trace is not None:
+            self.trace.touch(TOUCH_DOWN, touch, self.keyboard.x)
+        
+        tracer = latencytracer.tracer
+        if tracer is not None:
+            tracer.stamp(NOTE_DISPATCH, touch.time_start)
+        
         # find out the touchs "function":  
-        if self.my_settings_panel.is_open == True:
+        if self.my_settings_panel is not None and self.my_settings_panel.is_open == True:
             # if the settingspanel is opened, it has total focus!
             # so if the user clicked on one of the two panels, don't dispatch the touch here but feed it to the panel
             if self.my_settings_panel.keyboard_scroll_view_box.collide_point(*touch.pos) or \
@@ -204,7 +339,7 @@ class IcarusTouchWidget(Widget):
         ud['scroll'] = True
         
         # if there was an keyboard "spring back" animation in progress, stop it.
-        self.keyboard.keyboard_x_animation.stop(self.keyboard)
+        tweens.stop(self.keyboard, 'x')
     
     
     '''
@@ -217,6 +352,13 @@ class IcarusTouchWidget(Widget):
     def on_touch_move(self, touch):
         ud = touch.ud
         
+        if self.trace is not None:
+            self.trace.touch(TOUCH_MOVE, touch, self.keyboard.x)
+        
+        tracer = latencytracer.tracer
+        if tracer is not None:
+            tracer.stamp(BEND_DISPATCH, touch.time_update)
+        
         ##########################
         # X-Axis Key width scaling
         ##########################
@@ -275,7 +417,7 @@ class IcarusTouchWidget(Widget):
         
         
         # if the touch was started on the keyboard
-        if 'initial_key' in ud or 'settingspanel' in ud:
+        if 'voice' in ud or 'settingspanel' in ud:
             return super(IcarusTouchWidget, self).on_touch_move(touch)
     
     
@@ -289,6 +431,9 @@ class IcarusTouchWidget(Widget):
     def on_touch_up(self, touch):
         ud = touch.ud
         
+        if self.trace is not None:
+            self.trace.touch(TOUCH_UP, touch, self.keyboard.x)
+        
         #@@@@@@@@@@@@@@@@
         # Scroll Touch
         #@@@@@@@@@@@@@@@@
@@ -303,13 +448,11 @@ class IcarusTouchWidget(Widget):
             win = self.get_parent_window()
             # if keyboard end is visible and the touch is released, "jump" on old place:
             if self.keyboard.x > 0:
-                self.keyboard.keyboard_x_animation = Animation(x=0, t='out_cubic', duration=KEYBOARD_ANIMATION_X_DURATION)
-                self.keyboard.keyboard_x_animation.start(self.keyboard)
+                tweens.start(self.keyboard, KEYBOARD_ANIMATION_X_DURATION, 'out_cubic', x=0)
             elif self.keyboard.x < (win.width - self.keyboard.width):
-                self.keyboard.keyboard_x_animation = Animation(x=win.width - self.keyboard.width, t='out_cubic', duration=KEYBOARD_ANIMATION_X_DURATION)
-                self.keyboard.keyboard_x_animation.start(self.keyboard)
+                tweens.start(self.keyboard, KEYBOARD_ANIMATION_X_DURATION, 'out_cubic', x=win.width - self.keyboard.width)
         
-        if 'initial_key' in ud:
+        if 'voice' in ud:
             return super(IcarusTouchWidget, self).on_touch_up(touch)
     
     
@@ -333,6 +476,8 @@ class IcarusTouchWidget(Widget):
             # lock Y-modulation to 127
             self.midi_out.write_short(0xB0, 1, 127)
         self.app.config.write()
+        # config.set() doesn't pass through on_config_change, so refresh the settings snapshot here
+        self.settings.update(self.app.config)
     
     def on_pitch_lock_button_press(self):
         # apply the visible button-state also to the application settings
@@ -341,6 +486,8 @@ class IcarusTouchWidget(Widget):
         else:
             self.app.config.set('General', 'PitchLock', 'Off')
         self.app.config.write()
+        # config.set() doesn't pass through on_config_change, so refresh the settings snapshot here
+        self.settings.update(self.app.config)
     
     def open_settings(self):
         # is called from the rightmost button (the "setup" button") --> function call binding in the .kv file
@@ -354,13 +501,18 @@ class IcarusTouchWidget(Widget):
     ##
     ####################################
     '''
+    def create_pool_image(self):
+        # an image for the blob and circle pools
+        return Image(allow_stretch=True)
+    
     def create_circle(self, touch):
-        # create the circle image
-        circle = Image(
-            source=self.app.config.get('Advanced', 'CircleImage'),
-            color=CIRCLE_IMAGE_COLOR,
-            allow_stretch=True,
-            size=(self.app.config.getint('Advanced', 'CircleSize'), self.app.config.getint('Advanced', 'CircleSize')))
+        # take a circle image from the pool and reset it (the image is only reloaded if the setting has changed)
+        circle_size = self.settings.circle_size
+        circle = self.circle_pool.acquire()
+        if circle.source != self.settings.circle_image:
+            circle.source = self.settings.circle_image
+        circle.color = CIRCLE_IMAGE_COLOR
+        circle.size = (circle_size, circle_size)
         
         # center the circle on the finger position
         circle.x = touch.x - circle.size[0] / 2
@@ -369,18 +521,14 @@ class IcarusTouchWidget(Widget):
         self.add_widget(circle)
         
         # and just right fade it out after having displayed it
-        animation = Animation(
+        tweens.start(circle, CIRCLE_IMAGE_FADEOUT_TIME, 'out_expo', self.circle_fadeout_complete,
             color=CIRCLE_IMAGE_COLOR_TRANSPARENT,
-            size=(self.app.config.getint('Advanced', 'CircleSize') * 2, self.app.config.getint('Advanced', 'CircleSize') * 2),
-            x=circle.pos[0] - (self.app.config.getint('Advanced', 'CircleSize')/2), # workaround for centering the image during resizing
-            y=circle.pos[1] - (self.app.config.getint('Advanced', 'CircleSize')/2), # workaround for centering the image during resizing
-            t='out_expo', duration=CIRCLE_IMAGE_FADEOUT_TIME)
-        
-        animation.start(circle)
-        animation.bind(on_complete=self.circle_fadeout_complete)
+            size=(circle_size * 2, circle_size * 2),
+            pos=(circle.pos[0] - (circle_size/2), circle.pos[1] - (circle_size/2))) # workaround for centering the image during resizing
     
-    def circle_fadeout_complete(self, animation, widget):
+    def circle_fadeout_complete(self, widget):
         self.remove_widget(widget)
+        self.circle_pool.release(widget)
     
     
     '''
@@ -390,36 +538,228 @@ class IcarusTouchWidget(Widget):
     ##
     ####################################
     '''
-    def set_midi_device(self):
+    def create_control_engine(self):
+        if self.settings.control_rate <= 0:
+            return None
+        return ControlRateEngine(self.settings, self.settings.control_rate, KEY_MOVEMENT_THRESHOLD)
+    
+    
+    def create_rounding_engine(self):
+        if self.control_engine is not None or self.settings.rounding_engine != 'NumPy':
+            return None
+        if not numpy_available():
+            print 'Warning: The NumPy rounding engine needs numpy, which is not installed. Using the Python one.'
+            return None
+        return RoundingEngine()
+    
+    
+    def create_move_coalescer(self):
+        if not self.settings.coalesce_touch_moves:
+            return None
+        # (timeout -1: called before the next frame is drawn)
+        return MoveCoalescer(lambda callback: Clock.schedule_once(callback, -1))
+    
+    
+    def set_move_coalescing(self):
+        # the moves still waiting are processed first
+        if self.move_coalescer is not None:
+            self.move_coalescer.flush()
+            print self.move_coalescer.report()
+        self.move_coalescer = self.keyboard.move_coalescer = self.create_move_coalescer()
+    
+    
+    def load_tuning(self):
+        # the Scala scale (and keyboard mapping) of the settings. If there is none or it can't be read, 12-tone equal temperament.
+        if self.settings.tuning:
+            try:
+                tuning = Tuning.load(self.settings.tuning, self.settings.keyboard_mapping or None)
+                print 'Tuning "%s" loaded.' % (tuning.description or self.settings.tuning)
+                return tuning
+            except (IOError, ValueError) as e:
+                print 'Warning: The tuning "%s" can\'t be loaded (%s). Using 12-tone equal temperament.' % (self.settings.tuning, e)
+        return Tuning.equal_temperament()
+    
+    
+    def set_tuning(self):
+        # (the voices already playing keep their notes)
+        self.tuning = self.keyboard.tuning = self.load_tuning()
+        self.keyboard.invalidate_pitch_table()
+    
+    
+    def on_midi_devices_changed(self, snapshot, old_snapshot):
+        # (called on the thread of the device registry: continue on the UI thread)
+        Clock.schedule_once(lambda dt: self.midi_devices_changed(snapshot, old_snapshot))
+    
+    
+    def midi_devices_changed(self, snapshot, old_snapshot):
+        added, removed = snapshot.diff(old_snapshot)
+        for name in added:
+            print 'MIDI device "%s" added.' % name
+        for name in removed:
+            print 'MIDI device "%s" removed.' % name
+        
+        # the device of the settings is back: take it instead of the default one
+        if self.settings.device in added and self.midi_device_name != self.settings.device:
+            self.set_midi_device()
+    
+    
+    def open_midi_output(self, device_id):
+        # (for the output pool)
+        if self.device_registry.snapshot.device(device_id).opened == 1:
+            print 'Error: Can''t open the MIDI device - It''s already opened!'
+        
+        port = pygame.midi.Output(device_id)
+        if self.settings.midi_thread or self.control_engine is not None:
+            # the MIDI worker thread owns the device, the UI thread only queues the messages
+            # (the control-rate engine needs it: it writes its pitch bends from its own thread)
+            port = MidiWorker(port, self.settings.midi_queue_size)
+        return port
+    
+    
+    def set_midi_device(self, reopen=False):
         # take the midi device of the settings file and try to connect to it.
         # If there isn't such a device, connect to the default one.
+        # reopen: close all the ports and open the device again (after the MIDI thread was turned on or off, or its queue size changed)
+        name = self.settings.device
+        if self.output_pool.device_id(name) is not None:
+            print 'MIDI device "%s" found. Connecting.' % name
+        else:
+            # if it was not in the list, take the default one
+            default_name = self.device_registry.snapshot.device(pygame.midi.get_default_output_id()).name
+            print 'Warning: No MIDI device named "%s" found. Choosing the system default ("%s").' % (name, default_name)
+            name = default_name
+        
+        self.midi_device_name = name
+        if not hasattr(self, 'midi_out'):
+            self.midi_out = MidiOutput(self.output_pool.acquire(name), self.settings.midi_batch_size)
+            if self.control_engine is not None:
+                self.control_engine.set_port(self.midi_out.port)
+            return
         
-        c = pygame.midi.get_count()
-        id_device_from_settings = -1
-        #print '%s midi devices found' % c
-        for i in range(c):
-            #print '%s name: %s input: %s output: %s opened: %s' % (pygame.midi.get_device_info(i))
-            if pygame.midi.get_device_info(i)[1] == self.app.config.get('MIDI', 'Device'):
-                # if the device from the settings exists in the computers list, take that!
-                id_device_from_settings = i
+        if reopen:
+            # nothing may write to the ports while they are closed
+            if self.control_engine is not None:
+                self.control_engine.set_port(None)
+            self.midi_out.silence()
+            self.output_pool.close()
+            port = self.output_pool.acquire(name)
+            if self.control_engine is not None:
+                self.control_engine.set_port(port)
+            self.midi_out.set_port(port)
+            return
         
-        #print 'Default is %s' % pygame.midi.get_device_info(pygame.midi.get_default_output_id())[1]
+        # the switch: take the port out of the pool (opened only the first time), move the control-rate
+        # engine over (it resets the channels it has bent on the old port, after that only the MidiOutput
+        # writes to it), then the MidiOutput turns the held notes off and resets its pitch bends on the old port.
+        # The MidiOutput keeps its statistics, but its cache of the values sent starts again.
+        start = time.time()
+        port = self.output_pool.acquire(name)
+        if port is self.midi_out.port:
+            return
+        if self.control_engine is not None:
+            self.control_engine.set_port(port)
+        self.midi_out.swap_port(port)
+        print 'MIDI output switched to "%s" in %i us.' % (name, (time.time() - start) * 1000000)
+    
+    
+    def start_touch_trace(self):
+        if self.trace is not None:
+            return
+        if not os.path.exists(TRACE_DIRECTORY):
+            os.makedirs(TRACE_DIRECTORY)
+        filename = os.path.join(TRACE_DIRECTORY, time.strftime('session-%Y%m%d-%H%M%S.trace'))
+        print 'Recording the touches to "%s".' % filename
         
-        if id_device_from_settings <> -1:
-            self.midi_device = id_device_from_settings
-            print 'MIDI device "%s" found. Connecting.' % pygame.midi.get_device_info(id_device_from_settings)[1]
-        else:
-            # if it was not in the list, take the default one
-            self.midi_device = pygame.midi.get_default_output_id()
-            print 'Warning: No MIDI device named "%s" found. Choosing the system default ("%s").' % (self.app.config.get('MIDI', 'Device'), pygame.midi.get_device_info(self.midi_device)[1])
+        self.trace = TraceWriter(filename, self.keyboard.key_width, self.control_engine.rate if self.control_engine is not None else 0)
+        self.set_trace(self.trace)
+    
+    
+    def stop_touch_trace(self):
+        if self.trace is None:
+            return
+        trace = self.trace
+        self.set_trace(None)
+        trace.close()
+        print 'Touch trace closed (%i records).' % trace.records
+    
+    
+    def set_trace(self, trace):
+        self.trace = trace
+        self.keyboard.trace = trace
+        if self.control_engine is not None:
+            self.control_engine.trace = trace
+    
+    
+    def start_midi_recording(self):
+        if self.recorder is not None:
+            return
+        if not os.path.exists(RECORDING_DIRECTORY):
+            os.makedirs(RECORDING_DIRECTORY)
         
-        if pygame.midi.get_device_info(self.midi_device)[4] == 1:
-            print 'Error: Can''t open the MIDI device - It''s already opened!'
-            
-        self.midi_out = pygame.midi.Output(self.midi_device)
+        # takes that weren't closed (the app crashed) are made playable first
+        for filename in repair_directory(RECORDING_DIRECTORY):
+            print 'Repaired the MIDI recording "%s".' % filename
+        
+        filename = os.path.join(RECORDING_DIRECTORY, time.strftime('take-%Y%m%d-%H%M%S.mid'))
+        print 'Recording the MIDI output to "%s".' % filename
+        self.set_recorder(MidiFileWriter(filename))
+    
+    
+    def stop_midi_recording(self):
+        if self.recorder is None:
+            return
+        recorder = self.recorder
+        self.set_recorder(None)
+        recorder.close()
+        print 'MIDI recording closed (%i events).' % recorder.events
+    
+    
+    def set_recorder(self, recorder):
+        # (the messages still queued are flushed before, they were sent before the recording started or stopped)
+        self.midi_out.flush()
+        self.recorder = recorder
+        self.midi_out.recorder = recorder
+        if self.control_engine is not None:
+            self.control_engine.recorder = recorder
+    
+    
+    def print_latency_report(self, *args):
+        # (*args: may be used as signal handler)
+        tracer = latencytracer.tracer
+        if tracer is None:
+            print 'Latency tracing is off (turn on "Trace latency" in the advanced settings).'
+        else:
+            print tracer.report()
+    
+    
+    def flush_midi(self, dt):
+        # send the MIDI messages collected during this frame
+        self.midi_out.flush()
+    
+    
+    def build_my_settings_panel(self):
+        # (only the first call builds it)
+        if self.my_settings_panel is None:
+            with profiler.phase('appearance panel'):
+                self.my_settings_panel = MySettingsPanel(thumbnail_cache=ImageCache(THUMBNAIL_CACHE_DIRECTORY))
+        return self.my_settings_panel
+    
+    
+    def build_panels_when_idle(self, dt):
+        # deferred startup: build one panel at a time, but only if no finger is on the screen
+        if EventLoop.touches:
+            Clock.schedule_once(self.build_panels_when_idle, DEFERRED_STARTUP_INTERVAL)
+        elif self.my_settings_panel is None:
+            self.build_my_settings_panel()
+            Clock.schedule_once(self.build_panels_when_idle, DEFERRED_STARTUP_INTERVAL)
+        else:
+            self.app.create_settings()
+            profiler.report()
     
     
     def open_my_settings_panel(self):
+        # (if the user is faster than the deferred startup, build it right now)
+        self.build_my_settings_panel()
         self.add_widget(self.my_settings_panel)
         
         # bind the background images to function
@@ -434,16 +774,19 @@ class IcarusTouchWidget(Widget):
     
     
     def close_my_settings_panel(self):
+        if self.my_settings_panel is None:
+            return
         self.remove_widget(self.my_settings_panel)
         self.my_settings_panel.is_open = False
     
     
     def background_image_change_request(self, dispatcher):
-        self.background_image_change(dispatcher.background_normal)
+        # (the button shows a thumbnail - take the full image)
+        self.background_image_change(dispatcher.image_filename)
     
     
     def keyboard_image_change_request(self, dispatcher):
-        self.keyboard_image_change(dispatcher.background_normal)
+        self.keyboard_image_change(dispatcher.image_filename)
     
     
     def background_image_change(self, value):
@@ -451,42 +794,82 @@ class IcarusTouchWidget(Widget):
         self.app.config.set('Graphics', 'Background', value)
         self.app.config.write()
         
+        self.load_background(value)
+    
+    
+    def on_window_resize(self, window, width, height):
+        # wait until the user has finished dragging the window border
+        Clock.unschedule(self.window_resized)
+        Clock.schedule_once(self.window_resized, BACKGROUND_RESIZE_DELAY)
+    
+    
+    def window_resized(self, dt):
+        # a bigger or smaller window needs another copy of the background
+        if size_bucket(EventLoop.window.width, EventLoop.window.height, BACKGROUND_BUCKET_STEP) != self.background_bucket:
+            self.load_background(self.requested_background)
+    
+    
+    def load_background(self, filename):
+        # the downscaled copy for the window size is created on first use (on the worker thread, it takes up to a few hundred ms)
+        self.requested_background = filename
+        self.requested_background_variant = None
+        self.background_bucket = size_bucket(EventLoop.window.width, EventLoop.window.height, BACKGROUND_BUCKET_STEP)
+        width, height = self.background_bucket
+        self.background_worker.request(filename, width, height, self.background_variant_created, stretch=True)
+    
+    
+    def background_variant_created(self, filename, width, height, variant):
+        # (called on the worker thread)
+        Clock.schedule_once(lambda dt: self.background_variant_ready(filename, (width, height), variant))
+    
+    
+    def background_variant_ready(self, filename, bucket, variant):
+        # (in the meantime, another image may have been chosen or the window may have been resized)
+        if filename != self.requested_background or bucket != self.background_bucket:
+            return
+        
+        # decode the new image on the loader thread. The old background stays until the texture is ready.
+        self.requested_background_variant = variant
+        load_texture(variant, self.background_image_loaded)
+    
+    
+    def background_image_loaded(self, filename, texture):
+        # if the user clicked on several images in a row, only show the last one
+        if filename != self.requested_background_variant or texture is None:
+            return
+        
         old_background_instance = self.background
         
         # if the last background change is still in progress, stop it and start the new one.
         if old_background_instance.background_is_animated == True:
-            old_background_instance.new_background_change_animation.stop(old_background_instance.new_background_instance)
-            old_background_instance.old_background_change_animation.stop(old_background_instance)
+            tweens.stop(old_background_instance.new_background_instance)
+            tweens.stop(old_background_instance)
             
             self.float_layout.remove_widget(old_background_instance)
             old_background_instance.new_background_instance.color = (1, 1, 1, 1)
             old_background_instance = old_background_instance.new_background_instance
         
         # create the new image instance
-        old_background_instance.new_background_instance = Background(
-            source=value,
-            color=(1, 1, 1, 0))
+        old_background_instance.new_background_instance = Background(color=(1, 1, 1, 0))
+        old_background_instance.new_background_instance.texture = texture
         # add the new instance to the root widget. BUT add it on the bottom (therefore I set the index myself)
         self.float_layout.add_widget(old_background_instance.new_background_instance, index=len(self.float_layout.children))
         
-        # keep the settings panel on the front
-        self.remove_widget(self.my_settings_panel)
-        self.add_widget(self.my_settings_panel)
+        # keep the settings panel on the front (if it's still open - the image is loaded asynchronously)
+        if self.my_settings_panel is not None and self.my_settings_panel.is_open:
+            self.remove_widget(self.my_settings_panel)
+            self.add_widget(self.my_settings_panel)
         
         # let the old image fade out while the new one fades in.
-        old_background_instance.new_background_change_animation = Animation(color=(1, 1, 1, 1), duration=BACKGROUND_CHANGE_DURATION)
-        old_background_instance.old_background_change_animation = Animation(color=(1, 1, 1, 0), duration=BACKGROUND_CHANGE_DURATION)
-        
-        old_background_instance.new_background_change_animation.start(old_background_instance.new_background_instance)
-        old_background_instance.old_background_change_animation.start(old_background_instance)
+        tweens.start(old_background_instance.new_background_instance, BACKGROUND_CHANGE_DURATION, on_complete=self.background_change_complete, color=(1, 1, 1, 1))
+        tweens.start(old_background_instance, BACKGROUND_CHANGE_DURATION, color=(1, 1, 1, 0))
         
         old_background_instance.background_is_animated = True
-        old_background_instance.new_background_change_animation.bind(on_complete=self.background_change_complete)
     
     
-    def background_change_complete(self, animation, widget):
+    def background_change_complete(self, widget):
         # first remove the old background from the widget tree
-        self.remove_widget(self.background)
+        self.float_layout.remove_widget(self.background)
         
         # then make the self.background reference refer to the new background
         self.background = widget
@@ -499,13 +882,23 @@ class IcarusTouchWidget(Widget):
         self.app.config.set('Graphics', 'Keyboard', value)
         self.app.config.write()
         
+        # decode the new image on the loader thread. The old keyboard stays playable until the texture is ready.
+        self.requested_keyboard = value
+        load_texture(value, self.keyboard_image_loaded)
+    
+    
+    def keyboard_image_loaded(self, filename, texture):
+        # if the user clicked on several images in a row, only show the last one
+        if filename != self.requested_keyboard or texture is None:
+            return
+        
         win = self.get_parent_window()
         old_keyboard_instance = self.keyboard
         
         # if the last keyboard change is stil in progress, stop it and start the new.
         if old_keyboard_instance.keyboard_is_animated == True:
-            old_keyboard_instance.new_keyboard_change_animation.stop(old_keyboard_instance.new_keyboard_instance)
-            old_keyboard_instance.old_keyboard_change_animation.stop(old_keyboard_instance)
+            tweens.stop(old_keyboard_instance.new_keyboard_instance)
+            tweens.stop(old_keyboard_instance)
             
             self.remove_widget(old_keyboard_instance)
             old_keyboard_instance.new_keyboard_instance.y = 366
@@ -513,29 +906,36 @@ class IcarusTouchWidget(Widget):
         
         # create the new image instance
         old_keyboard_instance.new_keyboard_instance = Keyboard(
-            source=value,
             pos=(old_keyboard_instance.x, win.height + BORDER_WIDTH),
             size=(self.keyboard.width, old_keyboard_instance.height),
             key_width=old_keyboard_instance.key_width,
             border_width=BORDER_WIDTH)
+        old_keyboard_instance.new_keyboard_instance.texture = texture
+        old_keyboard_instance.new_keyboard_instance.settings = self.settings
+        old_keyboard_instance.new_keyboard_instance.blob_pool = self.blob_pool
+        old_keyboard_instance.new_keyboard_instance.rounding_engine = self.rounding_engine
+        old_keyboard_instance.new_keyboard_instance.control_engine = self.control_engine
+        old_keyboard_instance.new_keyboard_instance.tuning = self.tuning
+        old_keyboard_instance.new_keyboard_instance.move_coalescer = self.move_coalescer
+        old_keyboard_instance.new_keyboard_instance.trace = self.trace
         self.add_widget(old_keyboard_instance.new_keyboard_instance)
         
-        # keep the settings panel on the front
-        self.remove_widget(self.my_settings_panel)
-        self.add_widget(self.my_settings_panel)
+        # keep the settings panel on the front (if it's still open - the image is loaded asynchronously)
+        if self.my_settings_panel is not None and self.my_settings_panel.is_open:
+            self.remove_widget(self.my_settings_panel)
+            self.add_widget(self.my_settings_panel)
         
         # let the old image fade out while the new one fades in.
-        old_keyboard_instance.new_keyboard_change_animation = Animation(y=366, t='out_back', duration=KEYBOARD_CHAGE_DURATION)
-        old_keyboard_instance.old_keyboard_change_animation = Animation(y=-(self.keyboard.height + BORDER_WIDTH), t='out_back', duration=KEYBOARD_CHAGE_DURATION)
-        
-        old_keyboard_instance.new_keyboard_change_animation.start(old_keyboard_instance.new_keyboard_instance)
-        old_keyboard_instance.old_keyboard_change_animation.start(old_keyboard_instance)
+        tweens.start(old_keyboard_instance.new_keyboard_instance, KEYBOARD_CHAGE_DURATION, 'out_back', self.keyboard_change_complete, y=366)
+        tweens.start(old_keyboard_instance, KEYBOARD_CHAGE_DURATION, 'out_back', y=-(self.keyboard.height + BORDER_WIDTH))
         
         old_keyboard_instance.keyboard_is_animated = True
-        old_keyboard_instance.new_keyboard_change_animation.bind(on_complete=self.keyboard_change_complete)
     
     
-    def keyboard_change_complete(self, animation, widget):
+    def keyboard_change_complete(self, widget):
+        # the fingers still down on the old keyboard are released on the new one
+        widget.take_over(self.keyboard)
+        
         # first remove the old keyboard from the widget tree
         self.remove_widget(self.keyboard)
         
@@ -555,6 +955,12 @@ class IcarusTouchWidget(Widget):
 class IcarusTouch(App):
     title = 'IcarusTouch'
     icon = 'icon.png'
+    app_settings = None
+    
+    
+    def load_kv(self, *args, **kwargs):
+        with profiler.phase('kv file'):
+            return super(IcarusTouch, self).load_kv(*args, **kwargs)
     
     
     def build(self):
@@ -575,10 +981,32 @@ class IcarusTouch(App):
         # in lack of a popup, print it to the console
         print 'Loading images... Please wait.'
         
+        # parse the settings once - the touch handlers only read this typed snapshot
+        self.settings = AppSettings(self.config)
+        
         # create the root widget and give it a reference of the application instance (so it can access the application settings)
-        self.icarustouchwidget = IcarusTouchWidget(app=self)
+        with profiler.phase('widget construction'):
+            self.icarustouchwidget = IcarusTouchWidget(app=self)
+        
+        # the keyboard is playable as soon as the first frame is drawn
+        Clock.schedule_once(self.startup_complete, 0)
         return self.icarustouchwidget
     
+    
+    def startup_complete(self, dt):
+        profiler.mark('first frame')
+        # (with the deferred startup, it's printed again when all the panels are built)
+        profiler.report()
+    
+    
+    def create_settings(self):
+        # kivy creates the settings when they are opened the first time. With the deferred startup, they are created
+        # before (when nobody plays) - so only create them once.
+        if self.app_settings is None:
+            with profiler.phase('settings panels'):
+                self.app_settings = super(IcarusTouch, self).create_settings()
+        return self.app_settings
+    
    
     def build_config(self, config):
         # create the various section for the .ini settings file:
@@ -598,8 +1026,11 @@ class IcarusTouch(App):
         config.setdefault('MIDI', 'Device', 'USB Uno MIDI Interface')
         config.setdefault('MIDI', 'Channel', '0')
         config.setdefault('MIDI', 'VoiceMode', 'Polyphonic')
+        config.setdefault('MIDI', 'MemberChannels', '1-15') # only active if voice mode is 'MPE'
         config.setdefault('MIDI', 'PitchbendRange', '24')
         config.setdefault('MIDI', 'Transpose', '36')
+        config.setdefault('MIDI', 'Tuning', '') # 12-tone equal temperament
+        config.setdefault('MIDI', 'KeyboardMapping', '') # only used with a tuning
         config.setdefault('MIDI', 'CCController', '1') # inactive if y-axis is 'aftertouch'
         config.setdefault('MIDI', 'Velocity', '127')
         
@@ -616,8 +1047,21 @@ class IcarusTouch(App):
         config.setdefault('Advanced', 'RoundSpeedToFinger', '0.6')
         config.setdefault('Advanced', 'RoundSpeedToKey', '0.2')
         config.setdefault('Advanced', 'MovementDecay', '0.2')
+        config.setdefault('Advanced', 'RoundingEngine', 'Python')
+        config.setdefault('Advanced', 'ControlRate', '0')
         
         config.setdefault('Advanced', 'ShowPitchLine', 'Off')
+        config.setdefault('Advanced', 'CoalesceTouchMoves', 'Off')
+        config.setdefault('Advanced', 'RecordTouchTrace', 'Off')
+        config.setdefault('Advanced', 'RecordMidi', 'Off')
+        config.setdefault('Advanced', 'LatencyTracing', 'Off')
+        
+        config.setdefault('Advanced', 'MidiBatchSize', '64')
+        config.setdefault('Advanced', 'MidiThread', 'On')
+        config.setdefault('Advanced', 'MidiQueueSize', '1024')
+        config.setdefault('Advanced', 'MidiDevicePolling', '2')
+        
+        config.setdefault('Advanced', 'DeferredStartup', 'On')
         
         
     
@@ -651,12 +1095,14 @@ class IcarusTouch(App):
             'MIDI', self.config, data='''[
                     { "type": "midi", "title": "MIDI output device", "desc": "Device to use for MIDI", "section": "MIDI", "key": "Device"},
                     { "type": "numeric", "title": "MIDI channel", "desc": "MIDI channel to send data to [0 - 15]", "section": "MIDI", "key": "Channel"},
-                    { "type": "options", "title": "* Voice mode", "desc": "Polyphony mode", "section": "MIDI", "key": "VoiceMode", "options": ["Monophonic", "Polyphonic"]},
+                    { "type": "options", "title": "Voice mode", "desc": "Polyphony mode. MPE gives every voice its own channel (for independent pitch bends)", "section": "MIDI", "key": "VoiceMode", "options": ["Monophonic", "Polyphonic", "MPE"]},
+                    { "type": "string", "title": "MPE member channels", "desc": "Channels used for the voices in MPE mode, e.g. 1-15 [0 - 15]", "section": "MIDI", "key": "MemberChannels"},
                     { "type": "numeric", "title": "Pitch bend range", "desc": "Set the pitch bend range of your synthesizer here (set it as high as possible!) [in half tones]", "section": "MIDI", "key": "PitchbendRange"},
                     { "type": "numeric", "title": "Transpose", "desc": "Transpose the keyboard [in half tones, only positive!]", "section": "MIDI", "key": "Transpose"},
+                    { "type": "file", "title": "Tuning", "desc": "Scala scale (.scl) the keys are tuned to. Empty: 12-tone equal temperament", "section": "MIDI", "key": "Tuning", "file_filter": "*.scl", "path": "tunings"},
+                    { "type": "file", "title": "Keyboard mapping", "desc": "Scala keyboard mapping (.kbm) of the tuning: the scale degree of every key and the reference pitch. Empty: middle C is the first degree, A4 is 440 Hz", "section": "MIDI", "key": "KeyboardMapping", "file_filter": "*.kbm", "path": "tunings"},
                     { "type": "numeric", "title": "CC controller", "desc": "CC controller to use for changing the volume with the y axis [1 - 127]", "section": "MIDI", "key": "CCController"},
-                    { "type": "numeric", "title": "Velocity", "desc": "Velocity of the midi notes", "section": "MIDI", "key": "Velocity"},
-                { "type": "title", "title": "(Settings marked with a * are not yet implemented)" }
+                    { "type": "numeric", "title": "Velocity", "desc": "Velocity of the midi notes", "section": "MIDI", "key": "Velocity"}
             ]''')
         
         #section "Advanced"
@@ -673,8 +1119,21 @@ class IcarusTouch(App):
                     { "type": "numeric", "title": "Round speed to finger position", "desc": "How fast the tone snaps to the finger if moved", "section": "Advanced", "key": "RoundSpeedToFinger"},
                     { "type": "numeric", "title": "Round speed to key", "desc": "How fast the tone snaps to the middle of the key if movement has stopped", "section": "Advanced", "key": "RoundSpeedToKey"},
                     { "type": "numeric", "title": "Movement decay time", "desc": "How long you have to wait after finger movement to have the tone snapped to the key", "section": "Advanced", "key": "MovementDecay"},
+                    { "type": "numeric", "title": "Control rate", "desc": "Rounding ticks per second, on an own thread independent of the frame rate [50 - 2000]. The round speeds are given per rounding scheduler interval. 0 (default) rounds with the frame rate. If it's on, the rounding engine setting isn't used. Turning it on or off takes effect on the next start", "section": "Advanced", "key": "ControlRate"},
+                    { "type": "options", "title": "Rounding engine", "desc": "NumPy computes the rounding for all the voices at once (needs numpy, only with control rate 0). Takes effect on the next start", "section": "Advanced", "key": "RoundingEngine", "options": ["Python", "NumPy"]},
+                    { "type": "bool", "title": "Coalesce touch moves", "desc": "Move the blobs and key lights only once per frame, with the newest position of the finger (the pitch still follows every move). For touch screens sending more moves than frames", "section": "Advanced", "key": "CoalesceTouchMoves", "values": ["Off", "On"]},
+                { "type": "title", "title": "Advanced MIDI settings" },
+                    { "type": "numeric", "title": "MIDI batch size", "desc": "Maximum number of MIDI messages sent to the device with one call [1 - 1024]", "section": "Advanced", "key": "MidiBatchSize"},
+                    { "type": "bool", "title": "MIDI output thread", "desc": "Write to the MIDI device on a separate thread (always on with a control rate)", "section": "Advanced", "key": "MidiThread", "values": ["Off", "On"]},
+                    { "type": "numeric", "title": "MIDI queue size", "desc": "Messages the MIDI output thread queues before it starts to coalesce pitch bend, CC and aftertouch", "section": "Advanced", "key": "MidiQueueSize"},
+                    { "type": "numeric", "title": "MIDI device polling", "desc": "Seconds between two scans of the MIDI devices, in the background (0: never)", "section": "Advanced", "key": "MidiDevicePolling"},
+                { "type": "title", "title": "Advanced startup settings" },
+                    { "type": "bool", "title": "Deferred startup", "desc": "Make the keyboard playable first and build the appearance and settings panels afterwards (when nobody is playing). Takes effect on the next start", "section": "Advanced", "key": "DeferredStartup", "values": ["Off", "On"]},
                 { "type": "title", "title": "Debug section" },
-                    { "type": "bool", "title": "Show pitch line", "desc": "Show a line that indicates the pitch sent to the MIDI device", "section": "Advanced", "key": "ShowPitchLine", "values": ["Off", "On"]}
+                    { "type": "bool", "title": "Show pitch line", "desc": "Show a line that indicates the pitch sent to the MIDI device", "section": "Advanced", "key": "ShowPitchLine", "values": ["Off", "On"]},
+                    { "type": "bool", "title": "Record touch trace", "desc": "Record all the touches into a file in the folder 'traces' (for replaying the session with benchmarks/replay_trace.py)", "section": "Advanced", "key": "RecordTouchTrace", "values": ["Off", "On"]},
+                    { "type": "bool", "title": "Record MIDI", "desc": "Record everything sent to the MIDI device into a MIDI file in the folder 'recordings'", "section": "Advanced", "key": "RecordMidi", "values": ["Off", "On"]},
+                    { "type": "bool", "title": "Trace latency", "desc": "Measure the latency from the touch to the MIDI device, the percentiles are printed to the console on exit (or with kill -USR1)", "section": "Advanced", "key": "LatencyTracing", "values": ["Off", "On"]}
             ]''')
     
     
@@ -682,6 +1141,9 @@ class IcarusTouch(App):
         # here comes all the value-checking stuff after a new value has been set.
         token = (section, key)
         
+        # first of all, rebuild the settings snapshot (apart from the two toggle buttons, this is the only place where the settings are parsed again)
+        self.settings.update(config)
+        
         if token == ('General', 'YAxis'):
             # set the buttons to sync up with the settings
             self.icarustouchwidget.y_axis_volume_button.state = 'normal' if value == 'Aftertouch' else 'down'
@@ -709,13 +1171,13 @@ class IcarusTouch(App):
         elif token == ('MIDI', 'Channel'):
             # TODO: setting the value to 0 here causes an error?!
             # config.set('MIDI', 'Channel', boundary(value, 0, 15)
-            pass
-        elif token == ('MIDI', 'VoiceMode'):
-            pass
-        elif token == ('MIDI', 'PitchbendRange'):
-            pass
-        elif token == ('MIDI', 'Transpose'):
-            pass
+            self.icarustouchwidget.voice_allocator.configure(self.settings.channel, self.settings.voice_channels)
+        elif token in (('MIDI', 'VoiceMode'), ('MIDI', 'MemberChannels')):
+            self.icarustouchwidget.voice_allocator.configure(self.settings.channel, self.settings.voice_channels)
+        elif token in (('MIDI', 'PitchbendRange'), ('MIDI', 'Transpose')):
+            self.icarustouchwidget.keyboard.invalidate_pitch_table()
+        elif token in (('MIDI', 'Tuning'), ('MIDI', 'KeyboardMapping')):
+            self.icarustouchwidget.set_tuning()
         elif token == ('MIDI', 'CCController'): # inactive if y-axis is 'aftertouch'
             pass
         elif token == ('MIDI', 'Velocity'):
@@ -742,8 +1204,90 @@ class IcarusTouch(App):
             pass
         elif token == ('Advanced', 'MovementDecay'):
             pass
+        elif token == ('Advanced', 'RoundingEngine'): # only read at startup
+            pass
+        elif token == ('Advanced', 'ControlRate'):
+            # (turning it on or off only at startup)
+            if self.icarustouchwidget.control_engine is not None and self.settings.control_rate > 0:
+                self.icarustouchwidget.control_engine.rate = self.settings.control_rate
         elif token == ('Advanced', 'ShowPitchLine'):
             pass
+        elif token == ('Advanced', 'CoalesceTouchMoves'):
+            self.icarustouchwidget.set_move_coalescing()
+        elif token == ('Advanced', 'RecordTouchTrace'):
+            if self.settings.record_touch_trace:
+                self.icarustouchwidget.start_touch_trace()
+            else:
+                self.icarustouchwidget.stop_touch_trace()
+        elif token == ('Advanced', 'RecordMidi'):
+            if self.settings.record_midi:
+                self.icarustouchwidget.start_midi_recording()
+            else:
+                self.icarustouchwidget.stop_midi_recording()
+        elif token == ('Advanced', 'LatencyTracing'):
+            if self.settings.latency_tracing:
+                latencytracer.enable()
+            else:
+                self.icarustouchwidget.print_latency_report()
+                latencytracer.disable()
+        elif token == ('Advanced', 'MidiBatchSize'):
+            self.icarustouchwidget.midi_out.batch_size = self.settings.midi_batch_size
+        elif token == ('Advanced', 'MidiThread'):
+            # reconnect, with or without the worker thread
+            self.icarustouchwidget.set_midi_device(reopen=True)
+        elif token == ('Advanced', 'MidiQueueSize'):
+            # (the rings of the worker thread have a fixed size: reconnect with new ones)
+            if isinstance(self.icarustouchwidget.midi_out.port, MidiWorker):
+                self.icarustouchwidget.set_midi_device(reopen=True)
+        elif token == ('Advanced', 'MidiDevicePolling'):
+            self.icarustouchwidget.device_registry.set_interval(self.settings.midi_device_polling)
+        elif token == ('Advanced', 'DeferredStartup'): # only read at startup
+            pass
+    
+    def on_stop(self):
+        # print the MIDI statistics to the console
+        midi_out = self.icarustouchwidget.midi_out
+        midi_out.flush()
+        print 'MIDI: %i messages sent in %i writes, %i redundant messages suppressed (pitch bend: %i, CC: %i, aftertouch: %i).' % (
+            midi_out.messages_sent, midi_out.port_writes, midi_out.suppressed_count(),
+            midi_out.suppressed[PITCH_BEND], midi_out.suppressed[CONTROL_CHANGE], midi_out.suppressed[CHANNEL_PRESSURE])
+        if isinstance(midi_out.port, MidiWorker):
+            print 'MIDI thread: queue depth %i, high-water mark %i, %i controller messages coalesced.' % (
+                midi_out.port.depth(), midi_out.port.high_water_mark, midi_out.port.coalesced)
+        
+        if self.icarustouchwidget.move_coalescer is not None:
+            print self.icarustouchwidget.move_coalescer.report()
+        
+        # print the pool statistics
+        print self.icarustouchwidget.blob_pool.report('Blob')
+        print self.icarustouchwidget.circle_pool.report('Circle')
+        print self.icarustouchwidget.keyboard.key_lights.lights.report('Key light')
+        print tweens.report()
+        
+        self.icarustouchwidget.background_worker.close()
+        
+        # stop the control-rate engine first (it writes to the trace and to the device)
+        control_engine = self.icarustouchwidget.control_engine
+        if control_engine is not None:
+            control_engine.close()
+            # (the channels it has bent go back to the center)
+            control_engine.set_port(None)
+            print 'Control rate: %i ticks at %i Hz (%i late), %i pitch bends sent.' % (
+                control_engine.ticks, control_engine.rate, control_engine.late_ticks, control_engine.messages_sent)
+        
+        self.icarustouchwidget.stop_touch_trace()
+        
+        # (the recording gets a note-off for every note still held)
+        self.icarustouchwidget.stop_midi_recording()
+        
+        # release the devices (a note-off is sent for every note still held)
+        midi_out.silence()
+        print self.icarustouchwidget.output_pool.report()
+        self.icarustouchwidget.output_pool.close()
+        self.icarustouchwidget.device_registry.close()
+        
+        if latencytracer.tracer is not None:
+            print latencytracer.tracer.report()
     
     def print_widget_tree(self):
         # not used but pretty useful function for illustrating the widget tree
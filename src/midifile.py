@@ -0,0 +1,359 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+Standard MIDI File recorder: writes everything that is sent to the MIDI device into
+a .mid file (format 0, one track), while playing.
+
+The events are streamed to the disk in chunks, so the memory used doesn't grow with
+the length of the take - an hour of continuous pitch bends is millions of events.
+The length of the track is only known at the end, it's patched in on close. If the
+application dies while recording, :func:`repair` makes a valid file of what has
+been written.
+
+One tick is one millisecond (the tempo is set to 60 bpm with 1000 ticks per quarter
+note), so the delta times are simply the elapsed milliseconds.
+'''
+
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# File Format
+# ---------------------------------------------------------
+HEADER_CHUNK = struct.Struct('>4sIHHH')
+TRACK_HEADER = struct.Struct('>4sI')
+# offset of the track length in the file (right after 'MTrk')
+TRACK_LENGTH_OFFSET = HEADER_CHUNK.size + 4
+TRACK_DATA_OFFSET = HEADER_CHUNK.size + TRACK_HEADER.size
+
+TICKS_PER_QUARTER = 1000
+# microseconds per quarter note (60 bpm: 1 tick = 1 ms)
+TEMPO = 1000000
+TICKS_PER_SECOND = TICKS_PER_QUARTER * 1000000.0 / TEMPO
+
+END_OF_TRACK = '\x00\xff\x2f\x00'
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+
+# number of data bytes per message type (status >> 4)
+DATA_BYTES = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+# Writer
+# ---------------------------------------------------------
+# the events are written to the disk when the buffer reaches this size...
+CHUNK_SIZE = 64 * 1024
+# ...or at the latest after this time [s] (that's what is lost at most if the app crashes)
+FLUSH_INTERVAL = 2.0
+
+
+def write_variable_length(buffer, value):
+    # append a variable-length quantity: 7 bits per byte, most significant first,
+    # the high bit is set on all but the last byte
+    if value < 0x80:
+        buffer.append(value)
+        return
+    
+    stack = [value & 0x7F]
+    value >>= 7
+    while value:
+        stack.append((value & 0x7F) | 0x80)
+        value >>= 7
+    stack.reverse()
+    buffer.extend(stack)
+
+
+def read_variable_length(data, offset, end):
+    # returns (value, offset after it); raises IndexError if it's cut off
+    value = 0
+    while True:
+        if offset >= end:
+            raise IndexError(offset)
+        byte = ord(data[offset])
+        offset += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, offset
+
+
+'''
+####################################
+##
+##   MidiFileWriter Class
+##
+####################################
+'''
+class MidiFileWriter(object):
+    '''Streams channel messages into a Standard MIDI File.
+    It offers write_short / note_on / note_off like pygame.midi.Output, so it can be
+    used as a tee next to the device (see MidiOutput.recorder). The delta times come
+    from a clock that never runs backwards, even if the system time is adjusted.
+    Running status is used, a pitch bend takes 3-4 bytes in the file.
+    Messages may come from several threads (the control-rate engine), the buffer is
+    protected by a lock.
+    '''
+    
+    def __init__(self, filename, chunk_size=CHUNK_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        
+        self.file = open(filename, 'wb')
+        # format 0, one track; the track length stays 0 until close()
+        self.file.write(HEADER_CHUNK.pack('MThd', 6, 0, 1, TICKS_PER_QUARTER))
+        self.file.write(TRACK_HEADER.pack('MTrk', 0))
+        
+        self.buffer = bytearray()
+        # tempo meta event at tick 0
+        self.buffer.extend('\x00\xff\x51\x03' + struct.pack('>I', TEMPO)[1:])
+        self.track_length = 0
+        
+        # clock: the elapsed time only ever grows
+        self.last_time = time.time()
+        self.last_flush = self.last_time
+        self.elapsed = 0.0
+        self.last_tick = 0
+        
+        self.running_status = None
+        # notes that are sounding, they get a note-off when the file is closed
+        self.held_notes = set()
+        
+        # statistics
+        self.events = 0
+    
+    def write_short(self, status, data1=0, data2=0):
+        with self.lock:
+            if self.file is None:
+                return
+            now = time.time()
+            if now > self.last_time:
+                self.elapsed += now - self.last_time
+            self.last_time = now
+            
+            self._append(status, data1, data2)
+            
+            if len(self.buffer) >= self.chunk_size or now - self.last_flush >= self.flush_interval:
+                self._write_buffer()
+                self.last_flush = now
+    
+    def note_on(self, note, velocity, channel=0):
+        self.write_short(NOTE_ON + channel, note, velocity)
+    
+    def note_off(self, note, velocity=0, channel=0):
+        self.write_short(NOTE_OFF + channel, note, velocity)
+    
+    def _append(self, status, data1, data2):
+        # (call with the lock held)
+        buffer = self.buffer
+        tick = int(self.elapsed * TICKS_PER_SECOND)
+        write_variable_length(buffer, tick - self.last_tick)
+        self.last_tick = tick
+        
+        if status != self.running_status:
+            buffer.append(status)
+            self.running_status = status
+        buffer.append(data1 & 0x7F)
+        if DATA_BYTES[status >> 4] == 2:
+            buffer.append(data2 & 0x7F)
+        self.events += 1
+        
+        kind = status & 0xF0
+        if kind == NOTE_ON and data2 > 0:
+            self.held_notes.add((status & 0x0F, data1))
+        elif kind == NOTE_ON or kind == NOTE_OFF:
+            self.held_notes.discard((status & 0x0F, data1))
+    
+    def _write_buffer(self):
+        # (call with the lock held)
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.file.flush()
+            self.track_length += len(self.buffer)
+            del self.buffer[:]
+    
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            
+            # don't leave any notes hanging, then end the track
+            for channel, note in sorted(self.held_notes):
+                self._append(NOTE_OFF + channel, note, 0)
+            self.held_notes.clear()
+            self.buffer.extend(END_OF_TRACK)
+            self._write_buffer()
+            
+            self.file.seek(TRACK_LENGTH_OFFSET)
+            self.file.write(struct.pack('>I', self.track_length))
+            self.file.close()
+            self.file = None
+
+
+'''
+####################################
+##
+##   Reading and Repairing
+##
+####################################
+'''
+
+def parse_track(data, offset, end):
+    '''Yields (offset, tick, status, data1, data2) for every event of the track data
+    data[offset:end], with the offset right after the event and absolute ticks (for meta
+    events, status is None and data1 is the meta type). Stops at the end of the track or
+    before an event that is cut off.
+    '''
+    tick = 0
+    running_status = None
+    while offset < end:
+        try:
+            delta, offset = read_variable_length(data, offset, end)
+            byte = ord(data[offset])
+            if byte == 0xFF:
+                meta_type = ord(data[offset + 1])
+                length, offset = read_variable_length(data, offset + 2, end)
+                offset += length
+                if offset > end:
+                    return
+                tick += delta
+                yield offset, tick, None, meta_type, 0
+                if meta_type == 0x2F:
+                    return
+                continue
+            if byte & 0x80:
+                running_status = byte
+                offset += 1
+            if running_status is None or running_status >> 4 not in DATA_BYTES:
+                # not something this recorder writes (sysex), stop here
+                return
+            data1 = ord(data[offset])
+            data2 = 0
+            offset += 1
+            if DATA_BYTES[running_status >> 4] == 2:
+                data2 = ord(data[offset])
+                offset += 1
+            if offset > end:
+                return
+        except IndexError:
+            return
+        tick += delta
+        yield offset, tick, running_status, data1, data2
+
+
+def read_events(filename):
+    '''Yields (seconds, status, data1, data2) for every channel message of a file
+    written by MidiFileWriter.
+    '''
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, length = TRACK_HEADER.unpack_from(data, HEADER_CHUNK.size)
+            end = min(TRACK_DATA_OFFSET + length, len(data))
+            for offset, tick, status, data1, data2 in parse_track(data, TRACK_DATA_OFFSET, end):
+                if status is not None:
+                    yield tick / TICKS_PER_SECOND, status, data1, data2
+        finally:
+            data.close()
+
+
+def repair(filename):
+    '''Makes a valid MIDI file of a recording that wasn't closed (the application
+    crashed): the incomplete event at the end is cut off, note-offs for the notes
+    still held and the end of track are appended and the track length is patched.
+    Returns True if the file had to be repaired.
+    '''
+    with open(filename, 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size < TRACK_DATA_OFFSET:
+            raise ValueError('%s is not a MIDI recording' % filename)
+        
+        f.seek(0)
+        magic, header_length, file_format, tracks, division = HEADER_CHUNK.unpack(f.read(HEADER_CHUNK.size))
+        track_magic, length = TRACK_HEADER.unpack(f.read(TRACK_HEADER.size))
+        if magic != 'MThd' or track_magic != 'MTrk':
+            raise ValueError('%s is not a MIDI recording' % filename)
+        if TRACK_DATA_OFFSET + length == size and length > 0:
+            # closed properly
+            return False
+        
+        # find the end of the last complete event and the notes still held
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        held_notes = set()
+        valid_end = TRACK_DATA_OFFSET
+        try:
+            for offset, tick, status, data1, data2 in parse_track(data, TRACK_DATA_OFFSET, size):
+                if status is None and data1 == 0x2F:
+                    break
+                valid_end = offset
+                if status is not None:
+                    kind = status & 0xF0
+                    if kind == NOTE_ON and data2 > 0:
+                        held_notes.add((status & 0x0F, data1))
+                    elif kind == NOTE_ON or kind == NOTE_OFF:
+                        held_notes.discard((status & 0x0F, data1))
+        finally:
+            data.close()
+        
+        # cut off the rest, then append the note-offs and the end of track (with a delta time of 0)
+        f.seek(valid_end)
+        f.truncate()
+        tail = bytearray()
+        for channel, note in sorted(held_notes):
+            tail.append(0)
+            tail.extend((NOTE_OFF + channel, note, 0))
+        tail.extend(END_OF_TRACK)
+        f.write(tail)
+        
+        f.seek(TRACK_LENGTH_OFFSET)
+        f.write(struct.pack('>I', valid_end - TRACK_DATA_OFFSET + len(tail)))
+    return True
+
+
+def repair_directory(directory):
+    # repair all the recordings in a directory that weren't closed, returns their names
+    repaired = []
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.mid'):
+                filename = os.path.join(directory, name)
+                try:
+                    if repair(filename):
+                        repaired.append(filename)
+                except (ValueError, struct.error):
+                    print 'Warning: Can\'t repair "%s", it\'s not a MIDI recording.' % filename
+    return repaired
@@ -0,0 +1,463 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import time
+import threading
+from collections import deque
+
+import latencytracer
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Batching
+# ---------------------------------------------------------
+# PortMidi refuses to write more than 1024 events with one call
+MAX_BATCH_SIZE = 1024
+DEFAULT_BATCH_SIZE = 64
+
+# Redundant message suppression
+# ---------------------------------------------------------
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+PITCH_BEND = 0xE0
+PITCH_BEND_CENTER = 8192
+CONTROL_CHANGE = 0xB0
+CHANNEL_PRESSURE = 0xD0
+# controllers 120 - 127 are channel mode messages (all notes off etc.), they must always pass
+FIRST_CHANNEL_MODE_CONTROLLER = 120
+
+# Output thread
+# ---------------------------------------------------------
+DEFAULT_QUEUE_SIZE = 1024
+# the worker wakes up by itself at least this often (in seconds)
+WORKER_IDLE_TIMEOUT = 0.05
+
+
+'''
+####################################
+##
+##   MidiOutput Class
+##
+####################################
+'''
+class MidiOutput(object):
+    '''Buffered front-end of a pygame.midi.Output.
+    All the messages of one frame (or one rounding tick) are collected and written
+    to the port with one single Output.write() call in :meth:`flush`, instead of one
+    write_short() call per message. The messages keep their order. Note-on messages
+    are flushed right away (together with everything queued before them), so a key
+    press is never delayed by the batching.
+    Pitch bend, CC and channel pressure messages that repeat the last value sent on
+    the same channel (and controller) are dropped, they don't change anything on the
+    synthesizer but cost bandwidth - a DIN interface only transmits ~1000 messages/s.
+    It offers the same note_on / note_off / write_short methods as pygame.midi.Output.
+    While a recorder (a MidiFileWriter) is set, every message sent is written into it too.
+    swap_port() moves the output to another device: the notes still held are turned
+    off and the pitch bends reset on the old one first.
+    '''
+    
+    def __init__(self, port, batch_size=DEFAULT_BATCH_SIZE):
+        self.port = port
+        self.batch_size = batch_size
+        self.buffer = []
+        
+        # last value sent per channel (and controller) of the continuous streams
+        self.last_sent = {}
+        
+        # (channel, note) of the notes sounding on the port
+        self.held_notes = set()
+        
+        # MidiFileWriter recording the performance (or None)
+        self.recorder = None
+        
+        # statistics
+        self.messages_sent = 0
+        self.port_writes = 0
+        self.suppressed = {PITCH_BEND: 0, CONTROL_CHANGE: 0, CHANNEL_PRESSURE: 0}
+    
+    def _get_batch_size(self):
+        return self._batch_size
+    
+    def _set_batch_size(self, value):
+        self._batch_size = max(1, min(int(value), MAX_BATCH_SIZE))
+    
+    batch_size = property(_get_batch_size, _set_batch_size)
+    
+    def write_short(self, status, data1=0, data2=0):
+        # drop the message if it wouldn't change the value on the synthesizer
+        kind = status & 0xF0
+        if kind in self.suppressed:
+            if kind == PITCH_BEND:
+                key = status
+                value = data1 | (data2 << 7)
+            elif kind == CHANNEL_PRESSURE:
+                key = status
+                value = data1
+            elif data1 < FIRST_CHANNEL_MODE_CONTROLLER:
+                key = (status << 8) | data1
+                value = data2
+            else:
+                key = None
+            
+            if key is not None:
+                if self.last_sent.get(key) == value:
+                    self.suppressed[kind] += 1
+                    return
+                self.last_sent[key] = value
+        
+        # queue the message (timestamp 0 = "now", PortMidi ignores it if the output latency is 0)
+        self.buffer.append([[status, data1, data2], 0])
+        if self.recorder is not None:
+            self.recorder.write_short(status, data1, data2)
+        
+        # if the buffer is full, don't wait for the end of the frame
+        if len(self.buffer) >= self._batch_size:
+            self.flush()
+    
+    def note_on(self, note, velocity, channel=0):
+        self.write_short(0x90 + channel, note, velocity)
+        if velocity > 0:
+            self.held_notes.add((channel, note))
+        else:
+            self.held_notes.discard((channel, note))
+        
+        # flush-now path: a note has to sound immediately
+        self.flush()
+    
+    def note_off(self, note, velocity=0, channel=0):
+        self.write_short(0x80 + channel, note, velocity)
+        self.held_notes.discard((channel, note))
+    
+    def flush(self, *args):
+        # write all the queued messages with one call (*args: may be used as Clock callback)
+        buffer = self.buffer
+        if not buffer:
+            return
+        self.buffer = []
+        
+        # latency tracing (a MidiWorker stamps the messages itself)
+        tracer = latencytracer.tracer
+        if tracer is not None and isinstance(self.port, MidiWorker):
+            tracer = None
+        if tracer is not None:
+            tracer.enqueued_batch(buffer)
+        
+        self.port.write(buffer)
+        if tracer is not None:
+            tracer.written_batch(buffer)
+        self.port_writes += 1
+        self.messages_sent += len(buffer)
+    
+    def reset(self):
+        # forget the values sent so far (the next message of every stream will pass)
+        self.last_sent.clear()
+    
+    def set_port(self, port):
+        # deliver what's pending to the old device, then send everything to the new one.
+        # the new device doesn't know any of our values yet, so reset the cache.
+        self.flush()
+        self.port = port
+        self.reset()
+    
+    def silence(self):
+        # turn off the notes still held and put the bent channels back to the center (sent right away)
+        for channel, note in sorted(self.held_notes):
+            self.write_short(NOTE_OFF + channel, note, 0)
+        self.held_notes.clear()
+        for key, value in sorted(self.last_sent.items()):
+            if (key & 0xFFF0) == PITCH_BEND and value != PITCH_BEND_CENTER:
+                self.write_short(key, PITCH_BEND_CENTER & 0x7F, PITCH_BEND_CENTER >> 7)
+        self.flush()
+    
+    def swap_port(self, port):
+        # move to another device: nothing keeps sounding on the old one, the new one gets everything after
+        # (the notes of the voices still playing don't sound on the new one - their note-offs are harmless)
+        self.silence()
+        self.set_port(port)
+    
+    def suppressed_count(self):
+        return sum(self.suppressed.values())
+    
+    def close(self):
+        # send what is left and release the port
+        self.flush()
+        self.port.close()
+
+
+
+'''
+####################################
+##
+##   MidiRing Class
+##
+####################################
+'''
+class MidiRing(object):
+    '''The queue of one producer thread of a MidiWorker: a ring of (timestamp, status,
+    data1, data2) records with one writer (the producer) and one reader (the worker).
+    Only the producer moves tail and only the worker moves head, so as long as there
+    is space in the ring, neither of them needs a lock (in CPython, reading and
+    assigning an attribute is atomic).
+    
+    When the ring is full, the records go to the overflow list instead (holding the
+    lock, the worker takes the list once it has emptied the ring). In there, continuous
+    controllers (pitch bend, CC, aftertouch) are coalesced: the newest value replaces the
+    one still waiting, at its place and with its timestamp (so it's still written before
+    what the other producer sent after it). Note messages are never dropped: they are
+    the only messages that take a ring over its size, and they come at the pace of the
+    fingers, not of the rounding.
+    '''
+    
+    def __init__(self, size):
+        self.slots = [None] * size
+        self.size = size
+        self.head = 0       # next record to write (moved by the worker)
+        self.tail = 0       # next free slot (moved by the producer)
+        
+        # records that didn't fit into the ring, and the controllers among them that may still be replaced
+        # ((status, controller) -> index into overflow, only the ones after the last note)
+        self.overflow = []
+        self.coalescable = {}
+        self.lock = threading.Lock()
+        
+        # the overflow taken by the worker, written before everything in the ring (only touched by the worker)
+        self.spilled = deque()
+        
+        # statistics
+        self.high_water_mark = 0
+        self.coalesced = 0
+    
+    def push(self, record):
+        # (producer thread only)
+        tail = self.tail
+        if not self.overflow and tail - self.head < self.size:
+            self.slots[tail % self.size] = record
+            self.tail = tail + 1
+            
+            if tail + 1 - self.head > self.high_water_mark:
+                self.high_water_mark = tail + 1 - self.head
+            return
+        
+        with self.lock:
+            overflow = self.overflow
+            # (the worker may have taken the overflow in the meantime)
+            if not overflow and tail - self.head < self.size:
+                self.slots[tail % self.size] = record
+                self.tail = tail + 1
+                return
+            
+            status = record[1]
+            kind = status & 0xF0
+            if kind == PITCH_BEND or kind == CHANNEL_PRESSURE or (kind == CONTROL_CHANGE and record[2] < FIRST_CHANNEL_MODE_CONTROLLER):
+                key = (status, record[2]) if kind == CONTROL_CHANGE else status
+                index = self.coalescable.get(key)
+                if index is not None:
+                    overflow[index] = (overflow[index][0],) + record[1:]
+                    self.coalesced += 1
+                    return
+                self.coalescable[key] = len(overflow)
+            else:
+                # the controllers sent before this message must be written before it: they can't be replaced anymore
+                self.coalescable.clear()
+            overflow.append(record)
+            
+            if self.size + len(overflow) > self.high_water_mark:
+                self.high_water_mark = self.size + len(overflow)
+    
+    def peek(self):
+        # the next record to write, or None (worker thread only)
+        if self.spilled:
+            return self.spilled[0]
+        if self.head != self.tail:
+            return self.slots[self.head % self.size]
+        if self.overflow:
+            # the ring is empty: now the overflow is next
+            with self.lock:
+                self.spilled.extend(self.overflow)
+                self.overflow = []
+                self.coalescable.clear()
+            return self.spilled[0]
+        return None
+    
+    def pop(self):
+        # remove the record returned by peek() (worker thread only)
+        if self.spilled:
+            return self.spilled.popleft()
+        index = self.head % self.size
+        record = self.slots[index]
+        self.slots[index] = None
+        self.head += 1
+        return record
+    
+    def depth(self):
+        return self.tail - self.head + len(self.overflow) + len(self.spilled)
+
+
+'''
+####################################
+##
+##   MidiWorker Class
+##
+####################################
+'''
+class MidiWorker(object):
+    '''Owns the pygame.midi.Output and writes to it on its own thread, so a slow
+    driver call never blocks the UI thread (and a stalled UI thread never blocks MIDI).
+    
+    It has the write() / write_short() / close() interface of pygame.midi.Output, so it
+    can be given to a MidiOutput as its port. There are two producers: the UI thread
+    (MidiOutput.flush) and the control-rate thread (the pitch bends of a ControlRateEngine).
+    Every producer thread gets a MidiRing of its own (of queue_size records), so they
+    never wait for each other or for the worker. The worker is the only consumer: it
+    merges the rings by timestamp and writes the messages in order, in batches.
+    
+    If a ring is full, continuous controllers (pitch bend, CC, aftertouch) are
+    coalesced: only the newest value per channel and controller is kept. Note messages
+    are never dropped. On close, a note-off is sent for every note still held.
+    '''
+    
+    def __init__(self, port, queue_size=DEFAULT_QUEUE_SIZE):
+        self.port = port
+        self.queue_size = queue_size
+        
+        # one ring per producer thread. The tuple is replaced (holding the lock) when a thread writes for the first time.
+        self.rings = ()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        
+        # notes that are still sounding (only touched by the worker thread)
+        self.held_notes = set()
+        
+        self.running = True
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='MidiWorker')
+        self.thread.daemon = True
+        self.thread.start()
+    
+    @property
+    def high_water_mark(self):
+        return max([ring.high_water_mark for ring in self.rings] or [0])
+    
+    @property
+    def coalesced(self):
+        return sum([ring.coalesced for ring in self.rings])
+    
+    def depth(self):
+        # number of messages waiting to be written
+        return sum([ring.depth() for ring in self.rings])
+    
+    def producer_ring(self):
+        # the ring of the calling thread
+        try:
+            return self.local.ring
+        except AttributeError:
+            ring = self.local.ring = MidiRing(self.queue_size)
+            with self.lock:
+                self.rings = self.rings + (ring,)
+            return ring
+    
+    def write(self, data):
+        # same format as pygame.midi.Output.write: [[[status, data1, data2], timestamp], ...]
+        now = time.time()
+        push = self.producer_ring().push
+        for (status, data1, data2), timestamp in data:
+            push((now, status, data1, data2))
+        self.wakeup.set()
+        
+        tracer = latencytracer.tracer
+        if tracer is not None:
+            tracer.enqueued_batch(data)
+    
+    def write_short(self, status, data1=0, data2=0):
+        now = time.time()
+        self.producer_ring().push((now, status, data1, data2))
+        self.wakeup.set()
+        
+        tracer = latencytracer.tracer
+        if tracer is not None:
+            tracer.enqueued(status, data1, data2, now)
+    
+    def run(self):
+        while self.running:
+            self.wakeup.wait(WORKER_IDLE_TIMEOUT)
+            self.wakeup.clear()
+            self.drain()
+        
+        # last call: deliver everything that's left
+        self.drain()
+    
+    def drain(self):
+        held_notes = self.held_notes
+        
+        while True:
+            # take a batch from the rings, the oldest record first
+            batch = []
+            while len(batch) < MAX_BATCH_SIZE:
+                oldest_ring = None
+                oldest = None
+                for ring in self.rings:
+                    record = ring.peek()
+                    if record is not None and (oldest is None or record[0] < oldest[0]):
+                        oldest_ring, oldest = ring, record
+                if oldest_ring is None:
+                    break
+                oldest_ring.pop()
+                
+                timestamp, status, data1, data2 = oldest
+                batch.append([[status, data1, data2], 0])
+                
+                # remember which notes are held
+                kind = status & 0xF0
+                if kind == NOTE_ON and data2 > 0:
+                    held_notes.add((status & 0x0F, data1))
+                elif kind == NOTE_ON or kind == NOTE_OFF:
+                    held_notes.discard((status & 0x0F, data1))
+            
+            if not batch:
+                return
+            
+            self.port.write(batch)
+            
+            tracer = latencytracer.tracer
+            if tracer is not None:
+                tracer.written_batch(batch)
+    
+    def close(self):
+        # stop the thread (it empties the queue first), then turn off all the notes still held
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+        
+        if self.held_notes:
+            self.port.write([[[NOTE_OFF + channel, note, 0], 0] for channel, note in sorted(self.held_notes)])
+            self.held_notes.clear()
+        self.port.close()
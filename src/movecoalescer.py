@@ -0,0 +1,83 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+Per-frame coalescing of the touch moves for the graphics. A digitizer sending
+240 moves per second gives several moves per touch and frame, but only the
+last one is ever seen on the screen.
+'''
+
+
+from collections import OrderedDict
+
+
+'''
+####################################
+##
+##   MoveCoalescer Class
+##
+####################################
+'''
+class MoveCoalescer(object):
+    '''Keeps the newest move of every touch (by touch uid) and hands it over once
+    per frame: push() the touch with the function to call for it, flush() calls
+    them all. schedule(callback) has to call the callback once before the next
+    frame (e.g. Clock.schedule_once with a timeout of -1); it's called for the
+    first move of a frame.
+    Only the graphics go through here - the keyboard feeds every move to the pitch
+    and rounding path right away.
+    '''
+    
+    def __init__(self, schedule):
+        self.schedule = schedule
+        
+        # uid -> (touch, handler), in the order of the first move of the frame
+        self.pending = OrderedDict()
+        
+        # statistics
+        self.received = 0
+        self.processed = 0
+    
+    def push(self, touch, handler):
+        self.received += 1
+        if not self.pending:
+            self.schedule(self.flush)
+        self.pending[touch.uid] = (touch, handler)
+    
+    def discard(self, touch):
+        # the touch is gone (its graphics are removed), its pending move doesn't matter anymore
+        self.pending.pop(touch.uid, None)
+    
+    def flush(self, *args):
+        # (*args: may be used as Clock callback)
+        pending = self.pending
+        if not pending:
+            return
+        self.pending = OrderedDict()
+        for touch, handler in pending.itervalues():
+            self.processed += 1
+            handler(touch)
+    
+    def report(self):
+        coalesced = self.received - self.processed
+        return 'Touch moves: %i received, %i processed for the graphics (%i coalesced).' % (self.received, self.processed, coalesced)
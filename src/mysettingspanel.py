@@ -32,6 +32,20 @@ from kivy.uix.widget import Widget
 from kivy.uix.button import Button
 
 
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Thumbnails
+# ---------------------------------------------------------
+BACKGROUND_THUMBNAIL_SIZE = (320, 180)
+KEYBOARD_THUMBNAIL_SIZE = (1250, 195)
+
+
 '''
 ####################################
 ##
@@ -42,6 +56,8 @@ from kivy.uix.button import Button
 class MySettingsPanel(Widget):
     background_scroll_view_grid = ObjectProperty(None)
     keyboard_scroll_view_box = ObjectProperty(None)
+    # an ImageCache for the thumbnails. Without one, the images are shown in full resolution.
+    thumbnail_cache = ObjectProperty(None, allownone=True)
     is_open = False
     
     def __init__(self, **kwargs):
@@ -92,14 +108,16 @@ class MySettingsPanel(Widget):
         # fill the background selector with images
         for filename in glob(join(curdir, 'backgrounds/*', 'background_*')):
             try:
-                # load the image
+                # load the image (only the thumbnail - the full image isn't decoded until it's selected)
+                thumbnail = self.get_thumbnail(filename, BACKGROUND_THUMBNAIL_SIZE)
                 picture = Button(
-                                 background_down=filename,
-                                 background_normal=filename,
+                                 background_down=thumbnail,
+                                 background_normal=thumbnail,
                                  size_hint_y=None,
                                  height=180
                                  #size=(200, 170)
                                  )
+                picture.image_filename = filename
                 # add to the grid
                 self.background_scroll_view_grid.add_widget(picture)
                 
@@ -109,15 +127,23 @@ class MySettingsPanel(Widget):
         # fill the keyboard selector with images
         for filename in glob(join(curdir, 'keyboards', 'keyboard_*')):
             try:
-                # load the image
+                # load the image (only the thumbnail - the full image isn't decoded until it's selected)
+                thumbnail = self.get_thumbnail(filename, KEYBOARD_THUMBNAIL_SIZE)
                 picture = Button(
-                                 background_down=filename,
-                                 background_normal=filename,
+                                 background_down=thumbnail,
+                                 background_normal=thumbnail,
                                  size_hint=(None, None),
                                  size=(1250, 195)
                                  )
+                picture.image_filename = filename
                 # add to the box
                 self.keyboard_scroll_view_box.add_widget(picture)
                 
             except Exception, e:
                 print 'Keyboard image: Unable to load <%s>. Reason: %s' % (filename, e)
+    
+    def get_thumbnail(self, filename, size):
+        # the image to show on the button
+        if self.thumbnail_cache is None:
+            return filename
+        return self.thumbnail_cache.get(filename, *size)
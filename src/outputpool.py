@@ -0,0 +1,123 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+The MIDI outputs opened so far, kept open by device name. Switching to a device
+that was used before is a dictionary lookup instead of a PortMidi open call.
+'''
+
+
+from collections import OrderedDict
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Pool
+# ---------------------------------------------------------
+# devices kept open (the least recently used one is closed first)
+DEFAULT_POOL_SIZE = 4
+
+
+'''
+####################################
+##
+##   OutputPool Class
+##
+####################################
+'''
+class OutputPool(object):
+    '''Keeps the opened MIDI outputs by device name.
+    
+    The device ids come from the snapshot of the DeviceRegistry (it's only scanned
+    again if a name isn't in it), open_output(device_id) opens one and returns the
+    port (a pygame.midi.Output, or a MidiWorker around it).
+    
+    Lifecycle: acquire() opens the port (or takes the open one), it stays open
+    when the output moves on to another device, until the pool gets too big
+    (the least recently used port is closed), discard() or close().
+    '''
+    
+    def __init__(self, registry, open_output, max_size=DEFAULT_POOL_SIZE):
+        self.registry = registry
+        self.open_output = open_output
+        self.max_size = max(1, max_size)
+        
+        # name -> port, the least recently used one first
+        self.ports = OrderedDict()
+        
+        # statistics
+        self.opened = 0
+        self.reused = 0
+        self.closed = 0
+    
+    def device_id(self, name):
+        # the id of the output device with that name (None if there is none)
+        device_id = self.registry.snapshot.output_id(name)
+        if device_id is None and self.registry.refresh():
+            device_id = self.registry.snapshot.output_id(name)
+        return device_id
+    
+    def __contains__(self, name):
+        return name in self.ports
+    
+    def acquire(self, name):
+        '''Returns the open port of the device, opens it if it isn't in the pool yet.
+        Raises KeyError if there is no output device with that name.
+        '''
+        port = self.ports.pop(name, None)
+        if port is None:
+            device_id = self.device_id(name)
+            if device_id is None:
+                raise KeyError(name)
+            port = self.open_output(device_id)
+            self.opened += 1
+        else:
+            self.reused += 1
+        
+        # (the most recently used one goes to the end)
+        self.ports[name] = port
+        while len(self.ports) > self.max_size:
+            self.ports.popitem(last=False)[1].close()
+            self.closed += 1
+        return port
+    
+    def discard(self, name):
+        # close the port of the device (if it's open)
+        port = self.ports.pop(name, None)
+        if port is not None:
+            port.close()
+            self.closed += 1
+    
+    def close(self):
+        # close all the ports
+        for name in self.ports.keys():
+            self.discard(name)
+    
+    def report(self):
+        return 'MIDI output pool: %i ports opened, %i reused, %i closed (%i open).' % (self.opened, self.reused, self.closed, len(self.ports))
@@ -0,0 +1,71 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+####################################
+##
+##   Pool Class
+##
+####################################
+'''
+class Pool(object):
+    '''A bounded pool of reusable objects (blobs, circles, key lights...).
+    The objects are created up front, so there is no construction on the touch path
+    after startup. If the pool runs empty, a new object is created (a miss) and the
+    pool grows; at most max_size free objects are kept.
+    The caller resets the state of an object it takes from the pool.
+    '''
+    
+    def __init__(self, factory, size, max_size=None):
+        self.factory = factory
+        self.initial_size = size
+        self.max_size = max_size if max_size is not None else size * 2
+        self.free = [factory() for i in range(size)]
+        
+        # statistics
+        self.created = size
+        self.hits = 0
+        self.misses = 0
+    
+    def acquire(self):
+        if self.free:
+            self.hits += 1
+            return self.free.pop()
+        
+        self.misses += 1
+        self.created += 1
+        return self.factory()
+    
+    def release(self, obj):
+        # keep the object for later (unless there are already enough of them, or it has already been given back)
+        if len(self.free) < self.max_size and obj not in self.free:
+            self.free.append(obj)
+    
+    def growth(self):
+        # how many objects had to be created after startup
+        return self.created - self.initial_size
+    
+    def report(self, name):
+        return '%s pool: %i hits, %i misses, grown by %i (%i free).' % (name, self.hits, self.misses, self.growth(), len(self.free))
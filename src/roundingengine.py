@@ -0,0 +1,191 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+from collections import deque
+
+# optional: without numpy, the keyboard keeps the rounding loop in roundAllKeys
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Voices
+# ---------------------------------------------------------
+# voices the arrays are allocated for (they grow if there are more)
+INITIAL_CAPACITY = 64
+
+# MIDI
+# ---------------------------------------------------------
+PITCH_BEND_CENTER = 8192
+PITCH_BEND_MAX = 16383
+# marks a voice whose pitch bend hasn't been computed yet
+NO_PITCH_BEND = -1
+
+
+def numpy_available():
+    return numpy is not None
+
+
+'''
+####################################
+##
+##   RoundingEngine Class
+##
+####################################
+'''
+class RoundingEngine(object):
+    '''The rounding algorithm of Keyboard.roundAllKeys, computed for all the voices
+    in one step. Every voice has a slot in a set of preallocated numpy arrays (one
+    array per value instead of one dict per voice), so a step is a handful of array
+    operations regardless of the number of voices.
+    The operations are the same (and in the same order) as in roundAllKeys, so the
+    results are exactly the same.
+    '''
+    
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.capacity = 0
+        self.next_order = 0
+        self.free = deque()
+        self.payload = []
+        self.allocate(capacity)
+    
+    def allocate(self, capacity):
+        # (re)allocate the arrays, keeping the voices of the old ones
+        def resize(array, dtype, fill=0):
+            new_array = numpy.empty(capacity, dtype)
+            new_array.fill(fill)
+            if array is not None:
+                new_array[:len(array)] = array
+            return new_array
+        
+        old_capacity = self.capacity
+        get = lambda name: getattr(self, name, None)
+        self.active = resize(get('active'), bool, False)
+        self.old_position = resize(get('old_position'), numpy.float64)
+        self.finger_position = resize(get('finger_position'), numpy.float64)
+        self.rounded_key = resize(get('rounded_key'), numpy.float64)
+        self.pitch_base = resize(get('pitch_base'), numpy.float64)
+        self.time_update = resize(get('time_update'), numpy.float64)
+        self.dx = resize(get('dx'), numpy.float64)
+        self.pitch_value = resize(get('pitch_value'), numpy.int64, NO_PITCH_BEND)
+        self.order = resize(get('order'), numpy.int64)
+        
+        self.payload.extend([None] * (capacity - old_capacity))
+        self.free.extend(range(old_capacity, capacity))
+        self.capacity = capacity
+    
+    def add(self, payload, finger_position, rounded_key, pitch_base, time_update, dx):
+        '''Starts a voice at the key (like on_touch_down) and returns its slot.
+        pitch_base: the pitch of its note (see tuning.PitchTable), the pitch bend is relative to it.
+        '''
+        if not self.free:
+            self.allocate(self.capacity * 2)
+        slot = self.free.popleft()
+        
+        self.active[slot] = True
+        self.old_position[slot] = rounded_key
+        self.finger_position[slot] = finger_position
+        self.rounded_key[slot] = rounded_key
+        self.pitch_base[slot] = pitch_base
+        self.time_update[slot] = time_update
+        self.dx[slot] = dx
+        self.pitch_value[slot] = NO_PITCH_BEND
+        self.payload[slot] = payload
+        
+        # the order of the touches in EventLoop.touches (the newest touch is the last one)
+        self.order[slot] = self.next_order
+        self.next_order += 1
+        return slot
+    
+    def move(self, slot, finger_position, rounded_key, time_update, dx):
+        # (like on_touch_move)
+        self.finger_position[slot] = finger_position
+        self.rounded_key[slot] = rounded_key
+        self.time_update[slot] = time_update
+        self.dx[slot] = dx
+    
+    def remove(self, slot):
+        self.active[slot] = False
+        self.payload[slot] = None
+        self.free.append(slot)
+    
+    def step(self, now, pitch_lock, movement_decay, movement_threshold, round_speed_to_finger, round_speed_to_key, pitch_table):
+        '''One rounding step for all the voices.
+        Returns (slots, request_scheduler_continue): the slots of the voices whose
+        pitch bend value has changed (read it from pitch_value) and whether the
+        rounding isn't finished yet.
+        '''
+        active = self.active
+        old = self.old_position
+        rounded = self.rounded_key
+        
+        if pitch_lock:
+            # fully rounding - chromatic
+            current = rounded.copy()
+        else:
+            # snap to the finger while it's moving...
+            moving = (now - self.time_update < movement_decay) & (numpy.abs(self.dx) > movement_threshold)
+            current = old + (self.finger_position - old) * round_speed_to_finger
+            
+            # ... otherwise to the key under it (but no changes under 1 pixel)
+            to_key = old + (rounded - old) * round_speed_to_key
+            to_key = numpy.where(numpy.abs(rounded - to_key) <= 1, rounded, to_key)
+            numpy.copyto(current, to_key, where=~moving)
+        
+        # int() in roundAllKeys truncates towards zero - numpy.trunc too
+        current_pixel = numpy.trunc(current)
+        unfinished = (current_pixel != numpy.trunc(old)) | (current_pixel != rounded)
+        if pitch_lock:
+            # roundAllKeys resets the flag for every touch with pitch lock: only the newest voice decides
+            slots = numpy.flatnonzero(active)
+            request_scheduler_continue = bool(len(slots)) and bool(unfinished[slots[numpy.argmax(self.order[slots])]])
+        else:
+            request_scheduler_continue = bool((unfinished & active).any())
+        
+        # the pitch bend, like in Keyboard.midi_set_pitch_bend: looked up in the pitch table (a numpy copy of it is kept with the table)
+        units = pitch_table.units_array
+        if units is None:
+            units = pitch_table.units_array = numpy.array(pitch_table.units, numpy.float64)
+        pixel = numpy.clip(current_pixel, 0, pitch_table.last_pixel).astype(numpy.intp)
+        pitch_value = numpy.trunc(units[pixel] - self.pitch_base + 0.5).astype(numpy.int64) + PITCH_BEND_CENTER
+        numpy.clip(pitch_value, 0, PITCH_BEND_MAX, out=pitch_value)
+        
+        changed = (pitch_value != self.pitch_value) & active
+        self.pitch_value[changed] = pitch_value[changed]
+        
+        # store history data
+        old[active] = current[active]
+        
+        return numpy.flatnonzero(changed).tolist(), request_scheduler_continue
@@ -23,8 +23,6 @@ along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
 
-import pygame.midi
-
 from kivy.properties import ObjectProperty
 
 from kivy.uix.boxlayout import BoxLayout
@@ -60,6 +58,12 @@ class SettingMIDI(SettingItem):
     :data:`popup` is a :class:`~kivy.properties.ObjectProperty`, default to
     None.
     '''
+    
+    # the DeviceRegistry of the app (assigned by the IcarusTouchWidget): the popup lists its snapshot, it never scans the devices itself
+    device_registry = None
+    
+    # the OutputPool of the app (assigned by the IcarusTouchWidget): the devices in it are opened by ME, they stay selectable
+    output_pool = None
 
     def on_panel(self, instance, value):
         if value is None:
@@ -76,21 +80,21 @@ class SettingMIDI(SettingItem):
         content = BoxLayout(orientation='vertical', spacing=10)
         self.popup = popup = Popup(content=content,
             title=self.title, size_hint=(None, None), size=(400, 400))
-        popup.height = pygame.midi.get_count() * 30 + 150
+        devices = self.device_registry.snapshot.devices
+        popup.height = len(devices) * 30 + 150
 
         # add a spacer
         content.add_widget(Widget(size_hint_y=None, height=1))
         uid = str(self.uid)
         
-        device_count = pygame.midi.get_count()
-        
         # add all the selectable MIDI output devices
-        for i in range(device_count):
-            if pygame.midi.get_device_info(i)[3] == 1 and (pygame.midi.get_device_info(i)[4] == 0 or pygame.midi.get_device_info(i)[1] == self.value):
-                # if it's an output device and it's not already opened (unless it's the device opened by ME), display it in list.
+        for device_id, interface, name, is_input, is_output, opened in devices:
+            mine = name == self.value or (self.output_pool is not None and name in self.output_pool)
+            if is_output == 1 and (opened == 0 or mine):
+                # if it's an output device and it's not already opened (unless it's a device opened by ME), display it in list.
                 # if this is the device that was selected before, display it pressed
-                state = 'down' if pygame.midi.get_device_info(i)[1] == self.value else 'normal'
-                btn = ToggleButton(text=pygame.midi.get_device_info(i)[1], state=state, group=uid)
+                state = 'down' if name == self.value else 'normal'
+                btn = ToggleButton(text=name, state=state, group=uid)
                 btn.bind(on_release=self._set_option)
                 content.add_widget(btn)
 
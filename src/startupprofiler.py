@@ -0,0 +1,137 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+'''
+Measures the phases of the application startup. Turn it on with
+
+    python main.py --profile-startup
+or
+    ICARUSTOUCH_PROFILE_STARTUP=1 python main.py
+
+The report is printed to the console as soon as the first frame is drawn, the time
+of the first note is printed when it's played.
+This module has to be imported before kivy: kivy parses the command line itself
+and exits on options it doesn't know, so the flag is removed here.
+'''
+
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# Activation
+# ---------------------------------------------------------
+PROFILE_STARTUP_FLAG = '--profile-startup'
+PROFILE_STARTUP_VARIABLE = 'ICARUSTOUCH_PROFILE_STARTUP'
+
+
+'''
+####################################
+##
+##   StartupProfiler Class
+##
+####################################
+'''
+class StartupProfiler(object):
+    '''Timing of the (nested) startup phases and of single events like the first
+    frame. If disabled, all the methods return right away.
+    '''
+    
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start_time = time.time()
+        self.reported = False
+        
+        # [depth, name, duration] in the order the phases started (the duration of a running phase is None)
+        self.phases = []
+        self.running = []
+        # (name, seconds since start) of the events
+        self.marks = []
+    
+    def begin(self, name):
+        if not self.enabled:
+            return
+        entry = [len(self.running), name, None]
+        self.phases.append(entry)
+        self.running.append((entry, time.time()))
+    
+    def end(self):
+        if not self.enabled:
+            return
+        entry, start = self.running.pop()
+        entry[2] = time.time() - start
+    
+    @contextmanager
+    def phase(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+    
+    def mark(self, name):
+        # an event - only its first occurrence is recorded
+        if not self.enabled or name in [mark_name for mark_name, seconds in self.marks]:
+            return
+        seconds = time.time() - self.start_time
+        self.marks.append((name, seconds))
+        if self.reported:
+            print 'Startup: %s after %.3f s' % (name, seconds)
+    
+    def report(self):
+        if not self.enabled:
+            return
+        self.reported = True
+        print 'Startup profile:'
+        for depth, name, duration in self.phases:
+            if duration is None:
+                print '  %-40s running' % ('  ' * depth + name)
+            else:
+                print '  %-40s %8.1f ms' % ('  ' * depth + name, duration * 1000)
+        for name, seconds in self.marks:
+            print '  %-40s after %.3f s' % (name, seconds)
+
+
+def profiling_requested():
+    requested = os.environ.get(PROFILE_STARTUP_VARIABLE, '') not in ('', '0')
+    if PROFILE_STARTUP_FLAG in sys.argv:
+        sys.argv.remove(PROFILE_STARTUP_FLAG)
+        requested = True
+    return requested
+
+
+# the profiler of this process (starts counting when this module is imported)
+profiler = StartupProfiler(profiling_requested())
@@ -0,0 +1,184 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+'''
+Touch traces: a recording of the touch events of a session (and of the rounding
+ticks), to replay it exactly through the Keyboard - see benchmarks/replay_trace.py.
+
+A trace file is a header followed by fixed-size records, all little endian:
+
+    header: magic "ITRC", version, rounding (0: frame clock, 1: control rate),
+            control rate [Hz], key width [pixel]
+    record: timestamp [s], x, y, value (all doubles), touch uid, kind
+
+For touches, value is the x position of the keyboard; for rounding ticks it's
+the dt of the tick. The positions and times are stored as doubles, so a replay
+computes exactly the same values as the live take.
+'''
+
+
+import mmap
+import struct
+import threading
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# File Format
+# ---------------------------------------------------------
+TRACE_MAGIC = 'ITRC'
+TRACE_VERSION = 1
+HEADER = struct.Struct('<4sHHHH')
+RECORD = struct.Struct('<ddddIB')
+
+# record kinds
+TOUCH_DOWN = 1
+TOUCH_MOVE = 2
+TOUCH_UP = 3
+ROUNDING_TICK = 4
+
+# rounding of the recorded session
+ROUNDING_FRAME_CLOCK = 0
+ROUNDING_CONTROL_RATE = 1
+
+# Writer
+# ---------------------------------------------------------
+# records collected before they are written to the file (~37 KB)
+BUFFER_RECORDS = 1000
+
+
+'''
+####################################
+##
+##   TraceWriter Class
+##
+####################################
+'''
+class TraceWriter(object):
+    '''Records touch events and rounding ticks into a trace file.
+    The records are packed into a preallocated buffer and written in blocks of
+    BUFFER_RECORDS, so recording a touch event costs one struct.pack_into.
+    The rounding ticks of the control-rate engine come from its own thread,
+    that's why the buffer is protected by a lock.
+    '''
+    
+    def __init__(self, filename, key_width, control_rate=0, buffer_records=BUFFER_RECORDS):
+        self.file = open(filename, 'wb')
+        self.file.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION,
+            ROUNDING_CONTROL_RATE if control_rate else ROUNDING_FRAME_CLOCK, control_rate, int(key_width)))
+        
+        self.buffer = bytearray(RECORD.size * buffer_records)
+        self.buffer_view = memoryview(self.buffer)
+        self.offset = 0
+        self.lock = threading.Lock()
+        
+        # statistics
+        self.records = 0
+    
+    def touch(self, kind, touch, keyboard_x):
+        self.write(kind, touch.time_update, touch.x, touch.y, keyboard_x, touch.uid)
+    
+    def tick(self, now, dt):
+        self.write(ROUNDING_TICK, now, 0, 0, dt, 0)
+    
+    def write(self, kind, timestamp, x, y, value, uid):
+        with self.lock:
+            RECORD.pack_into(self.buffer, self.offset, timestamp, x, y, value, uid, kind)
+            self.offset += RECORD.size
+            self.records += 1
+            if self.offset == len(self.buffer):
+                self._write_buffer()
+    
+    def _write_buffer(self):
+        # (call with the lock held)
+        if self.offset:
+            self.file.write(self.buffer_view[:self.offset])
+            self.offset = 0
+    
+    def flush(self):
+        with self.lock:
+            self._write_buffer()
+            self.file.flush()
+    
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self._write_buffer()
+            self.file.close()
+
+
+'''
+####################################
+##
+##   TraceReader Class
+##
+####################################
+'''
+class TraceReader(object):
+    '''Reads a trace file through a memory map (nothing is loaded up front).
+    Iterating over it gives (kind, timestamp, x, y, value, uid) tuples. An incomplete
+    record at the end (if the application was killed while recording) is ignored.
+    '''
+    
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, self.rounding, self.control_rate, self.key_width = HEADER.unpack_from(self.map, 0)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            self.close()
+            raise ValueError('%s is not a touch trace (version %i)' % (filename, TRACE_VERSION))
+    
+    def __len__(self):
+        return (len(self.map) - HEADER.size) // RECORD.size
+    
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        timestamp, x, y, value, uid, kind = RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)
+        return kind, timestamp, x, y, value, uid
+    
+    def __iter__(self):
+        unpack_from = RECORD.unpack_from
+        for offset in xrange(HEADER.size, HEADER.size + len(self) * RECORD.size, RECORD.size):
+            timestamp, x, y, value, uid, kind = unpack_from(self.map, offset)
+            yield kind, timestamp, x, y, value, uid
+    
+    def duration(self):
+        if not len(self):
+            return 0
+        return self[len(self) - 1][1] - self[0][1]
+    
+    def close(self):
+        self.map.close()
+        self.file.close()
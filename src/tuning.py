@@ -0,0 +1,276 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+'''
+Tunings: scales in the Scala format (.scl) with an optional keyboard mapping
+(.kbm), see http://www.huygens-fokker.org/scala/scl_format.html
+
+The pitch on the keyboard glides linearly from the center of one key to the
+center of the next one. A PitchTable holds that pitch for every pixel of the
+keyboard, as pitch bend units, so a pitch bend update is one table lookup and a
+subtraction. It's rebuilt whenever the tuning, the pitch bend range, the
+transposition or the key geometry changes.
+The table is there for the tunings: with a Scala scale (or keys of different
+widths) every key has its own slope, there's no single formula for all of them.
+In 12-TET a lookup is about as fast as the formula used before, not faster.
+'''
+
+
+import math
+
+
+'''
+####################################
+##
+##   GLOBAL SETTINGS
+##
+####################################
+'''
+
+# MIDI
+# ---------------------------------------------------------
+PITCH_BEND_CENTER = 8192
+PITCH_BEND_MAX = 16383
+# the two 7-bit data bytes of every pitch bend value
+BEND_LSB = [value & 0x7F for value in xrange(PITCH_BEND_MAX + 1)]
+BEND_MSB = [value >> 7 for value in xrange(PITCH_BEND_MAX + 1)]
+
+# Scala
+# ---------------------------------------------------------
+# frequency of MIDI note 0 in 12-tone equal temperament (A4 = 440 Hz)
+NOTE_0_FREQUENCY = 440.0 / 2 ** (69 / 12.0)
+
+
+def parse_pitch(text):
+    # a pitch of a .scl file: cents if it contains a period, otherwise a ratio (or an integer)
+    value = text.split()[0]
+    if '.' in value:
+        return float(value)
+    if '/' in value:
+        numerator, denominator = value.split('/', 1)
+        ratio = float(int(numerator)) / int(denominator)
+    else:
+        ratio = float(int(value))
+    if ratio <= 0:
+        raise ValueError('invalid ratio "%s"' % value)
+    return 1200.0 * math.log(ratio, 2)
+
+
+def read_lines(filename):
+    # the lines of a Scala file without the comments ("!")
+    with open(filename, 'rU') as f:
+        return [line.strip() for line in f if not line.startswith('!')]
+
+
+def load_scale(filename):
+    '''Reads a .scl file. Returns (description, pitches): the pitches of the degrees
+    1 to n in cents, the last one is the period (usually the octave, 1200.0).
+    '''
+    lines = read_lines(filename)
+    try:
+        description = lines[0]
+        count = int(lines[1].split()[0])
+        pitches = [parse_pitch(line) for line in lines[2:2 + count]]
+    except (IndexError, ValueError) as e:
+        raise ValueError('%s is not a valid Scala scale: %s' % (filename, e))
+    if len(pitches) != count or count < 1:
+        raise ValueError('%s is not a valid Scala scale: %i pitches instead of %i' % (filename, len(pitches), count))
+    return description, pitches
+
+
+'''
+####################################
+##
+##   KeyboardMapping Class
+##
+####################################
+'''
+class KeyboardMapping(object):
+    '''A Scala keyboard mapping (.kbm): which scale degree every MIDI note plays
+    and which note is tuned to the reference frequency. Without a file, the degree 0
+    is on middle C and A4 is 440 Hz, every note plays the next degree.
+    '''
+    
+    def __init__(self, size=0, first_note=0, last_note=127, middle_note=60, reference_note=69,
+            reference_frequency=440.0, octave_degree=None, degrees=()):
+        self.size = size
+        self.first_note = first_note
+        self.last_note = last_note
+        self.middle_note = middle_note
+        self.reference_note = reference_note
+        self.reference_frequency = reference_frequency
+        # the degree the mapping repeats at (None: the size of the scale)
+        self.octave_degree = octave_degree
+        # degree per note of the mapping, None if the note isn't mapped ("x")
+        self.degrees = list(degrees)
+    
+    @classmethod
+    def load(cls, filename):
+        lines = [line for line in read_lines(filename) if line]
+        try:
+            values = [line.split()[0] for line in lines]
+            size = int(values[0])
+            degrees = [None if value.lower() == 'x' else int(value) for value in values[7:7 + size]]
+            # (missing entries at the end are unmapped)
+            degrees += [None] * (size - len(degrees))
+            return cls(size, int(values[1]), int(values[2]), int(values[3]), int(values[4]),
+                float(values[5]), int(values[6]), degrees)
+        except (IndexError, ValueError) as e:
+            raise ValueError('%s is not a valid Scala keyboard mapping: %s' % (filename, e))
+    
+    def degree(self, note, scale_size):
+        # the scale degree of the MIDI note (relative to the middle note), None if it isn't mapped
+        if not self.first_note <= note <= self.last_note:
+            return None
+        offset = note - self.middle_note
+        if self.size == 0:
+            return offset
+        octave, index = divmod(offset, self.size)
+        degree = self.degrees[index]
+        if degree is None:
+            return None
+        octave_degree = self.octave_degree if self.octave_degree else scale_size
+        return octave * octave_degree + degree
+
+
+'''
+####################################
+##
+##   Tuning Class
+##
+####################################
+'''
+class Tuning(object):
+    '''The pitch of every MIDI note, in cents above MIDI note 0 of the 12-tone equal
+    temperament (so in 12-TET, note n has n * 100 cents).
+    '''
+    
+    def __init__(self, pitches, mapping=None, description=''):
+        self.pitches = list(pitches)
+        self.mapping = mapping if mapping is not None else KeyboardMapping()
+        self.description = description
+        
+        reference = self.relative_pitch(self.mapping.reference_note)
+        if reference is None:
+            raise ValueError('the reference note %i is not mapped' % self.mapping.reference_note)
+        self.offset = 1200.0 * math.log(self.mapping.reference_frequency / NOTE_0_FREQUENCY, 2) - reference
+    
+    @classmethod
+    def equal_temperament(cls):
+        return cls([100.0 * degree for degree in xrange(1, 13)], description='12-tone equal temperament')
+    
+    @classmethod
+    def load(cls, scale_filename, mapping_filename=None):
+        description, pitches = load_scale(scale_filename)
+        mapping = KeyboardMapping.load(mapping_filename) if mapping_filename else None
+        return cls(pitches, mapping, description)
+    
+    def relative_pitch(self, note):
+        # pitch of the note above the middle note [cents], None if it isn't mapped
+        degree = self.mapping.degree(note, len(self.pitches))
+        if degree is None:
+            return None
+        periods, index = divmod(degree, len(self.pitches))
+        return periods * self.pitches[-1] + (self.pitches[index - 1] if index else 0.0)
+    
+    def note_pitch(self, note):
+        # pitch of the MIDI note [cents above note 0 of 12-TET], None if it isn't mapped
+        pitch = self.relative_pitch(note)
+        if pitch is None:
+            return None
+        return pitch + self.offset
+
+
+'''
+####################################
+##
+##   PitchTable Class
+##
+####################################
+'''
+class PitchTable(object):
+    '''The pitch of every pixel of the keyboard, for a tuning, a key geometry, the
+    transposition and the pitch bend range of the synthesizer.
+    
+    Every key plays the MIDI note closest to its tuned pitch (key_notes), the pitch
+    bend adds the difference. The pitch is stored in pitch bend units
+    (8192 / pitch bend range per semitone), so the pitch bend of a voice is
+    units[pixel] - its base + center: the voice keeps the base of its note.
+    The note (and its base) is fixed when the voice starts, that's why the table
+    can't hold ready-made (note, LSB, MSB) triples per pixel - it would need one
+    table per starting key. The clamped value gives the data bytes through
+    BEND_LSB and BEND_MSB.
+    Unmapped keys play the pitch of the key to their left.
+    '''
+    
+    def __init__(self, tuning, geometry, transpose, pitch_bend_range):
+        units_per_cent = PITCH_BEND_CENTER / (pitch_bend_range * 100.0)
+        
+        # the pitch of every key [cents], the note it plays and the pitch bend base of that note
+        pitches = []
+        self.key_notes = []
+        self.key_bases = []
+        for key in xrange(geometry.count):
+            pitch = tuning.note_pitch(key + transpose)
+            if pitch is None:
+                pitch = pitches[-1] if pitches else (key + transpose) * 100.0
+            pitches.append(pitch)
+            note = max(0, min(int(round(pitch / 100.0)), 127))
+            self.key_notes.append(note)
+            self.key_bases.append(note * 100.0 * units_per_cent)
+        
+        # the pitch of every pixel: linear from one key center to the next, one segment after the other
+        # (left of the first and right of the last center, the slope of the outer keys goes on)
+        centers = geometry.centers
+        pixels = int(math.ceil(geometry.width)) + 1
+        self.units = []
+        start = 0
+        for key in xrange(max(geometry.count - 1, 1)):
+            if geometry.count == 1:
+                center, slope, end = centers[0], 100.0 / geometry.widths[0], pixels
+            else:
+                center = centers[key]
+                slope = (pitches[key + 1] - pitches[key]) / (centers[key + 1] - centers[key])
+                end = pixels if key == geometry.count - 2 else min(int(math.ceil(centers[key + 1])), pixels)
+            pitch, slope = (pitches[key] - center * slope) * units_per_cent, slope * units_per_cent
+            self.units.extend([pitch + pixel * slope for pixel in xrange(start, end)])
+            start = max(start, end)
+        self.last_pixel = len(self.units) - 1
+        
+        # numpy copy of the units (made by the rounding engine when it needs it)
+        self.units_array = None
+    
+    def pitch_value(self, position, base):
+        # the pitch bend value (0 - 16383) for a voice at the position (truncated to the pixel) with the base of its note
+        pixel = int(position)
+        if pixel < 0:
+            pixel = 0
+        elif pixel > self.last_pixel:
+            pixel = self.last_pixel
+        
+        value = int(self.units[pixel] - base + 0.5) + PITCH_BEND_CENTER
+        if value > PITCH_BEND_MAX:
+            return PITCH_BEND_MAX
+        elif value < 0:
+            return 0
+        return value
@@ -0,0 +1,234 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+One shared driver for all the fades of the application (blobs, circles, key lights,
+the feedback wall, background and keyboard changes).
+
+Instead of one kivy Animation object per widget (each with its own Clock callback
+and a property dispatch per animated value and frame), the running fades are kept
+in flat arrays and advanced by one single Clock callback, which is only scheduled
+while something is fading. Finished slots are recycled.
+'''
+
+
+from kivy.clock import Clock
+from kivy.animation import AnimationTransition
+
+
+# Easing Functions
+# ---------------------------------------------------------
+# the easings are referenced by their id (index into EASINGS)
+EASINGS = []
+EASING_IDS = {}
+
+
+def easing_id(transition):
+    # id of an AnimationTransition function given by its name (e.g. 'out_expo')
+    try:
+        return EASING_IDS[transition]
+    except KeyError:
+        EASINGS.append(getattr(AnimationTransition, transition))
+        EASING_IDS[transition] = len(EASINGS) - 1
+        return EASING_IDS[transition]
+
+
+'''
+####################################
+##
+##   TweenEngine Class
+##
+####################################
+'''
+class TweenEngine(object):
+    '''All the running fades. A fade (slot) interpolates one or more properties of
+    its target from their current value to the given one. Numbers and sequences
+    (colors, sizes, positions) are supported.
+    
+    Animate pos instead of x and y and size instead of width and height: every
+    property costs one dispatch per frame.
+    
+    Like with kivy's Animation, a property is animated by one fade at a time:
+    starting a fade cancels the running fades of the same properties of the
+    target, stop() ends a fade and calls its on_complete, cancel() ends it
+    without calling on_complete.
+    '''
+    
+    def __init__(self):
+        # the slots: flat arrays, indexed by the slot number
+        self.targets = []
+        self.properties = []        # tuple of (name, start, delta, is_sequence) per slot
+        self.start_times = []
+        self.durations = []
+        self.easings = []           # easing ids
+        self.callbacks = []
+        
+        # numbers of the running slots and of the recyclable ones
+        self.active = []
+        self.free = []
+        self.scheduled = False
+        
+        # statistics
+        self.started = 0
+        self.completed = 0
+        self.stopped = 0
+        self.max_active = 0
+    
+    def start(self, target, duration, transition='linear', on_complete=None, **properties):
+        # animate the properties of target to the given values. on_complete(target) is called at the end.
+        # (the fades running on these properties are cancelled, the new one takes over)
+        self.cancel(target, *properties)
+        
+        animated = []
+        for name, end in properties.iteritems():
+            start = getattr(target, name)
+            if isinstance(end, (tuple, list)):
+                start = tuple(start)
+                animated.append((name, start, tuple([e - s for s, e in zip(start, end)]), True))
+            else:
+                animated.append((name, start, end - start, False))
+        
+        if self.free:
+            slot = self.free.pop()
+            self.targets[slot] = target
+            self.properties[slot] = tuple(animated)
+            self.start_times[slot] = Clock.get_time()
+            self.durations[slot] = duration
+            self.easings[slot] = easing_id(transition)
+            self.callbacks[slot] = on_complete
+        else:
+            slot = len(self.targets)
+            self.targets.append(target)
+            self.properties.append(tuple(animated))
+            self.start_times.append(Clock.get_time())
+            self.durations.append(duration)
+            self.easings.append(easing_id(transition))
+            self.callbacks.append(on_complete)
+        
+        self.active.append(slot)
+        self.started += 1
+        self.max_active = max(self.max_active, len(self.active))
+        if not self.scheduled:
+            Clock.schedule_interval(self.update, 0)
+            self.scheduled = True
+        return slot
+    
+    def stop(self, target, *names):
+        # end the fades of target (of the given properties only, if any) and call their on_complete.
+        # The values stay where they are.
+        for slot in self.take(target, names):
+            callback = self.callbacks[slot]
+            self.recycle(slot)
+            self.stopped += 1
+            if callback is not None:
+                callback(target)
+    
+    def cancel(self, target, *names):
+        # like stop(), but without calling on_complete
+        for slot in self.take(target, names):
+            self.recycle(slot)
+            self.stopped += 1
+    
+    def take(self, target, names):
+        # remove the given properties (all, if none given) from the fades of target.
+        # Returns the slots left with nothing to animate, they aren't active anymore.
+        targets = self.targets
+        properties = self.properties
+        taken = []
+        still_active = []
+        for slot in self.active:
+            if targets[slot] is target:
+                if names:
+                    properties[slot] = tuple([p for p in properties[slot] if p[0] not in names])
+                if not names or not properties[slot]:
+                    taken.append(slot)
+                    continue
+            still_active.append(slot)
+        self.active = still_active
+        return taken
+    
+    def is_animated(self, target):
+        targets = self.targets
+        for slot in self.active:
+            if targets[slot] is target:
+                return True
+        return False
+    
+    def recycle(self, slot):
+        # free the references, the slot is reused by the next fade
+        self.targets[slot] = None
+        self.properties[slot] = None
+        self.callbacks[slot] = None
+        self.free.append(slot)
+    
+    def update(self, dt):
+        now = Clock.get_time()
+        targets = self.targets
+        properties = self.properties
+        start_times = self.start_times
+        durations = self.durations
+        easings = self.easings
+        
+        still_active = []
+        finished = []
+        for slot in self.active:
+            duration = durations[slot]
+            progress = (now - start_times[slot]) / duration if duration > 0 else 1
+            if progress >= 1:
+                progress = 1
+                finished.append(slot)
+            else:
+                still_active.append(slot)
+            
+            k = EASINGS[easings[slot]](progress)
+            target = targets[slot]
+            for name, start, delta, is_sequence in properties[slot]:
+                if is_sequence:
+                    setattr(target, name, tuple([s + d * k for s, d in zip(start, delta)]))
+                else:
+                    setattr(target, name, start + delta * k)
+        
+        self.active = still_active
+        
+        # recycle the finished slots before calling back: the callbacks may start new fades
+        for slot in finished:
+            target = targets[slot]
+            callback = self.callbacks[slot]
+            self.recycle(slot)
+            self.completed += 1
+            if callback is not None:
+                callback(target)
+        
+        # stop the callback as soon as there is nothing to fade anymore
+        self.scheduled = bool(self.active)
+        return self.scheduled
+    
+    def report(self):
+        return 'Tweens: %i started, %i completed, %i stopped, %i slots (max. %i running)' % (
+            self.started, self.completed, self.stopped, len(self.targets), self.max_active)
+
+
+# the instance shared by all the widgets
+tweens = TweenEngine()
@@ -0,0 +1,78 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''
+####################################
+##
+##   Voice Class
+##
+####################################
+'''
+class Voice(object):
+    '''The state of one finger on the keyboard, from touch down to touch up.
+    It's created once per touch and kept in touch.ud['voice']; the handlers and the
+    rounding read and write its attributes instead of string keys of touch.ud.
+    The positions are in pixels relative to the keyboard:
+    
+        keynumber         the key touched first (it defines the note)
+        note              the MIDI note played (from the pitch table, so a new transposition doesn't change it)
+        pitch_base        the pitch of that note in pitch bend units, the pitch bend is relative to it
+        keyposition       left edge of that key
+        finger_position   where the finger is now
+        rounded_key       center of the key under the finger
+        current_position  the position the pitch bend is sent for (follows the rounding)
+        old_position      current_position of the previous rounding tick
+    '''
+    
+    __slots__ = ('keynumber', 'note', 'pitch_base', 'keyposition', 'finger_position', 'rounded_key', 'current_position', 'old_position',
+        'key_moving', 'vibrato', 'channel', 'blob', 'key_light', 'lit_key', 'canvas_line', 'rounding_slot', 'control_voice', 'keyboard')
+    
+    def __init__(self, keynumber, keyposition, rounded_key):
+        self.keynumber = keynumber
+        self.note = None
+        self.pitch_base = 0.0
+        self.keyposition = keyposition
+        self.finger_position = keyposition
+        self.rounded_key = rounded_key
+        self.current_position = rounded_key
+        self.old_position = rounded_key
+        self.key_moving = False
+        self.vibrato = False # this isn't implemented yet.
+        
+        # MIDI channel from the voice allocator (None if the voice was stolen)
+        self.channel = None
+        
+        # graphics
+        self.blob = None
+        self.key_light = None
+        self.lit_key = None
+        self.canvas_line = None
+        
+        # the voice in the rounding engine or the control-rate engine (if one is used)
+        self.rounding_slot = None
+        self.control_voice = None
+        
+        # the keyboard drawing the graphics of this voice: only it handles the moves and the touch up
+        self.keyboard = None
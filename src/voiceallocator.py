@@ -0,0 +1,96 @@
+'''
+IcarusTouch
+
+Copyright (C) 2011  Cyril Stoller
+
+For comments, suggestions or other messages, contact me at:
+<cyril.stoller@gmail.com>
+
+This file is part of IcarusTouch.
+
+IcarusTouch is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+IcarusTouch is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with IcarusTouch.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+from collections import deque, OrderedDict
+
+
+'''
+####################################
+##
+##   VoiceAllocator Class
+##
+####################################
+'''
+class VoiceAllocator(object):
+    '''Assigns a MIDI channel to every voice (= every touch on the keyboard).
+    
+    With a pool of member channels (MPE style), every voice gets its own channel,
+    so its pitch bend, pressure and CC don't disturb the other voices. Free channels
+    are kept in a free-list: the least recently released channel is reused first
+    (its release tail has had the most time to decay). If all the channels are in
+    use, the oldest voice is stolen. All of that is O(1).
+    
+    Without a pool (shared mode), all voices play on the same channel, as before.
+    '''
+    
+    def __init__(self, shared_channel=0, channels=None):
+        # active voices in allocation order: key -> (channel, payload)
+        self.active = OrderedDict()
+        self.configure(shared_channel, channels)
+        
+        # statistics
+        self.steals = 0
+    
+    def configure(self, shared_channel, channels=None):
+        # channels: list of member channels, or None for the shared mode.
+        # active voices keep their channel until they are released.
+        self.shared_channel = shared_channel
+        self.shared = not channels
+        self.pool = frozenset(channels or ())
+        
+        # (a channel listed twice would be handed out to two voices at once: only its first mention counts)
+        in_use = set(channel for channel, payload in self.active.itervalues())
+        self.free = deque()
+        for channel in channels or ():
+            if channel not in in_use:
+                self.free.append(channel)
+                in_use.add(channel)
+    
+    def allocate(self, key, payload=None):
+        '''Returns (channel, stolen_payload). stolen_payload is the payload of the voice
+        that had to give its channel away (it has to be silenced), or None.
+        '''
+        if self.shared:
+            return self.shared_channel, None
+        
+        stolen_payload = None
+        if self.free:
+            channel = self.free.popleft()
+        elif self.active:
+            # no channel left: steal the one of the oldest voice
+            stolen_key, (channel, stolen_payload) = self.active.popitem(last=False)
+            self.steals += 1
+        else:
+            # empty pool (shouldn't happen): fall back to the shared channel
+            return self.shared_channel, None
+        
+        self.active[key] = (channel, payload)
+        return channel, stolen_payload
+    
+    def release(self, key):
+        # give the channel of the voice back to the pool (if it wasn't stolen meanwhile)
+        entry = self.active.pop(key, None)
+        if entry is not None and entry[0] in self.pool:
+            self.free.append(entry[0])